@@ -1,247 +1,280 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, current_app, request, jsonify, send_from_directory, url_for
 from flask_cors import CORS
+import logging
 import os
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, String, DateTime, MetaData, Table, select, insert, update, delete
-
-# Load environment variables
-load_dotenv()
-
-app = Flask(__name__)
-CORS(app)
-
-# Database Configuration
-DATABASE_URL = os.getenv('DATABASE_URL')
-
-# Create SQLAlchemy engine and metadata
-engine = create_engine(DATABASE_URL)
-metadata = MetaData()
-
-# Define tables
-leads = Table(
-    'leads',
-    metadata,
-    Column('id', String, primary_key=True),
-    Column('leadName', String, nullable=False),
-    Column('leadSource', String, nullable=False),
-    Column('contactPhone', String, nullable=False),
-    Column('contactEmail', String, nullable=False),
-    Column('companyName', String, nullable=False),
-    Column('leadStatus', String, nullable=False),
-    Column('assignedSalesRep', String, nullable=False),
-    Column('lastContactDate', String),
-    Column('nextFollowUpDate', String),
-    Column('createdAt', DateTime),
-    Column('updatedAt', DateTime),
-)
-
-meetings = Table(
-    'meetings',
-    metadata,
-    Column('id', String, primary_key=True),
-    Column('meetingTitle', String, nullable=False),
-    Column('meetingDate', String, nullable=False),
-    Column('meetingTime', String, nullable=False),
-    Column('participants', String, nullable=False),
-    Column('location', String, nullable=False),
-    Column('travelMode', String),
-    Column('expenses', String),
-    Column('meetingAgenda', String),
-    Column('latitude', String),
-    Column('longitude', String),
-    Column('createdAt', DateTime),
-    Column('updatedAt', DateTime),
-)
-
-# Create tables if they don't exist
-metadata.create_all(engine)
+from werkzeug.local import LocalProxy
+from sqlalchemy import select, insert, update
+
+from archive import fetch_archived
+from batch import BatchError, apply_batch, delete_records, parse_operations
+from cache import build_entry
+from coercion import ValidationError, coerce_values
+from compression import install_compression
+from database import pool_status
+from events import FeedFull, blocking_server, parse_last_event_id, stream
+from exports import FORMATS, export_query, generate_export
+from followups import (FOLLOWUP_SWEEPER, due_query, fetch_reminders, overdue_counts, parse_due_args,
+                       parse_reminder_args)
+from geo import GeoError, plan_route, run_nearby
+from geocoding import GeocodeError, GeocodeProviderError, parse_batch, run_geocode
+from importer import (IMPORT_BATCH_SIZE, ON_CONFLICT_CHOICES, ImportFormatError,
+                      find_data_file, import_file, log_progress)
+from jobs import (JOB_OUTPUT_DIR, JOB_RUNNER, SUCCEEDED, JobError, cancel_job, enqueue, get_job,
+                  list_jobs)
+from metrics import install_metrics, registry as metrics_registry
+from migrations import run_migrations
+from models import leads, meetings
+from replicas import DATABASE_REPLICA_URLS, WRITE_METHODS
+from pagination import (QueryError, build_list_query, filter_conditions, parse_fields, select_columns,
+                        split_page)
+from search import SearchError, parse_search_args, run_search
+from serializers import RowSerializer
+from services import Services
+from stats import fetch_stats
+from sync import SyncError, fetch_changes, parse_sync_args
+from validation import validate_lead, validate_meeting
+
+# Routes are registered on this blueprint and served by apps from create_app
+api = Blueprint('api', __name__)
+
+# The Services (engine, caches, backends) of the app handling the request
+services = LocalProxy(lambda: current_app.extensions['fieldsense'])
+
+# Serializers are compiled once from the table definitions
+lead_serializer = RowSerializer(leads.columns)
+meeting_serializer = RowSerializer(meetings.columns)
+
+def create_app(config=None):
+    """Build the API app. Nothing connects to the database until first use.
+
+    config overrides the settings read from the environment (and .env):
+    DATABASE_URL, DATABASE_REPLICA_URLS (a list), AUTO_MIGRATE, JOB_RUNNER and
+    FOLLOWUP_SWEEPER.
+    """
+    load_dotenv()
+    app = Flask(__name__)
+    app.config.update(
+        DATABASE_URL=os.getenv('DATABASE_URL'),
+        DATABASE_REPLICA_URLS=DATABASE_REPLICA_URLS,
+        AUTO_MIGRATE=os.getenv('AUTO_MIGRATE', 'false').lower() == 'true',
+        JOB_RUNNER=JOB_RUNNER,
+        FOLLOWUP_SWEEPER=FOLLOWUP_SWEEPER,
+    )
+    app.config.update(config or {})
+    CORS(app, expose_headers=['X-Next-Cursor', 'Link', 'X-Read-After', 'X-Archived'])
+
+    # Engines and backends are built on first use (see services.py). The
+    # schema is managed by migrations.py; run `python migrations.py` (the
+    # Procfile release phase) before starting workers.
+    app_services = app.extensions['fieldsense'] = Services(app.config)
+    app.register_blueprint(api)
+
+    # Request timing, statement counts and pool metrics for /metrics (see metrics.py)
+    install_metrics(app)
+    register_gauges(app_services)
+
+    # gzip/brotli for JSON and export bodies (see compression.py)
+    install_compression(app)
+
+    if app.config['JOB_RUNNER'] == 'thread':
+        # Started on the first request, so that forked gunicorn workers each
+        # get their threads and a preloading master starts none
+        app.before_request(lambda: app_services.job_runner.ensure_started())
+    if app.config['FOLLOWUP_SWEEPER'] == 'thread':
+        app.before_request(lambda: app_services.reminder_sweeper.ensure_started())
+    return app
+
+def register_gauges(app_services):
+    """Expose the cache, geocoding, replica and reminder counters of an app's services"""
+    def cache_lookups():
+        status = app_services.response_cache.status()
+        return {('hit',): status['hits'], ('miss',): status['misses']}
+
+    metrics_registry.gauge('response_cache_lookups_total', 'Response cache lookups by result',
+                           ('result',), cache_lookups, kind='counter')
+    metrics_registry.gauge('response_cache_entries', 'Entries in the response cache', (),
+                           lambda: {(): app_services.response_cache.status()['entries']})
+    metrics_registry.gauge('geocode_lookups_total', 'Geocoding lookups by the tier that answered',
+                           ('tier',),
+                           lambda: {(tier,): n for tier, n in app_services.geocoder.status().items()},
+                           kind='counter')
+    metrics_registry.gauge('db_reads_total', 'Routed reads by target', ('target',),
+                           lambda: {(target,): n for target, n
+                                    in app_services.replica_router.status()['reads'].items()},
+                           kind='counter')
+    metrics_registry.gauge('followup_reminders_sent_total', 'Follow-up reminders sent by this process',
+                           (), lambda: {(): app_services.reminder_sweeper.emitted}, kind='counter')
+
+# /health sections and the services reporting them
+HEALTH_SECTIONS = {
+    'cache': 'response_cache',
+    'geocoding': 'geocoder',
+    'replication': 'replica_router',
+    'events': 'change_feed',
+}
+
+def health_report(app_services, engine):
+    """The /health document of an app's services, with the pool of the engine serving reads.
+
+    Only services already in use are reported; a health check never builds one.
+    """
+    report = {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "version": "1.0.0",
+        "database": "PostgreSQL",
+        "pool": pool_status(engine),
+    }
+    for section, name in HEALTH_SECTIONS.items():
+        if app_services.built(name):
+            report[section] = getattr(app_services, name).status()
+    return report
+
+@api.after_app_request
+def attach_read_token(response):
+    """Pin a client that has just written to the primary (see replicas.py)"""
+    return services.replica_router.attach_token(response)
+
+@api.after_app_request
+def notify_change_feed(response):
+    """Wake this process's event streams after a write (see events.py)"""
+    if (request.method in WRITE_METHODS and 200 <= response.status_code < 400
+            and services.built('change_feed')):
+        services.change_feed.notify()
+    return response
 
 # Helper functions
 def generate_id():
     """Generate a unique ID"""
     return str(uuid.uuid4())
 
-def validate_lead(lead):
-    """Validate lead data"""
-    required_fields = ['leadName', 'leadSource', 'contactPhone', 'contactEmail', 
-                      'companyName', 'leadStatus', 'assignedSalesRep']
-    
-    for field in required_fields:
-        if field not in lead or not lead[field]:
-            return False, f"Field '{field}' is required"
-    
-    return True, ""
-
-def validate_meeting(meeting):
-    """Validate meeting data"""
-    required_fields = ['meetingTitle', 'meetingDate', 'meetingTime', 
-                      'participants', 'location']
-    
-    for field in required_fields:
-        if field not in meeting or not meeting[field]:
-            return False, f"Field '{field}' is required"
-    
-    return True, ""
-
-def dict_to_model(data):
-    """Filter dictionary to include only valid table columns"""
-    # Remove any keys that aren't column names
-    if 'id' not in data:
-        data['id'] = generate_id()
-    return data
-
-def row_to_dict(row):
-    """Convert SQLAlchemy row to dictionary"""
-    if row is None:
+def json_response(body, status=200):
+    """Wrap already serialized JSON bytes in a response"""
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+def paginated_response(body, next_cursor):
+    """Return a list page, advertising the next page in response headers"""
+    response = json_response(body)
+    if next_cursor:
+        args = request.args.to_dict()
+        args['after'] = next_cursor
+        next_url = url_for(request.endpoint, _external=True, **args)
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+def conditional_response(response, entry):
+    """Attach cache validators, answering 304 when the client's copy is current"""
+    response.set_etag(entry.etag)
+    if entry.last_modified:
+        response.last_modified = entry.last_modified
+    # Let browsers keep the body but revalidate before every use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+def cached_list(table, serializer):
+    """Serve a list page through the response cache"""
+    fields = parse_fields(table, request.args)
+    source = services.replica_router.read_engine()
+
+    def load():
+        query, limit, sort_column = build_list_query(table, request.args, fields)
+        with source.connect() as connection:
+            result = connection.execute(query)
+            rows, next_cursor = split_page(result.fetchall(), limit, sort_column)
+        return build_entry(serializer.project(fields).dumps(rows), rows, next_cursor)
+
+    key = services.response_cache.list_key(table.name, request.args)
+    entry = services.response_cache.get_or_load(
+        table.name, key, load, services.replica_router.may_cache(source))
+    return conditional_response(paginated_response(entry.body, entry.next_cursor), entry)
+
+def cached_record(table, serializer, record_id):
+    """Serve one record through the response cache, or None if it does not exist"""
+    fields = parse_fields(table, request.args)
+    columns = select_columns(table, fields, table.c.updatedAt, table.c.createdAt)
+    source = services.replica_router.read_engine()
+
+    def load():
+        with source.connect() as connection:
+            row = connection.execute(select(*columns).where(table.c.id == record_id)).fetchone()
+        if row is None:
+            return None
+        return build_entry(serializer.project(fields).dumps_row(row), [row])
+
+    key = services.response_cache.record_key(table.name, record_id, fields)
+    entry = services.response_cache.get_or_load(
+        table.name, key, load, services.replica_router.may_cache(source))
+    if entry is None:
         return None
-    return dict(row)
+    return conditional_response(json_response(entry.body), entry)
 
 # Lead API Routes
-@app.route('/api/leads', methods=['GET'])
+@api.route('/api/leads', methods=['GET'])
 def get_leads():
-    """Get all leads"""
+    """Get a page of leads, optionally filtered and sorted"""
     try:
-        with engine.connect() as connection:
-            query = select(leads)
-            result = connection.execute(query)
-            leads_list = []
-            for row in result:
-                lead_dict = {}
-                for column in leads.columns.keys():
-                    if hasattr(row, column):
-                        value = getattr(row, column)
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            lead_dict[column] = value.isoformat()
-                        else:
-                            lead_dict[column] = value
-                    elif column in row._mapping:
-                        value = row._mapping[column]
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            lead_dict[column] = value.isoformat()
-                        else:
-                            lead_dict[column] = value
-                leads_list.append(lead_dict)
-            
-            return jsonify(leads_list)
+        return cached_list(leads, lead_serializer)
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        app.logger.error(f"Error getting leads: {str(e)}")
+        current_app.logger.error(f"Error getting leads: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/leads/<lead_id>', methods=['GET'])
+@api.route('/api/leads/<lead_id>', methods=['GET'])
 def get_lead_by_id(lead_id):
     """Get a lead by ID"""
     try:
-        with engine.connect() as connection:
-            query = select(leads).where(leads.c.id == lead_id)
-            result = connection.execute(query)
-            lead = result.fetchone()
-            
-            if lead:
-                lead_dict = {}
-                for column in leads.columns.keys():
-                    if hasattr(lead, column):
-                        value = getattr(lead, column)
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            lead_dict[column] = value.isoformat()
-                        else:
-                            lead_dict[column] = value
-                    elif column in lead._mapping:
-                        value = lead._mapping[column]
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            lead_dict[column] = value.isoformat()
-                        else:
-                            lead_dict[column] = value
-                
-                return jsonify(lead_dict)
-            else:
-                return jsonify({"error": "Lead not found"}), 404
+        response = cached_record(leads, lead_serializer, lead_id)
+        if response is None:
+            return jsonify({"error": "Lead not found"}), 404
+        return response
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        app.logger.error(f"Error getting lead {lead_id}: {str(e)}")
+        current_app.logger.error(f"Error getting lead {lead_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/leads', methods=['POST'])
+@api.route('/api/leads', methods=['POST'])
 def create_lead():
     """Create a new lead"""
     try:
-        app.logger.info("Received lead creation request")
         lead = request.json
-        app.logger.info(f"Received lead data: {lead}")
         
         # Validate lead data
         is_valid, error_msg = validate_lead(lead)
         if not is_valid:
-            app.logger.error(f"Lead validation failed: {error_msg}")
+            current_app.logger.error(f"Lead validation failed: {error_msg}")
             return jsonify({"error": error_msg}), 400
         
         # Add metadata
         lead['id'] = generate_id()
-        lead['createdAt'] = datetime.now()
-        app.logger.info(f"Lead ID assigned: {lead['id']}")
+        lead['createdAt'] = lead['updatedAt'] = datetime.now()
+        # Payload logging is for debugging only; keep formatting off the hot path
+        if current_app.logger.isEnabledFor(logging.DEBUG):
+            current_app.logger.debug(f"Creating lead {lead['id']}: {lead}")
         
-        # Insert into database
-        with engine.connect() as connection:
-            # Create a copy of the lead data with only the columns defined in the table
-            lead_data = {}
-            for column in leads.columns.keys():
-                if column in lead:
-                    # Ensure dates are properly formatted
-                    if isinstance(lead[column], datetime):
-                        lead_data[column] = lead[column]
-                    else:
-                        lead_data[column] = lead.get(column)
-            
-            app.logger.info(f"Filtered lead data for database: {lead_data}")
-            
-            # Insert the filtered data
-            app.logger.info("Executing database insert")
-            query = insert(leads).values(**lead_data)
-            connection.execute(query)
-            connection.commit()
-            app.logger.info("Database insert committed")
-            
-            # Retrieve the inserted lead
-            app.logger.info("Retrieving created lead")
-            select_query = select(leads).where(leads.c.id == lead['id'])
-            result = connection.execute(select_query)
-            created_lead = result.fetchone()
-            
-            if created_lead:
-                app.logger.info("Converting lead to dictionary")
-                # Convert the SQLAlchemy row to a dictionary
-                created_lead_dict = {}
-                for column in leads.columns.keys():
-                    if hasattr(created_lead, column):
-                        value = getattr(created_lead, column)
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            created_lead_dict[column] = value.isoformat()
-                        else:
-                            created_lead_dict[column] = value
-                    elif column in created_lead._mapping:
-                        value = created_lead._mapping[column]
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            created_lead_dict[column] = value.isoformat()
-                        else:
-                            created_lead_dict[column] = value
-                
-                app.logger.info("Lead created successfully")
-                return jsonify(created_lead_dict), 201
-            else:
-                app.logger.error("Failed to retrieve created lead")
-                return jsonify({"error": "Failed to retrieve created lead"}), 500
+        # Keep only table columns, converted to their column types
+        lead_data = coerce_values(leads, lead)
+        
+        # Insert and read back the stored row in one statement
+        with services.engine.begin() as connection:
+            query = insert(leads).values(**lead_data).returning(*leads.columns)
+            created_lead = connection.execute(query).fetchone()
+        services.search_backend.record_write('leads', created_lead)
+        services.response_cache.invalidate_record('leads', created_lead.id)
+        return json_response(lead_serializer.dumps_row(created_lead)), 201
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        app.logger.error(f"Error creating lead: {str(e)}")
-        app.logger.exception("Detailed exception information:")
+        current_app.logger.error(f"Error creating lead: {str(e)}")
+        current_app.logger.exception("Detailed exception information:")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/leads/<lead_id>', methods=['PUT'])
+@api.route('/api/leads/<lead_id>', methods=['PUT'])
 def update_lead(lead_id):
     """Update an existing lead"""
     try:
@@ -255,149 +288,106 @@ def update_lead(lead_id):
         # Add updatedAt timestamp
         updated_lead['updatedAt'] = datetime.now()
         
-        # Update in database
-        with engine.connect() as connection:
-            # Check if lead exists
-            check_query = select(leads).where(leads.c.id == lead_id)
-            check_result = connection.execute(check_query)
-            if not check_result.fetchone():
-                return jsonify({"error": "Lead not found"}), 404
-            
-            # Create a copy of the lead data with only the columns defined in the table
-            lead_data = {}
-            for column in leads.columns.keys():
-                if column in updated_lead:
-                    # Ensure dates are properly formatted
-                    if isinstance(updated_lead[column], datetime):
-                        lead_data[column] = updated_lead[column]
-                    else:
-                        lead_data[column] = updated_lead.get(column)
-            
-            # Update lead
-            query = update(leads).where(leads.c.id == lead_id).values(**lead_data)
-            connection.execute(query)
-            connection.commit()
-            
-            # Retrieve the updated lead
-            select_query = select(leads).where(leads.c.id == lead_id)
-            result = connection.execute(select_query)
-            updated_lead_result = result.fetchone()
-            
-            if updated_lead_result:
-                # Convert the SQLAlchemy row to a dictionary
-                updated_lead_dict = {}
-                for column in leads.columns.keys():
-                    if hasattr(updated_lead_result, column):
-                        value = getattr(updated_lead_result, column)
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            updated_lead_dict[column] = value.isoformat()
-                        else:
-                            updated_lead_dict[column] = value
-                    elif column in updated_lead_result._mapping:
-                        value = updated_lead_result._mapping[column]
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            updated_lead_dict[column] = value.isoformat()
-                        else:
-                            updated_lead_dict[column] = value
-                
-                return jsonify(updated_lead_dict)
-            else:
-                return jsonify({"error": "Failed to retrieve updated lead"}), 500
+        # Keep only table columns, converted to their column types
+        lead_data = coerce_values(leads, updated_lead)
+        lead_data.pop('id', None)
+        
+        # Update and read back the row in one statement; no row means no lead
+        with services.engine.begin() as connection:
+            query = (update(leads).where(leads.c.id == lead_id)
+                     .values(**lead_data).returning(*leads.columns))
+            updated_lead_result = connection.execute(query).fetchone()
+        
+        if updated_lead_result is None:
+            return jsonify({"error": "Lead not found"}), 404
+        services.search_backend.record_write('leads', updated_lead_result)
+        services.response_cache.invalidate_record('leads', lead_id)
+        return json_response(lead_serializer.dumps_row(updated_lead_result))
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        app.logger.error(f"Error updating lead {lead_id}: {str(e)}")
+        current_app.logger.error(f"Error updating lead {lead_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/leads/<lead_id>', methods=['DELETE'])
+@api.route('/api/leads/<lead_id>', methods=['DELETE'])
 def delete_lead(lead_id):
     """Delete a lead"""
     try:
-        with engine.connect() as connection:
-            # Check if lead exists
-            check_query = select(leads).where(leads.c.id == lead_id)
-            check_result = connection.execute(check_query)
-            if not check_result.fetchone():
-                return jsonify({"error": "Lead not found"}), 404
-            
-            # Delete lead
-            query = delete(leads).where(leads.c.id == lead_id)
-            connection.execute(query)
-            connection.commit()
-            
-            return jsonify({"message": "Lead deleted successfully"})
+        with services.engine.begin() as connection:
+            found = delete_records(connection, leads, [lead_id])
+        
+        if not found:
+            return jsonify({"error": "Lead not found"}), 404
+        services.search_backend.record_delete('leads', lead_id)
+        services.response_cache.invalidate_record('leads', lead_id)
+        return jsonify({"message": "Lead deleted successfully"})
     except Exception as e:
-        app.logger.error(f"Error deleting lead {lead_id}: {str(e)}")
+        current_app.logger.error(f"Error deleting lead {lead_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 # Meeting API Routes
-@app.route('/api/meetings', methods=['GET'])
+@api.route('/api/meetings', methods=['GET'])
 def get_meetings():
-    """Get all meetings"""
+    """Get a page of meetings, optionally filtered and sorted"""
     try:
-        with engine.connect() as connection:
-            query = select(meetings)
-            result = connection.execute(query)
-            meetings_list = []
-            for row in result:
-                meeting_dict = {}
-                for column in meetings.columns.keys():
-                    if hasattr(row, column):
-                        value = getattr(row, column)
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            meeting_dict[column] = value.isoformat()
-                        else:
-                            meeting_dict[column] = value
-                    elif column in row._mapping:
-                        value = row._mapping[column]
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            meeting_dict[column] = value.isoformat()
-                        else:
-                            meeting_dict[column] = value
-                meetings_list.append(meeting_dict)
-            
-            return jsonify(meetings_list)
+        return cached_list(meetings, meeting_serializer)
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error getting meetings: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/meetings/nearby', methods=['GET'])
+def get_nearby_meetings():
+    """Meetings within a radius or bounding box, or the nearest N, nearest first"""
+    try:
+        return jsonify(run_nearby(services.geo_backend, meetings, meeting_serializer, request.args))
+    except (GeoError, QueryError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error getting nearby meetings: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/meetings/route', methods=['GET'])
+def get_meeting_route():
+    """One day's meetings ordered for travel"""
+    try:
+        return jsonify(plan_route(services.engine, meetings, meeting_serializer, request.args,
+                                  date.today()))
+    except (GeoError, QueryError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        app.logger.error(f"Error getting meetings: {str(e)}")
+        current_app.logger.error(f"Error planning meeting route: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/meetings/<meeting_id>', methods=['GET'])
+def archived_meeting(meeting_id):
+    """Serve a meeting moved to the archive (see archive.py), or None"""
+    fields = parse_fields(meetings, request.args)
+    with services.replica_router.read_engine().connect() as connection:
+        body = fetch_archived(connection, meeting_id, fields)
+    if body is None:
+        return None
+    response = json_response(body)
+    response.headers['X-Archived'] = 'true'
+    return response
+
+@api.route('/api/meetings/<meeting_id>', methods=['GET'])
 def get_meeting_by_id(meeting_id):
     """Get a meeting by ID"""
     try:
-        with engine.connect() as connection:
-            query = select(meetings).where(meetings.c.id == meeting_id)
-            result = connection.execute(query)
-            meeting = result.fetchone()
-            
-            if meeting:
-                meeting_dict = {}
-                for column in meetings.columns.keys():
-                    if hasattr(meeting, column):
-                        value = getattr(meeting, column)
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            meeting_dict[column] = value.isoformat()
-                        else:
-                            meeting_dict[column] = value
-                    elif column in meeting._mapping:
-                        value = meeting._mapping[column]
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            meeting_dict[column] = value.isoformat()
-                        else:
-                            meeting_dict[column] = value
-                
-                return jsonify(meeting_dict)
-            else:
-                return jsonify({"error": "Meeting not found"}), 404
+        response = cached_record(meetings, meeting_serializer, meeting_id)
+        if response is None:
+            response = archived_meeting(meeting_id)
+        if response is None:
+            return jsonify({"error": "Meeting not found"}), 404
+        return response
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        app.logger.error(f"Error getting meeting {meeting_id}: {str(e)}")
+        current_app.logger.error(f"Error getting meeting {meeting_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/meetings', methods=['POST'])
+@api.route('/api/meetings', methods=['POST'])
 def create_meeting():
     """Create a new meeting"""
     try:
@@ -410,57 +400,27 @@ def create_meeting():
         
         # Add metadata
         meeting['id'] = generate_id()
-        meeting['createdAt'] = datetime.now()
+        meeting['createdAt'] = meeting['updatedAt'] = datetime.now()
         
-        # Insert into database
-        with engine.connect() as connection:
-            # Create a copy of the meeting data with only the columns defined in the table
-            meeting_data = {}
-            for column in meetings.columns.keys():
-                if column in meeting:
-                    # Ensure dates are properly formatted
-                    if isinstance(meeting[column], datetime):
-                        meeting_data[column] = meeting[column]
-                    else:
-                        meeting_data[column] = meeting.get(column)
-            
-            # Insert the filtered data
-            query = insert(meetings).values(**meeting_data)
-            connection.execute(query)
-            connection.commit()
-            
-            # Retrieve the inserted meeting
-            select_query = select(meetings).where(meetings.c.id == meeting['id'])
-            result = connection.execute(select_query)
-            created_meeting = result.fetchone()
-            
-            if created_meeting:
-                # Convert the SQLAlchemy row to a dictionary
-                created_meeting_dict = {}
-                for column in meetings.columns.keys():
-                    if hasattr(created_meeting, column):
-                        value = getattr(created_meeting, column)
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            created_meeting_dict[column] = value.isoformat()
-                        else:
-                            created_meeting_dict[column] = value
-                    elif column in created_meeting._mapping:
-                        value = created_meeting._mapping[column]
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            created_meeting_dict[column] = value.isoformat()
-                        else:
-                            created_meeting_dict[column] = value
-                
-                return jsonify(created_meeting_dict), 201
-            else:
-                return jsonify({"error": "Failed to retrieve created meeting"}), 500
+        # Keep only table columns, converted to their column types
+        meeting_data = coerce_values(meetings, meeting)
+        
+        # Insert and read back the stored row in one statement
+        with services.engine.begin() as connection:
+            query = insert(meetings).values(**meeting_data).returning(*meetings.columns)
+            created_meeting = connection.execute(query).fetchone()
+        services.search_backend.record_write('meetings', created_meeting)
+        services.geo_backend.record_write(created_meeting)
+        services.response_cache.invalidate_record('meetings', created_meeting.id)
+        
+        return json_response(meeting_serializer.dumps_row(created_meeting)), 201
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        app.logger.error(f"Error creating meeting: {str(e)}")
+        current_app.logger.error(f"Error creating meeting: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/meetings/<meeting_id>', methods=['PUT'])
+@api.route('/api/meetings/<meeting_id>', methods=['PUT'])
 def update_meeting(meeting_id):
     """Update an existing meeting"""
     try:
@@ -474,173 +434,386 @@ def update_meeting(meeting_id):
         # Add updatedAt timestamp
         updated_meeting['updatedAt'] = datetime.now()
         
-        # Update in database
-        with engine.connect() as connection:
-            # Check if meeting exists
-            check_query = select(meetings).where(meetings.c.id == meeting_id)
-            check_result = connection.execute(check_query)
-            if not check_result.fetchone():
-                return jsonify({"error": "Meeting not found"}), 404
-            
-            # Create a copy of the meeting data with only the columns defined in the table
-            meeting_data = {}
-            for column in meetings.columns.keys():
-                if column in updated_meeting:
-                    # Ensure dates are properly formatted
-                    if isinstance(updated_meeting[column], datetime):
-                        meeting_data[column] = updated_meeting[column]
-                    else:
-                        meeting_data[column] = updated_meeting.get(column)
-            
-            # Update meeting
-            query = update(meetings).where(meetings.c.id == meeting_id).values(**meeting_data)
-            connection.execute(query)
-            connection.commit()
-            
-            # Retrieve the updated meeting
-            select_query = select(meetings).where(meetings.c.id == meeting_id)
-            result = connection.execute(select_query)
-            updated_meeting_result = result.fetchone()
-            
-            if updated_meeting_result:
-                # Convert the SQLAlchemy row to a dictionary
-                updated_meeting_dict = {}
-                for column in meetings.columns.keys():
-                    if hasattr(updated_meeting_result, column):
-                        value = getattr(updated_meeting_result, column)
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            updated_meeting_dict[column] = value.isoformat()
-                        else:
-                            updated_meeting_dict[column] = value
-                    elif column in updated_meeting_result._mapping:
-                        value = updated_meeting_result._mapping[column]
-                        # Convert datetime objects to ISO format strings
-                        if isinstance(value, datetime):
-                            updated_meeting_dict[column] = value.isoformat()
-                        else:
-                            updated_meeting_dict[column] = value
-                
-                return jsonify(updated_meeting_dict)
-            else:
-                return jsonify({"error": "Failed to retrieve updated meeting"}), 500
+        # Keep only table columns, converted to their column types
+        meeting_data = coerce_values(meetings, updated_meeting)
+        meeting_data.pop('id', None)
+        
+        # Update and read back the row in one statement; no row means no meeting
+        with services.engine.begin() as connection:
+            query = (update(meetings).where(meetings.c.id == meeting_id)
+                     .values(**meeting_data).returning(*meetings.columns))
+            updated_meeting_result = connection.execute(query).fetchone()
+        
+        if updated_meeting_result is None:
+            return jsonify({"error": "Meeting not found"}), 404
+        services.search_backend.record_write('meetings', updated_meeting_result)
+        services.geo_backend.record_write(updated_meeting_result)
+        services.response_cache.invalidate_record('meetings', meeting_id)
+        return json_response(meeting_serializer.dumps_row(updated_meeting_result))
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        app.logger.error(f"Error updating meeting {meeting_id}: {str(e)}")
+        current_app.logger.error(f"Error updating meeting {meeting_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/meetings/<meeting_id>', methods=['DELETE'])
+@api.route('/api/meetings/<meeting_id>', methods=['DELETE'])
 def delete_meeting(meeting_id):
     """Delete a meeting"""
     try:
-        with engine.connect() as connection:
-            # Check if meeting exists
-            check_query = select(meetings).where(meetings.c.id == meeting_id)
-            check_result = connection.execute(check_query)
-            if not check_result.fetchone():
-                return jsonify({"error": "Meeting not found"}), 404
-            
-            # Delete meeting
-            query = delete(meetings).where(meetings.c.id == meeting_id)
-            connection.execute(query)
-            connection.commit()
-            
-            return jsonify({"message": "Meeting deleted successfully"})
+        with services.engine.begin() as connection:
+            found = delete_records(connection, meetings, [meeting_id])
+        
+        if not found:
+            return jsonify({"error": "Meeting not found"}), 404
+        services.search_backend.record_delete('meetings', meeting_id)
+        services.geo_backend.record_delete(meeting_id)
+        services.response_cache.invalidate_record('meetings', meeting_id)
+        return jsonify({"message": "Meeting deleted successfully"})
     except Exception as e:
-        app.logger.error(f"Error deleting meeting {meeting_id}: {str(e)}")
+        current_app.logger.error(f"Error deleting meeting {meeting_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Follow-up queues (see followups.py)
+@api.route('/api/followups/due', methods=['GET'])
+def get_due_followups():
+    """A page of open leads due for follow-up by a date, oldest follow-up first"""
+    try:
+        rep, until, fields, limit, cursor = parse_due_args(request.args, date.today())
+        query = due_query(rep, until, fields, limit, cursor)
+        with services.replica_router.read_engine().connect() as connection:
+            rows, next_cursor = split_page(connection.execute(query).fetchall(), limit,
+                                           leads.c.nextFollowUpDate)
+        return paginated_response(lead_serializer.project(fields).dumps(rows), next_cursor)
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error getting due follow-ups: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/followups/overdue', methods=['GET'])
+def get_overdue_followups():
+    """Overdue and due-today follow-up counts per sales rep"""
+    try:
+        with services.replica_router.read_engine().connect() as connection:
+            return jsonify(overdue_counts(connection, date.today(), request.args.get('rep')))
+    except Exception as e:
+        current_app.logger.error(f"Error counting overdue follow-ups: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/followups/reminders', methods=['GET'])
+def get_followup_reminders():
+    """Follow-up reminders sent by the sweeper, newest first"""
+    try:
+        rep, since, limit = parse_reminder_args(request.args)
+        with services.replica_router.read_engine().connect() as connection:
+            return jsonify(fetch_reminders(connection, rep, since, limit))
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error getting follow-up reminders: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Dashboard statistics
+@api.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Lead and meeting counts for the dashboard, read from rollup tables"""
+    try:
+        with services.replica_router.read_engine().connect() as connection:
+            return jsonify(fetch_stats(connection))
+    except Exception as e:
+        current_app.logger.error(f"Error getting stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Delta sync for offline clients
+@api.route('/api/sync', methods=['GET'])
+def sync_changes():
+    """Leads and meetings created, changed or deleted since a sync token"""
+    try:
+        state, limit = parse_sync_args(request.args)
+        tables = {'leads': leads, 'meetings': meetings}
+        serializers = {'leads': lead_serializer, 'meetings': meeting_serializer}
+        changes, token, more = fetch_changes(services.engine, tables, serializers, state, limit)
+        return jsonify({"changes": changes, "token": token, "more": more})
+    except SyncError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error syncing: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Server-Sent Events change feed (see events.py)
+@api.route('/api/events', methods=['GET'])
+def stream_events():
+    """Stream lead and meeting changes, resuming after Last-Event-ID"""
+    if blocking_server(request.environ):
+        return jsonify({"error": "Event streams need threaded workers or asgi.py"}), 503
+    try:
+        token = parse_last_event_id(request.headers, request.args)
+        feed = services.change_feed
+        subscription = feed.subscribe(token)
+    except SyncError as e:
+        return jsonify({"error": str(e)}), 400
+    except FeedFull:
+        return jsonify({"error": "Too many event streams; retry later"}), 503
+    except Exception as e:
+        current_app.logger.error(f"Error opening event stream: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    response = current_app.response_class(stream(feed, subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Geocoding, cached server-side for all clients (see geocoding.py)
+@api.route('/api/geocode', methods=['GET'])
+def geocode():
+    """Coordinates for an address, or the address at lat/lng"""
+    try:
+        result = run_geocode(services.geocoder, request.args)
+        if result is None:
+            return jsonify({"error": "Location not found"}), 404
+        return jsonify(result)
+    except GeocodeError as e:
+        return jsonify({"error": str(e)}), 400
+    except GeocodeProviderError as e:
+        current_app.logger.error(f"Geocoding provider error: {str(e)}")
+        return jsonify({"error": str(e)}), 502
+    except Exception as e:
+        current_app.logger.error(f"Error geocoding: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/geocode/batch', methods=['POST'])
+def geocode_batch():
+    """Coordinates for a list of addresses; not found or still pending for the rest"""
+    try:
+        addresses = parse_batch(request.json)
+        found, pending = services.geocoder.geocode_many(addresses)
+        pending = set(pending)
+        results = []
+        for address in addresses:
+            result = found.get(address)
+            if address in pending:
+                results.append({"query": address, "pending": True})
+            elif result is None:
+                results.append({"query": address})
+            else:
+                results.append({"query": address, "latitude": result.latitude,
+                                "longitude": result.longitude, "address": result.address})
+        pending_count = sum(1 for result in results if result.get("pending"))
+        return jsonify({"results": results, "pending": pending_count})
+    except GeocodeError as e:
+        return jsonify({"error": str(e)}), 400
+    except GeocodeProviderError as e:
+        current_app.logger.error(f"Geocoding provider error: {str(e)}")
+        return jsonify({"error": str(e)}), 502
+    except Exception as e:
+        current_app.logger.error(f"Error geocoding batch: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Search API Routes
+@api.route('/api/search', methods=['GET'])
+def search_records():
+    """Ranked full-text and fuzzy search over leads and meetings"""
+    try:
+        query, table_names, limit, offset = parse_search_args(request.args)
+        serializers = {'leads': lead_serializer, 'meetings': meeting_serializer}
+        results = run_search(services.search_backend, serializers, query, table_names, limit, offset)
+        return jsonify({"query": query, "limit": limit, "offset": offset, "results": results})
+    except SearchError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error searching: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Batch API Routes
+def batch_response(table, validate, serializer):
+    """Apply the operations in the request body and report per-item results"""
+    try:
+        operations = parse_operations(request.json)
+        results = apply_batch(services.engine, table, validate, serializer, operations)
+        services.invalidate_table(table.name)
+        return jsonify({"results": results})
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error applying {table.name} batch: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/leads/batch', methods=['POST'])
+def batch_leads():
+    """Create, update and delete leads in one transaction"""
+    return batch_response(leads, validate_lead, lead_serializer)
+
+@api.route('/api/meetings/batch', methods=['POST'])
+def batch_meetings():
+    """Create, update and delete meetings in one transaction"""
+    return batch_response(meetings, validate_meeting, meeting_serializer)
+
+# Streaming exports
+EXPORT_TABLES = {
+    'leads': (leads, lead_serializer),
+    'meetings': (meetings, meeting_serializer),
+}
+
+@api.route('/api/export/<table_name>', methods=['GET'])
+def export_table(table_name):
+    """Stream every row of a table as NDJSON or a chunked JSON array"""
+    if table_name not in EXPORT_TABLES:
+        return jsonify({"error": f"Unknown table '{table_name}'"}), 404
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in FORMATS:
+        return jsonify({"error": "'format' must be 'ndjson' or 'json'"}), 400
+
+    table, serializer = EXPORT_TABLES[table_name]
+    try:
+        fields = parse_fields(table, request.args)
+        query = export_query(table, filter_conditions(table, request.args),
+                             select_columns(table, fields) if fields else None)
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    serializer = serializer.project(fields)
+
+    mimetype, extension = FORMATS[export_format]
+    response = current_app.response_class(
+        generate_export(services.replica_router.read_engine(), query, serializer, export_format),
+        mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{table_name}.{extension}"'
+    # Ask reverse proxies not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # Import data from JSON to PostgreSQL (used for initial migration)
-@app.route('/api/import-data', methods=['POST'])
+@api.route('/api/import-data', methods=['POST'])
 def import_data():
-    """Import data from JSON files to PostgreSQL"""
+    """Import data files from DATA_DIR in batches, upserting on id"""
     try:
-        import json
-        import os
-        
-        # Check if data directory exists
         DATA_DIR = os.getenv('DATA_DIR', 'data')
-        LEADS_FILE = os.path.join(DATA_DIR, 'leads.json')
-        MEETINGS_FILE = os.path.join(DATA_DIR, 'meetings.json')
-        
+        batch_size = request.args.get('batchSize', IMPORT_BATCH_SIZE, type=int)
+        on_conflict = request.args.get('onConflict', 'update')
+        if on_conflict not in ON_CONFLICT_CHOICES:
+            return jsonify({"error": "'onConflict' must be 'update' or 'skip'"}), 400
+        if batch_size < 1:
+            return jsonify({"error": "'batchSize' must be positive"}), 400
+
+        if request.args.get('async', 'false').lower() == 'true':
+            job = enqueue(services.engine, 'import',
+                          {"batchSize": batch_size, "onConflict": on_conflict})
+            return job_accepted(job)
+
         result = {"leads": 0, "meetings": 0}
-        
-        # Import leads
-        if os.path.exists(LEADS_FILE):
-            with open(LEADS_FILE, 'r') as f:
-                leads_data = json.load(f)
-                if leads_data:
-                    with engine.connect() as connection:
-                        for lead in leads_data:
-                            # Make sure ID exists
-                            if 'id' not in lead:
-                                lead['id'] = generate_id()
-                            # Add timestamps if not present
-                            if 'createdAt' not in lead:
-                                lead['createdAt'] = datetime.now()
-                            
-                            # Create a copy of the lead data with only the columns defined in the table
-                            lead_data = {}
-                            for column in leads.columns.keys():
-                                if column in lead:
-                                    # Ensure dates are properly formatted
-                                    if isinstance(lead[column], datetime):
-                                        lead_data[column] = lead[column]
-                                    else:
-                                        lead_data[column] = lead.get(column)
-                            
-                            query = insert(leads).values(**lead_data)
-                            connection.execute(query)
-                        
-                        connection.commit()
-                        result["leads"] = len(leads_data)
-        
-        # Import meetings
-        if os.path.exists(MEETINGS_FILE):
-            with open(MEETINGS_FILE, 'r') as f:
-                meetings_data = json.load(f)
-                if meetings_data:
-                    with engine.connect() as connection:
-                        for meeting in meetings_data:
-                            # Make sure ID exists
-                            if 'id' not in meeting:
-                                meeting['id'] = generate_id()
-                            # Add timestamps if not present
-                            if 'createdAt' not in meeting:
-                                meeting['createdAt'] = datetime.now()
-                            
-                            # Create a copy of the meeting data with only the columns defined in the table
-                            meeting_data = {}
-                            for column in meetings.columns.keys():
-                                if column in meeting:
-                                    # Ensure dates are properly formatted
-                                    if isinstance(meeting[column], datetime):
-                                        meeting_data[column] = meeting[column]
-                                    else:
-                                        meeting_data[column] = meeting.get(column)
-                            
-                            query = insert(meetings).values(**meeting_data)
-                            connection.execute(query)
-                        
-                        connection.commit()
-                        result["meetings"] = len(meetings_data)
-        
-        return jsonify({"message": "Data imported successfully", "counts": result})
+        details = {}
+        for table_name in ('leads', 'meetings'):
+            path = find_data_file(DATA_DIR, table_name)
+            if path is None:
+                continue
+            table_result = import_file(services.engine, path, table_name, batch_size=batch_size,
+                                       on_conflict=on_conflict, progress=log_progress)
+            result[table_name] = table_result.written
+            services.invalidate_table(table_name)
+            details[table_name] = table_result.to_dict()
+
+        return jsonify({"message": "Data imported successfully", "counts": result, "details": details})
+    except ImportFormatError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error importing data: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Background jobs
+def job_accepted(job):
+    """202 response pointing at a queued job's status"""
+    services.job_runner.notify()
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers['Location'] = url_for('.get_job_status', job_id=job['id'])
+    return response
+
+@api.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Queue a job: {"type": "import" | "export" | "reassign_leads", "params": {...}}"""
+    try:
+        body = request.json
+        if not isinstance(body, dict):
+            return jsonify({"error": "Body must be an object"}), 400
+        return job_accepted(enqueue(services.engine, body.get('type'), body.get('params') or {}))
+    except JobError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error creating job: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    """The 50 most recent jobs, optionally filtered by status"""
+    try:
+        return jsonify(list_jobs(services.engine, request.args.get('status')))
     except Exception as e:
-        app.logger.error(f"Error importing data: {str(e)}")
+        current_app.logger.error(f"Error listing jobs: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Status, progress and result of a job"""
+    try:
+        job = get_job(services.engine, job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job)
+    except Exception as e:
+        current_app.logger.error(f"Error getting job {job_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job_route(job_id):
+    """Cancel a queued job, or stop a running one at its next progress report"""
+    try:
+        job = cancel_job(services.engine, job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job)
+    except Exception as e:
+        current_app.logger.error(f"Error cancelling job {job_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/jobs/<job_id>/download', methods=['GET'])
+def download_job_result(job_id):
+    """The file written by a finished export job"""
+    job = get_job(services.engine, job_id)
+    if job is None or job['type'] != 'export':
+        return jsonify({"error": "Export job not found"}), 404
+    if job['status'] != SUCCEEDED:
+        return jsonify({"error": f"Export is {job['status']}"}), 409
+    name = job['result']['file']
+    extension = name.rsplit('.', 1)[1]
+    return send_from_directory(os.path.abspath(JOB_OUTPUT_DIR), name, as_attachment=True,
+                               download_name=f"{job['params']['table']}.{extension}")
+
+@api.route('/api/leads/reassign', methods=['POST'])
+def reassign_leads():
+    """Queue moving all leads of one sales rep to another: {"from", "to", "leadStatus"?}"""
+    try:
+        return job_accepted(enqueue(services.engine, 'reassign_leads', request.json or {}))
+    except JobError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error queueing lead reassignment: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# Prometheus scrape endpoint
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, database, pool and cache metrics of this process"""
+    return current_app.response_class(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
 # Server health check
-@app.route('/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health_check():
     """API health check endpoint"""
-    return jsonify({
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "version": "1.0.0",
-        "database": "PostgreSQL"
-    })
+    return jsonify(health_report(services, services.engine))
 
 if __name__ == '__main__':
+    app = create_app()
+    run_migrations(app.extensions['fieldsense'].engine)
     port = int(os.getenv('PORT', 5000))
     debug = os.getenv('DEBUG', 'True').lower() == 'true'
-    app.run(debug=debug, port=port) 
\ No newline at end of file
+    app.run(debug=debug, port=port)
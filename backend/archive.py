@@ -0,0 +1,173 @@
+"""Archival of past meetings into compressed cold storage.
+
+The meetings table holds the retention window (recent and upcoming
+meetings), which is what the list, search, nearby and sync queries read, so
+their indexes and scans stay the size of the working set. Meetings dated
+before the window are moved, a batch per transaction, into meetings_archive:
+one row per meeting holding its serialized JSON document, zlib compressed.
+
+On PostgreSQL meetings_archive is partitioned by meetingDate month. The
+archiver creates the partitions it needs before moving rows, and an old
+month can be detached or dropped as a whole. On SQLite it is a plain table.
+
+    ARCHIVE_RETENTION_DAYS  meetings dated more than this many days ago are archived (default 365)
+    ARCHIVE_BATCH_SIZE      meetings moved per transaction (default 500)
+
+Archived meetings are read-only. GET /api/meetings/<id> falls back to the
+archive and DELETE removes them from it. Dashboard totals still count them:
+the rollup decrements made by the delete trigger are added back in the same
+transaction. Sync clients receive them as deletes. Run the archiver from a
+scheduler (or enqueue an archive_meetings job):
+
+    python archive.py [--retention-days 365 | --before 2024-01-01]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import zlib
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import create_database_engine
+from models import meetings, meetings_archive
+from serializers import RowSerializer, encode_json
+from stats import bump_counts
+
+ARCHIVE_RETENTION_DAYS = int(os.getenv('ARCHIVE_RETENTION_DAYS', 365))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 500))
+
+logger = logging.getLogger(__name__)
+
+serializer = RowSerializer(meetings.columns)
+
+
+def archive_cutoff(retention_days=ARCHIVE_RETENTION_DAYS, today=None):
+    """First meetingDate kept in the meetings table"""
+    return (today or date.today()) - timedelta(days=retention_days)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(month):
+    return f'meetings_archive_{month:%Y_%m}'
+
+
+def ensure_partitions(engine, first, last):
+    """Create the monthly archive partitions covering first..last on PostgreSQL"""
+    if engine.dialect.name != 'postgresql':
+        return
+    # Creating a partition locks the parent; keep it out of the move transactions
+    month = month_start(first)
+    with engine.begin() as connection:
+        while month <= last:
+            following = next_month(month)
+            connection.execute(text(
+                f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" PARTITION OF "meetings_archive" '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"))
+            month = following
+
+
+def encode_document(row):
+    return zlib.compress(serializer.dumps_row(row))
+
+
+def decode_document(document, fields=None):
+    """JSON bytes of an archived meeting, narrowed to fields when given"""
+    body = zlib.decompress(document)
+    if fields is None:
+        return body
+    meeting = json.loads(body)
+    return encode_json({name: meeting[name] for name in fields if name in meeting})
+
+
+def write_archive(connection, rows):
+    """Upsert the archive documents of meeting rows"""
+    now = datetime.now()
+    values = [{'id': row.id, 'meetingDate': row.meetingDate, 'archivedAt': now,
+               'document': encode_document(row)} for row in rows]
+    dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(meetings_archive)
+    statement = statement.on_conflict_do_update(
+        index_elements=['id', 'meetingDate'],
+        set_={column: statement.excluded[column] for column in ('archivedAt', 'document')})
+    connection.execute(statement, values)
+
+
+def archive_meetings(engine, before, batch_size=ARCHIVE_BATCH_SIZE, progress=None):
+    """Move meetings dated before `before` into meetings_archive; return how many moved"""
+    old = meetings.c.meetingDate < before
+    with engine.connect() as connection:
+        total, first = connection.execute(
+            select(func.count(), func.min(meetings.c.meetingDate)).where(old)).one()
+    if not total:
+        return 0
+    ensure_partitions(engine, first, before)
+
+    moved = 0
+    while True:
+        with engine.begin() as connection:
+            query = (select(meetings).where(old)
+                     .order_by(meetings.c.meetingDate, meetings.c.id).limit(batch_size))
+            if connection.dialect.name == 'postgresql':
+                # Rows being edited right now are left for the next run
+                query = query.with_for_update(skip_locked=True)
+            rows = connection.execute(query).all()
+            if not rows:
+                break
+            write_archive(connection, rows)
+            connection.execute(delete(meetings).where(meetings.c.id.in_([row.id for row in rows])))
+            # The delete trigger took these meetings out of the dashboard rollups
+            bump_counts(connection, 'meetings', [row._mapping for row in rows])
+        moved += len(rows)
+        if progress:
+            progress(moved, total)
+    logger.info(f"Archived {moved} meetings dated before {before.isoformat()}")
+    return moved
+
+
+def fetch_archived(connection, meeting_id, fields=None):
+    """JSON bytes of an archived meeting, or None"""
+    document = connection.execute(
+        select(meetings_archive.c.document).where(meetings_archive.c.id == meeting_id)).scalar()
+    return None if document is None else decode_document(document, fields)
+
+
+def delete_archived(connection, meeting_ids):
+    """Remove meetings from the archive and the rollups; return the ids that were there"""
+    rows = connection.execute(
+        delete(meetings_archive).where(meetings_archive.c.id.in_(meeting_ids))
+        .returning(meetings_archive.c.id, meetings_archive.c.document)).all()
+    if rows:
+        bump_counts(connection, 'meetings', [json.loads(decode_document(row.document)) for row in rows], -1)
+    return {row.id for row in rows}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Move past meetings into the archive")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--retention-days', type=int, default=ARCHIVE_RETENTION_DAYS)
+    group.add_argument('--before', type=date.fromisoformat, help="archive meetings dated before YYYY-MM-DD")
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    engine = create_database_engine(os.getenv('DATABASE_URL'))
+    before = args.before or archive_cutoff(args.retention_days)
+    archive_meetings(engine, before, args.batch_size)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
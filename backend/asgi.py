@@ -0,0 +1,303 @@
+"""ASGI entry point with asyncio handlers for the read-heavy routes.
+
+GET /api/leads, /api/meetings, their single-record routes and /health run as
+async handlers on an asyncio engine (asyncpg on PostgreSQL), so one process
+can keep hundreds of requests waiting on the database without a thread each.
+GET /api/events streams from the event loop too, so open streams do not
+hold the threads of the mounted app.
+Every other route is served by the Flask app, mounted underneath and run in
+a thread pool, so the full API is available from one server:
+
+    uvicorn asgi:app --workers 4
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+
+The WSGI entry point (wsgi.py) is unchanged. Both share the response cache
+of app.py within a process. When DATABASE_REPLICA_URLS is set the read
+routes are left to the Flask app, which routes them to replicas (see
+replicas.py).
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MultiDict
+
+from app import create_app, health_report, lead_serializer, meeting_serializer
+from archive import fetch_archived
+from cache import build_entry
+from compression import add_vary, compress_body, weaken_etag
+from database import create_async_database_engine
+from events import EVENTS_HEARTBEAT_SECONDS, RETRY_MS, FeedFull, format_changes, parse_last_event_id
+from metrics import instrument_engine, observe_request
+from models import leads, meetings
+from pagination import QueryError, build_list_query, parse_fields, select_columns, split_page
+from sync import SyncError
+
+# Threads available to the mounted Flask app
+WSGI_THREADS = int(os.getenv('WSGI_THREADS', 10))
+
+logger = logging.getLogger(__name__)
+
+flask_app = create_app()
+app_services = flask_app.extensions['fieldsense']
+response_cache = app_services.response_cache
+change_feed = app_services.change_feed
+
+engine = create_async_database_engine(flask_app.config['DATABASE_URL'])
+instrument_engine(engine.sync_engine, 'async')
+
+# Flask-CORS covers the mounted routes; mirror its headers on the async ones
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Expose-Headers': 'X-Next-Cursor, Link, X-Read-After, X-Archived',
+}
+
+
+def etag_matches(header, etag):
+    """True when an If-None-Match header lists etag"""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    candidates = [value.strip() for value in header.split(',')]
+    return any(value.removeprefix('W/').strip('"') == etag for value in candidates)
+
+
+def not_modified(request, entry):
+    """True when the client's validators show its copy is current.
+
+    If-None-Match takes precedence; If-Modified-Since is only consulted
+    without it, as in the Flask app.
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match:
+        return etag_matches(if_none_match, entry.etag)
+    since = request.headers.get('if-modified-since')
+    if not since or entry.last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    # Last-Modified is sent with whole seconds
+    return entry.last_modified.replace(microsecond=0) <= since
+
+
+def conditional_response(request, entry, headers=None):
+    """Return the cached body, or 304 when the client's copy is current"""
+    headers = {**CORS_HEADERS, **(headers or {})}
+    headers['ETag'] = f'"{entry.etag}"'
+    headers['Cache-Control'] = 'private, no-cache'
+    if entry.last_modified:
+        headers['Last-Modified'] = entry.last_modified.strftime('%a, %d %b %Y %H:%M:%S GMT')
+    add_vary(headers)
+    if not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    body, encoding = compress_body(entry.body, request.headers.get('accept-encoding'), entry.etag)
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+        headers['ETag'] = weaken_etag(headers['ETag'])
+    return Response(body, media_type='application/json', headers=headers)
+
+
+def error_response(message, status):
+    return JSONResponse({"error": message}, status_code=status, headers=CORS_HEADERS)
+
+
+async def list_records(request, table, serializer):
+    """Serve a list page through the response cache"""
+    args = MultiDict(request.query_params.multi_items())
+    try:
+        fields = parse_fields(table, args)
+        key = response_cache.list_key(table.name, args)
+        entry = response_cache.lookup(key)
+        if entry is None:
+            generation = response_cache.generation(table.name)
+            query, limit, sort_column = build_list_query(table, args, fields)
+            async with engine.connect() as connection:
+                result = await connection.execute(query)
+                rows, next_cursor = split_page(result.fetchall(), limit, sort_column)
+            entry = build_entry(serializer.project(fields).dumps(rows), rows, next_cursor)
+            response_cache.store(table.name, generation, key, entry)
+
+        headers = {}
+        if entry.next_cursor:
+            next_url = request.url.include_query_params(after=entry.next_cursor)
+            headers['X-Next-Cursor'] = entry.next_cursor
+            headers['Link'] = f'<{next_url}>; rel="next"'
+        return conditional_response(request, entry, headers)
+    except QueryError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        logger.error(f"Error getting {table.name}: {str(e)}")
+        return error_response(str(e), 500)
+
+
+async def get_record(request, table, serializer, label):
+    """Serve one record through the response cache"""
+    record_id = request.path_params['record_id']
+    try:
+        fields = parse_fields(table, request.query_params)
+        key = response_cache.record_key(table.name, record_id, fields)
+        entry = response_cache.lookup(key)
+        if entry is None:
+            generation = response_cache.generation(table.name)
+            columns = select_columns(table, fields, table.c.updatedAt, table.c.createdAt)
+            async with engine.connect() as connection:
+                result = await connection.execute(select(*columns).where(table.c.id == record_id))
+                row = result.fetchone()
+            if row is None:
+                return error_response(f"{label} not found", 404)
+            entry = build_entry(serializer.project(fields).dumps_row(row), [row])
+            response_cache.store(table.name, generation, key, entry)
+        return conditional_response(request, entry)
+    except QueryError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        logger.error(f"Error getting {label.lower()} {record_id}: {str(e)}")
+        return error_response(str(e), 500)
+
+
+def timed(route, handler):
+    """Record an async handler in the request latency metrics"""
+    async def endpoint(request):
+        start = time.perf_counter()
+        response = await handler(request)
+        observe_request(request.method, route, response.status_code, time.perf_counter() - start)
+        return response
+    return endpoint
+
+
+async def get_leads(request):
+    return await list_records(request, leads, lead_serializer)
+
+
+async def get_lead_by_id(request):
+    return await get_record(request, leads, lead_serializer, 'Lead')
+
+
+async def get_meetings(request):
+    return await list_records(request, meetings, meeting_serializer)
+
+
+async def get_meeting_by_id(request):
+    response = await get_record(request, meetings, meeting_serializer, 'Meeting')
+    if response.status_code != 404:
+        return response
+    try:
+        fields = parse_fields(meetings, request.query_params)
+        async with engine.connect() as connection:
+            body = await connection.run_sync(fetch_archived, request.path_params['record_id'], fields)
+    except Exception as e:
+        logger.error(f"Error reading archived meeting: {str(e)}")
+        return error_response(str(e), 500)
+    if body is None:
+        return response
+    return Response(body, media_type='application/json', headers={**CORS_HEADERS, 'X-Archived': 'true'})
+
+
+async def event_stream(subscription, woken):
+    """The SSE body of a subscription; the feed's thread wakes it through the loop"""
+    try:
+        yield f'retry: {RETRY_MS}\n\n'.encode()
+        while True:
+            woken.clear()
+            pages = subscription.take()
+            if pages is None:
+                more = True
+                while more:
+                    changes, token, more = await asyncio.to_thread(change_feed.read_page, subscription.token)
+                    subscription.token = token
+                    if changes:
+                        yield format_changes(changes, token)
+                continue
+            for changes, token in pages:
+                subscription.token = token
+                yield format_changes(changes, token)
+            if not pages:
+                try:
+                    await asyncio.wait_for(woken.wait(), EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b': keep-alive\n\n'
+    finally:
+        change_feed.unsubscribe(subscription)
+
+
+async def stream_events(request):
+    """Stream lead and meeting changes, resuming after Last-Event-ID"""
+    try:
+        token = parse_last_event_id(request.headers, request.query_params)
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+
+        def notify():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(woken.set)
+
+        # Subscribing reads the change log position once per process
+        subscription = await asyncio.to_thread(change_feed.subscribe, token, notify)
+    except SyncError as e:
+        return error_response(str(e), 400)
+    except FeedFull:
+        return error_response("Too many event streams; retry later", 503)
+    except Exception as e:
+        logger.error(f"Error opening event stream: {str(e)}")
+        return error_response(str(e), 500)
+    headers = {**CORS_HEADERS, 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return StreamingResponse(event_stream(subscription, woken), media_type='text/event-stream', headers=headers)
+
+
+async def health_check(request):
+    """API health check endpoint; the same document as the Flask app's, with the async pool"""
+    # The report takes service locks and may query replicas; keep it off the event loop
+    report = await run_in_threadpool(health_report, app_services, engine.sync_engine)
+    return JSONResponse(report, headers=CORS_HEADERS)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await engine.dispose()
+
+
+# Routes only match GET; other methods on the same paths fall through to Flask
+flask_routes = WSGIMiddleware(flask_app, workers=WSGI_THREADS)
+
+# Read routes served by the async handlers above
+async_routes = [
+    # Fixed paths that the {record_id} route below would otherwise capture
+    Route('/api/meetings/nearby', flask_routes, methods=['GET']),
+    Route('/api/meetings/route', flask_routes, methods=['GET']),
+    # Route labels match the Flask rules so both report the same series
+    Route('/api/leads', timed('/api/leads', get_leads), methods=['GET']),
+    Route('/api/leads/{record_id}', timed('/api/leads/<lead_id>', get_lead_by_id), methods=['GET']),
+    Route('/api/meetings', timed('/api/meetings', get_meetings), methods=['GET']),
+    Route('/api/meetings/{record_id}', timed('/api/meetings/<meeting_id>', get_meeting_by_id),
+          methods=['GET']),
+]
+
+if flask_app.config['DATABASE_REPLICA_URLS']:
+    # Replica routing and read-your-writes pinning live in the Flask app
+    logger.info("DATABASE_REPLICA_URLS is set; read routes are served by the Flask app")
+    async_routes = []
+
+app = Starlette(
+    routes=async_routes + [
+        Route('/api/events', stream_events, methods=['GET']),
+        Route('/health', health_check, methods=['GET']),
+        Mount('/', flask_routes),
+    ],
+    lifespan=lifespan,
+)
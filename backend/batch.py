@@ -0,0 +1,151 @@
+"""Batch create/update/delete for leads and meetings.
+
+A batch is a list of operations, each {"op": "create" | "update" | "delete",
+"id": ..., "data": {...}}. Every operation is validated on its own; the valid
+ones are applied in a single transaction using one multi-row statement per
+kind of change (creates, then updates, then deletes), and a result is
+reported for every operation in request order.
+"""
+import os
+import uuid
+from datetime import datetime
+
+from sqlalchemy import bindparam, delete, insert, select, update
+
+from archive import delete_archived
+from coercion import ValidationError, coerce_values
+
+BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', 500))
+
+OPERATIONS = ('create', 'update', 'delete')
+
+
+class BatchError(ValueError):
+    """Raised when a batch request is malformed as a whole"""
+
+
+def parse_operations(payload):
+    """Return the operations list from a request body"""
+    operations = payload.get('operations') if isinstance(payload, dict) else payload
+    if not isinstance(operations, list):
+        raise BatchError("Body must be a list of operations or {\"operations\": [...]}")
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        raise BatchError(f"A batch may contain at most {BATCH_MAX_OPERATIONS} operations")
+    return operations
+
+
+def prepare_operation(table, validate, operation, now):
+    """Validate one operation and return (op, id, column values)"""
+    if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+        raise ValidationError("'op' must be one of create, update, delete")
+    op = operation['op']
+
+    if op == 'create':
+        record_id = str(uuid.uuid4())
+    else:
+        record_id = operation.get('id')
+        if not record_id:
+            raise ValidationError("'id' is required")
+        if op == 'delete':
+            return op, record_id, None
+
+    data = operation.get('data')
+    if not isinstance(data, dict):
+        raise ValidationError("'data' must be an object")
+    is_valid, error_msg = validate(data)
+    if not is_valid:
+        raise ValidationError(error_msg)
+
+    values = coerce_values(table, data)
+    values['id'] = record_id
+    values['updatedAt'] = now
+    if op == 'create':
+        values['createdAt'] = now
+    return op, record_id, values
+
+
+def delete_records(connection, table, record_ids):
+    """Delete records by id and return the ids that were found.
+
+    Deleting a meeting also removes its archived copy, so a meeting that
+    has been archived can still be deleted by id.
+    """
+    record_ids = list(record_ids)
+    if not record_ids:
+        return set()
+    found = set(connection.execute(
+        delete(table).where(table.c.id.in_(record_ids)).returning(table.c.id)).scalars())
+    if table.name == 'meetings':
+        found |= delete_archived(connection, record_ids)
+    return found
+
+
+def apply_batch(engine, table, validate, serializer, operations):
+    """Apply a list of operations and return one result dict per operation"""
+    now = datetime.now()
+    results = [None] * len(operations)
+    creates, updates, deletes = [], [], []
+
+    for index, operation in enumerate(operations):
+        try:
+            op, record_id, values = prepare_operation(table, validate, operation, now)
+        except ValidationError as e:
+            results[index] = {"index": index, "status": 400, "error": str(e)}
+            continue
+        {'create': creates, 'update': updates, 'delete': deletes}[op].append(
+            (index, record_id, values))
+
+    with engine.begin() as connection:
+        targeted = {record_id for _, record_id, _ in updates}
+        existing = set()
+        if targeted:
+            existing = set(connection.execute(
+                select(table.c.id).where(table.c.id.in_(targeted))).scalars())
+
+        if creates:
+            # executemany needs the same keys in every parameter set
+            connection.execute(insert(table), [
+                {column.name: values.get(column.name) for column in table.columns}
+                for _, _, values in creates
+            ])
+
+        # Group updates by the set of columns they write, one executemany each
+        update_groups = {}
+        for index, record_id, values in updates:
+            if record_id in existing:
+                update_groups.setdefault(tuple(sorted(values)), []).append(values)
+        for keys, rows in update_groups.items():
+            # Bind names must differ from column names in an UPDATE
+            statement = (update(table)
+                         .where(table.c.id == bindparam('_id'))
+                         .values({key: bindparam(f'_{key}') for key in keys if key != 'id'}))
+            connection.execute(statement, [
+                {'_id': row['id'], **{f'_{key}': value for key, value in row.items()}}
+                for row in rows
+            ])
+
+        deleted = delete_records(connection, table, {record_id for _, record_id, _ in deletes})
+
+        written = {record_id for _, record_id, _ in creates}
+        written.update(record_id for _, record_id, _ in updates if record_id in existing)
+        written.difference_update(deleted)
+        records = {}
+        if written:
+            for row in connection.execute(select(table).where(table.c.id.in_(written))):
+                records[row.id] = serializer.to_dict(row)
+
+    for index, record_id, _ in creates:
+        results[index] = {"index": index, "status": 201, "id": record_id,
+                          "record": records.get(record_id)}
+    for index, record_id, _ in updates:
+        if record_id in existing:
+            results[index] = {"index": index, "status": 200, "id": record_id,
+                              "record": records.get(record_id)}
+        else:
+            results[index] = {"index": index, "status": 404, "id": record_id, "error": "Not found"}
+    for index, record_id, _ in deletes:
+        if record_id in deleted:
+            results[index] = {"index": index, "status": 200, "id": record_id}
+        else:
+            results[index] = {"index": index, "status": 404, "id": record_id, "error": "Not found"}
+    return results
@@ -0,0 +1,353 @@
+"""Benchmark: every CRUD and import route, with a JSON report for comparing commits.
+
+Seeds synthetic leads and meetings (ids bench-lead-N / bench-meeting-N, so a
+database seeded once can be reused at the same scale), then drives each
+route from concurrent threads and reports throughput, p50/p95/p99 latency,
+SQL statements per request and peak RSS. Routes run in order: reads, then
+creates, then updates and deletes of the records just created, then
+/api/import-data with a generated file.
+
+The default target is the Flask test client in this process. --target
+gunicorn starts a local gunicorn (sync workers) and sends real HTTP
+requests; statement counts are then not available. Everything runs offline.
+The response cache is disabled unless --cache is given, so reads reach the
+database. Runs against DATABASE_URL when set (use Postgres for
+representative numbers), otherwise against a temporary SQLite file.
+
+    python benchmarks/api_bench.py [--rows 10000] [--requests 1000] [--concurrency 8]
+    python benchmarks/api_bench.py --target gunicorn --workers 4 --output after.json
+    python benchmarks/api_bench.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+if not os.getenv('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import event, func, select
+
+from database import create_database_engine
+from importer import import_records
+from migrations import run_migrations
+from models import leads
+
+STATUSES = ['new', 'contacted', 'qualified', 'active', 'lost']
+SOURCES = ['Website', 'Referral', 'Event', 'Cold Call']
+REPS = [f'Rep {i}' for i in range(50)]
+TRAVEL_MODES = ['Car', 'Train', 'Walk', 'Online']
+
+# Roughly the extent of Great Britain
+REGION = (50.0, 58.5, -6.0, 1.8)
+
+SEED_BATCH_SIZE = 5000
+
+
+def lead_record(i, rng, prefix='bench-lead'):
+    day = date(2024, 1, 1) + timedelta(days=i % 730)
+    return {
+        'id': f'{prefix}-{i}',
+        'leadName': f'Bench Lead {i}',
+        'leadSource': rng.choice(SOURCES),
+        'contactPhone': f'07{i:09d}',
+        'contactEmail': f'bench{i}@example.com',
+        'companyName': f'Bench Company {i % 5000}',
+        'leadStatus': rng.choice(STATUSES),
+        'assignedSalesRep': rng.choice(REPS),
+        'lastContactDate': day.isoformat(),
+        'nextFollowUpDate': (day + timedelta(days=rng.randint(1, 60))).isoformat(),
+    }
+
+
+def meeting_record(i, rng, prefix='bench-meeting'):
+    min_lat, max_lat, min_lng, max_lng = REGION
+    return {
+        'id': f'{prefix}-{i}',
+        'meetingTitle': f'Bench Meeting {i}',
+        'meetingDate': (date(2024, 1, 1) + timedelta(days=i % 730)).isoformat(),
+        'meetingTime': f'{9 + i % 9:02d}:{(i * 15) % 60:02d}',
+        'participants': rng.choice(REPS),
+        'location': f'{i % 5000} Bench Street',
+        'travelMode': rng.choice(TRAVEL_MODES),
+        'expenses': str(rng.randint(0, 200)),
+        'meetingAgenda': 'Quarterly review',
+        'latitude': round(rng.uniform(min_lat, max_lat), 6),
+        'longitude': round(rng.uniform(min_lng, max_lng), 6),
+    }
+
+
+def seed(rows):
+    """Insert rows leads and meetings unless a previous run already did"""
+    engine = create_database_engine(os.environ['DATABASE_URL'])
+    run_migrations(engine)
+    with engine.connect() as connection:
+        existing = connection.execute(
+            select(func.count()).select_from(leads).where(leads.c.id.like('bench-lead-%'))).scalar()
+    if existing >= rows:
+        print(f"Reusing {existing} seeded leads and meetings")
+        engine.dispose()
+        return 0.0
+
+    start = time.perf_counter()
+    rng = random.Random(42)
+    for table_name, make in (('leads', lead_record), ('meetings', meeting_record)):
+        records = (make(i, rng) for i in range(existing, rows))
+        import_records(engine, table_name, records, batch_size=SEED_BATCH_SIZE, on_conflict='skip')
+    engine.dispose()
+    elapsed = time.perf_counter() - start
+    print(f"Seeded {rows - existing} leads and meetings in {elapsed:.1f} s")
+    return elapsed
+
+
+class ClientTarget:
+    """The Flask app in this process, through its test client"""
+
+    def __init__(self, args):
+        from app import create_app
+        self.app = create_app()
+        self.counter = threading.local()
+
+        @event.listens_for(self.app.extensions['fieldsense'].engine, 'before_cursor_execute')
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            self.counter.count = getattr(self.counter, 'count', 0) + 1
+
+        self.local = threading.local()
+
+    def request(self, method, path, body=None):
+        """Return (status, JSON body or None, statements issued)"""
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        self.counter.count = 0
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True), self.counter.count
+
+    def peak_rss_kb(self):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def close(self):
+        pass
+
+
+class GunicornTarget:
+    """A local gunicorn server, over HTTP"""
+
+    def __init__(self, args):
+        import httpx
+        self.httpx = httpx
+        self.base_url = f'http://127.0.0.1:{args.port}'
+        command = ['gunicorn', 'wsgi:app', '--workers', str(args.workers), '--threads', '1',
+                   '--bind', f'127.0.0.1:{args.port}', '--log-level', 'warning']
+        self.process = subprocess.Popen(command, cwd=BACKEND_DIR, env=dict(os.environ))
+        self.local = threading.local()
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(f'{self.base_url}/health').status_code == 200:
+                    return
+            except httpx.TransportError:
+                time.sleep(0.2)
+        self.close()
+        raise RuntimeError("gunicorn did not start")
+
+    def request(self, method, path, body=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.httpx.Client(base_url=self.base_url, timeout=300)
+        response = client.request(method, path, json=body)
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        return response.status_code, payload, None
+
+    def peak_rss_kb(self):
+        # Workers are reaped by the master, so their peak reaches us through it
+        self.close()
+        return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+
+
+TARGETS = {
+    'client': ClientTarget,
+    'gunicorn': GunicornTarget,
+}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_route(target, calls, concurrency, expected):
+    """Issue calls (method, path, body) from concurrency threads and summarize them"""
+    def issue(call):
+        start = time.perf_counter()
+        status, payload, statements = target.request(*call)
+        return time.perf_counter() - start, status, payload, statements
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(issue, calls))
+    elapsed = time.perf_counter() - start
+
+    latencies = [result[0] * 1000 for result in results]
+    counts = [result[3] for result in results if result[3] is not None]
+    summary = {
+        "requests": len(results),
+        "errors": sum(1 for result in results if result[1] != expected),
+        "throughput": round(len(results) / elapsed, 1),
+        "p50Ms": round(percentile(latencies, 50), 3),
+        "p95Ms": round(percentile(latencies, 95), 3),
+        "p99Ms": round(percentile(latencies, 99), 3),
+        "statementsPerRequest": round(statistics.mean(counts), 2) if counts else None,
+    }
+    return summary, [result[2] for result in results]
+
+
+def created_ids(payloads):
+    return [payload['id'] for payload in payloads if isinstance(payload, dict) and 'id' in payload]
+
+
+def write_import_files(data_dir, rows):
+    """Write leads.json and meetings.json for /api/import-data"""
+    rng = random.Random(7)
+    for table_name, make in (('leads', lead_record), ('meetings', meeting_record)):
+        records = [make(i, rng, prefix=f'bench-import-{table_name}') for i in range(rows)]
+        with open(os.path.join(data_dir, f'{table_name}.json'), 'w', encoding='utf-8') as f:
+            json.dump(records, f)
+
+
+def run_suite(target, args):
+    """Drive every route in turn and return {route: summary}"""
+    rng = random.Random(1)
+    n, rows = args.requests, args.rows
+    routes = {}
+
+    def route(name, calls, expected=200):
+        routes[name], payloads = run_route(target, calls, args.concurrency, expected)
+        summary = routes[name]
+        print(f"  {name:17s} {summary['throughput']:9.1f} req/s   p50 {summary['p50Ms']:8.2f} ms   "
+              f"p95 {summary['p95Ms']:8.2f} ms   p99 {summary['p99Ms']:8.2f} ms   "
+              f"errors {summary['errors']}")
+        return payloads
+
+    for kind, make in (('lead', lead_record), ('meeting', meeting_record)):
+        path = f'/api/{kind}s'
+        route(f'list_{kind}s', [('GET', f'{path}?limit=50', None)] * n)
+        route(f'get_{kind}_by_id', [('GET', f'{path}/bench-{kind}-{rng.randrange(rows)}', None)
+                                    for _ in range(n)])
+        bodies = [make(i, rng, prefix='unused') for i in range(n)]
+        for body in bodies:
+            del body['id']
+        ids = created_ids(route(f'create_{kind}', [('POST', path, body) for body in bodies], 201))
+        route(f'update_{kind}', [('PUT', f'{path}/{record_id}', body)
+                                 for record_id, body in zip(ids, bodies)])
+        route(f'delete_{kind}', [('DELETE', f'{path}/{record_id}', None) for record_id in ids])
+
+    route('import_data', [('POST', '/api/import-data', None)] * args.import_requests)
+    return routes
+
+
+def compare(report, baseline):
+    """Print throughput and p99 changes against an earlier report"""
+    print(f"Compared with {baseline['meta'].get('commit') or 'baseline'}:")
+    for name, summary in report['routes'].items():
+        old = baseline['routes'].get(name)
+        if not old:
+            continue
+        throughput = (summary['throughput'] / old['throughput'] - 1) * 100 if old['throughput'] else 0
+        p99 = (summary['p99Ms'] / old['p99Ms'] - 1) * 100 if old['p99Ms'] else 0
+        print(f"  {name:17s} throughput {throughput:+7.1f}%   p99 {p99:+7.1f}%")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000, help="leads and meetings to seed")
+    parser.add_argument('--requests', type=int, default=1000, help="requests per route")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--import-rows', type=int, default=1000, help="records per /api/import-data file")
+    parser.add_argument('--import-requests', type=int, default=5)
+    parser.add_argument('--target', choices=sorted(TARGETS), default='client')
+    parser.add_argument('--workers', type=int, default=4, help="gunicorn workers")
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--cache', action='store_true', help="keep the response cache enabled")
+    parser.add_argument('--output', help="write the JSON report here")
+    parser.add_argument('--compare', help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    seed_seconds = seed(args.rows)
+
+    data_dir = tempfile.mkdtemp()
+    write_import_files(data_dir, args.import_rows)
+    os.environ.update(DATA_DIR=data_dir, AUTO_MIGRATE='false')
+    if not args.cache:
+        os.environ['CACHE_BACKEND'] = 'none'
+
+    dialect = os.environ['DATABASE_URL'].split(':')[0]
+    print(f"{args.requests} requests per route, concurrency {args.concurrency}, "
+          f"{args.rows} rows, {args.target}, {dialect}")
+    target = TARGETS[args.target](args)
+    try:
+        routes = run_suite(target, args)
+        peak_rss_kb = target.peak_rss_kb()
+    finally:
+        target.close()
+    print(f"  peak RSS {peak_rss_kb / 1024:.1f} MB")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "database": dialect,
+            "target": args.target,
+            "workers": args.workers if args.target == 'gunicorn' else None,
+            "rows": args.rows,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "importRows": args.import_rows,
+            "cache": args.cache,
+            "seedSeconds": round(seed_seconds, 1),
+        },
+        "routes": routes,
+        "peakRssMb": round(peak_rss_kb / 1024, 1),
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Report written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark: in-process grid index for nearby queries.
+
+Builds the GridIndex used when PostGIS is unavailable over synthetic meeting
+locations spread across a country-sized region, then times radius and
+nearest-N lookups (index work and distance ranking only, no database).
+
+    python benchmarks/geo_bench.py [--points 1000000] [--queries 500]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+import geo
+
+# Roughly the extent of Great Britain
+REGION = (50.0, 58.5, -6.0, 1.8)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def random_point(rng):
+    min_lat, max_lat, min_lng, max_lng = REGION
+    return rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng)
+
+
+def timed(queries, call):
+    latencies = []
+    for lat, lng in queries:
+        start = time.perf_counter()
+        call(lat, lng)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--radius', type=float, default=10.0, help="km")
+    parser.add_argument('--nearest', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    index = geo.GridIndex()
+    start = time.perf_counter()
+    for i in range(args.points):
+        index.add(i, *random_point(rng))
+    build = time.perf_counter() - start
+
+    queries = [random_point(rng) for _ in range(args.queries)]
+
+    def nearest(lat, lng):
+        found = []
+        for batch in index.nearest(lat, lng):
+            found.extend(batch)
+            if len(found) >= args.nearest:
+                return found[:args.nearest]
+        return found
+
+    print(f"{args.points} points, cell {geo.GEO_GRID_CELL_DEGREES} deg, "
+          f"distances via {'numpy' if geo.numpy is not None else 'math'}; built in {build:.1f} s")
+    for name, call in ((f"radius {args.radius:g} km", lambda lat, lng: index.within(lat, lng, args.radius)),
+                       (f"nearest {args.nearest}", nearest)):
+        latencies = timed(queries, call)
+        print(f"  {name:16s} p50 {percentile(latencies, 50):7.2f} ms   "
+              f"p99 {percentile(latencies, 99):7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark: throughput and latency of the WSGI and ASGI entry points.
+
+Seeds leads and meetings, then starts each server in turn on a local port,
+gunicorn with sync workers (wsgi:app) and uvicorn (asgi:app) with the same
+worker count, and drives GET /api/leads, /api/leads/<id>, /api/meetings and
+/health from many concurrent connections. The response cache is disabled so
+every request reaches the database. Use a Postgres DATABASE_URL for
+representative numbers; without one a temporary SQLite file is used, where
+queries are too fast for the difference in concurrency to show.
+
+    python benchmarks/load_bench.py [--requests 5000] [--concurrency 200] [--workers 2]
+
+Requires gunicorn, uvicorn and httpx.
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+if not os.getenv('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from database import create_database_engine
+from importer import import_records
+from migrations import run_migrations
+
+SERVERS = {
+    'wsgi': lambda port, workers: ['gunicorn', 'wsgi:app', '--workers', str(workers),
+                                   '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+    'asgi': lambda port, workers: ['uvicorn', 'asgi:app', '--workers', str(workers),
+                                   '--port', str(port), '--log-level', 'warning'],
+}
+
+
+def seed(count):
+    """Insert count leads and meetings and return the lead ids"""
+    engine = create_database_engine(os.environ['DATABASE_URL'])
+    run_migrations(engine)
+    lead_ids = [str(uuid.uuid4()) for _ in range(count)]
+    import_records(engine, 'leads', ({
+        'id': lead_id,
+        'leadName': f'Load Lead {i}',
+        'leadSource': 'Website',
+        'contactPhone': '1234567890',
+        'contactEmail': f'load{i}@example.com',
+        'companyName': 'Load Corp',
+        'leadStatus': 'active',
+        'assignedSalesRep': 'Load Rep',
+    } for i, lead_id in enumerate(lead_ids)))
+    import_records(engine, 'meetings', ({
+        'meetingTitle': f'Load Meeting {i}',
+        'meetingDate': '2025-06-01',
+        'meetingTime': '10:00',
+        'participants': 'Load Rep',
+        'location': 'Office',
+        'travelMode': 'Car',
+    } for i in range(count)))
+    engine.dispose()
+    return lead_ids
+
+
+def start_server(kind, port, workers):
+    env = dict(os.environ, CACHE_BACKEND='none', AUTO_MIGRATE='false')
+    process = subprocess.Popen(SERVERS[kind](port, workers), cwd=BACKEND_DIR, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/health').status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+async def drive(base_url, lead_ids, requests, concurrency):
+    """Issue requests from concurrency connections; return latencies and errors"""
+    paths = ['/api/leads?limit=50', '/api/meetings?limit=50', '/health']
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def connection(client):
+        nonlocal errors
+        for i in remaining:
+            path = paths[i % 4] if i % 4 < 3 else f'/api/leads/{random.choice(lead_ids)}'
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await asyncio.gather(*(connection(client) for _ in range(concurrency)))
+    return latencies, errors
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--rows', type=int, default=1000, help="leads and meetings to seed")
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    lead_ids = seed(args.rows)
+    print(f"{args.requests} GETs, concurrency {args.concurrency}, {args.workers} workers, "
+          f"{os.environ['DATABASE_URL'].split(':')[0]}")
+    for kind in SERVERS:
+        process = start_server(kind, args.port, args.workers)
+        try:
+            start = time.perf_counter()
+            latencies, errors = asyncio.run(drive(
+                f'http://127.0.0.1:{args.port}', lead_ids, args.requests, args.concurrency))
+            elapsed = time.perf_counter() - start
+        finally:
+            process.terminate()
+            process.wait()
+        latencies = [value * 1000 for value in latencies]
+        print(f"  {kind}  {len(latencies) / elapsed:8.1f} req/s   "
+              f"p50 {percentile(latencies, 50):8.2f} ms   p99 {percentile(latencies, 99):8.2f} ms   "
+              f"errors {errors}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Micro-benchmark: legacy per-column row conversion vs RowSerializer.
+
+Builds real SQLAlchemy result rows from an in-memory SQLite database and
+reports rows/sec for turning a list of leads into a JSON response body.
+
+    python benchmarks/serializer_bench.py [--rows 20000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, insert, select
+
+import serializers
+from models import metadata, leads
+from serializers import RowSerializer, _encode_stdlib
+
+
+def build_rows(count):
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    now = datetime.now()
+    with engine.begin() as connection:
+        connection.execute(insert(leads), [
+            {
+                'id': f'lead-{i:08d}',
+                'leadName': f'Lead {i}',
+                'leadSource': 'Website',
+                'contactPhone': '1234567890',
+                'contactEmail': f'lead{i}@example.com',
+                'companyName': f'Company {i % 500}',
+                'leadStatus': 'active',
+                'assignedSalesRep': f'Rep {i % 40}',
+                'lastContactDate': date(2025, 1, 1) + timedelta(days=i % 300),
+                'nextFollowUpDate': date(2025, 2, 1) + timedelta(days=i % 300),
+                'createdAt': now - timedelta(minutes=i),
+                'updatedAt': now,
+            }
+            for i in range(count)
+        ])
+    with engine.connect() as connection:
+        return connection.execute(select(leads)).fetchall()
+
+
+def legacy_dumps(app, rows):
+    """The conversion loop every handler used before RowSerializer"""
+    leads_list = []
+    for row in rows:
+        lead_dict = {}
+        for column in leads.columns.keys():
+            if hasattr(row, column):
+                value = getattr(row, column)
+                if isinstance(value, (datetime, date)):
+                    lead_dict[column] = value.isoformat()
+                else:
+                    lead_dict[column] = value
+            elif column in row._mapping:
+                value = row._mapping[column]
+                if isinstance(value, (datetime, date)):
+                    lead_dict[column] = value.isoformat()
+                else:
+                    lead_dict[column] = value
+        leads_list.append(lead_dict)
+    with app.app_context():
+        return jsonify(leads_list).get_data()
+
+
+def measure(func, rows, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(rows)
+        best = min(best, time.perf_counter() - start)
+    return len(rows) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = build_rows(args.rows)
+    app = Flask(__name__)
+    serializer = RowSerializer(leads.columns)
+
+    # Both paths must produce the same document
+    assert json.loads(legacy_dumps(app, rows[:50])) == json.loads(serializer.dumps(rows[:50]))
+
+    results = {'legacy (hasattr loop + jsonify)': measure(lambda r: legacy_dumps(app, r), rows, args.repeat)}
+
+    original_encoder = serializers.encode_json
+    serializers.encode_json = _encode_stdlib
+    results['RowSerializer + json'] = measure(serializer.dumps, rows, args.repeat)
+    serializers.encode_json = original_encoder
+    if serializers.orjson is not None:
+        results['RowSerializer + orjson'] = measure(serializer.dumps, rows, args.repeat)
+
+    baseline = results['legacy (hasattr loop + jsonify)']
+    print(f"{args.rows} lead rows, best of {args.repeat}")
+    for name, rate in results.items():
+        print(f"  {name:34s} {rate:12,.0f} rows/sec  ({rate / baseline:4.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
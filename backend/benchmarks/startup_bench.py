@@ -0,0 +1,149 @@
+"""Benchmark: worker cold start, from interpreter start to first served request.
+
+Each run starts a fresh Python process that imports wsgi (which builds the
+app with create_app) and then sends requests through the test client, so
+every figure includes module imports but not interpreter startup:
+
+    importMs             import wsgi
+    firstRequestMs       first GET /health (no query; the engine is built, not connected)
+    firstQueryRequestMs  first GET /api/leads?limit=1 (opens the first connection)
+
+--unreachable points DATABASE_URL at a database that cannot be opened, to
+check that workers still import and answer /health without it. --gunicorn
+also times a local gunicorn (with --preload when given) from spawn until its
+first 200 from /health. Medians over --runs runs are printed and optionally
+written as JSON.
+
+    python benchmarks/startup_bench.py [--runs 10] [--unreachable] [--gunicorn --preload]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Runs in the child process; prints one JSON line of timings
+CHILD = """
+import json, time
+start = time.perf_counter()
+import wsgi
+imported = time.perf_counter()
+client = wsgi.app.test_client()
+health = client.get('/health').status_code
+served = time.perf_counter()
+query = client.get('/api/leads?limit=1').status_code
+queried = time.perf_counter()
+print(json.dumps({
+    "importMs": (imported - start) * 1000,
+    "firstRequestMs": (served - imported) * 1000,
+    "firstQueryRequestMs": (queried - served) * 1000,
+    "healthStatus": health,
+    "queryStatus": query,
+}))
+"""
+
+
+def child_run(env):
+    result = subprocess.run([sys.executable, '-c', CHILD], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def gunicorn_ready_ms(env, preload, port):
+    """Milliseconds from spawning gunicorn until /health answers 200"""
+    import httpx
+
+    command = ['gunicorn', 'wsgi:app', '--workers', '2', '--bind', f'127.0.0.1:{port}',
+               '--log-level', 'warning']
+    if preload:
+        command.append('--preload')
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    try:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(f'http://127.0.0.1:{port}/health').status_code == 200:
+                    return (time.perf_counter() - start) * 1000
+            except httpx.TransportError:
+                time.sleep(0.005)
+        raise RuntimeError("gunicorn did not start")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def median(values):
+    return round(statistics.median(values), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--unreachable', action='store_true',
+                        help="use a DATABASE_URL that cannot be opened")
+    parser.add_argument('--gunicorn', action='store_true', help="also time a local gunicorn")
+    parser.add_argument('--preload', action='store_true', help="start gunicorn with --preload")
+    parser.add_argument('--port', type=int, default=8767)
+    parser.add_argument('--output', help="write the JSON report here")
+    args = parser.parse_args()
+
+    env = dict(os.environ, AUTO_MIGRATE='false', JOB_RUNNER='process')
+    if args.unreachable:
+        env['DATABASE_URL'] = 'sqlite:////nonexistent/fieldsense/startup.db'
+    elif not env.get('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(), 'startup.db')
+        env['DATABASE_URL'] = 'sqlite:///' + path
+        subprocess.run([sys.executable, 'migrations.py'], cwd=BACKEND_DIR, env=env,
+                       capture_output=True, check=True)
+
+    runs = [child_run(env) for _ in range(args.runs)]
+    results = {name: median([run[name] for run in runs])
+               for name in ('importMs', 'firstRequestMs', 'firstQueryRequestMs')}
+    results['healthStatus'] = runs[-1]['healthStatus']
+    results['queryStatus'] = runs[-1]['queryStatus']
+    if args.gunicorn:
+        results['gunicornReadyMs'] = median(
+            [gunicorn_ready_ms(env, args.preload, args.port) for _ in range(min(args.runs, 3))])
+
+    dialect = env['DATABASE_URL'].split(':')[0]
+    print(f"{args.runs} cold starts, {dialect}{' (unreachable)' if args.unreachable else ''}")
+    for name, value in results.items():
+        print(f"  {name:<20} {value}")
+
+    if args.output:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.now().isoformat(timespec='seconds'),
+                "python": platform.python_version(),
+                "database": dialect,
+                "unreachable": args.unreachable,
+                "preload": args.preload,
+                "runs": args.runs,
+            },
+            "results": results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
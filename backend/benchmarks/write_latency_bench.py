@@ -0,0 +1,98 @@
+"""Benchmark: latency and statement count of the single-record write routes.
+
+Drives POST, PUT and DELETE on /api/leads from concurrent threads through the
+Flask test client and reports p50/p99 latency and SQL statements per request.
+Runs against DATABASE_URL when set (use Postgres for representative numbers),
+otherwise against a temporary SQLite file.
+
+    python benchmarks/write_latency_bench.py [--requests 500] [--concurrency 8]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+if not os.getenv('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['AUTO_MIGRATE'] = 'true'
+
+from sqlalchemy import event
+
+from app import create_app
+
+app = create_app()
+engine = app.extensions['fieldsense'].engine
+statements = threading.local()
+
+
+@event.listens_for(engine, 'before_cursor_execute')
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements.count = getattr(statements, 'count', 0) + 1
+
+
+def lead_payload(i):
+    return {
+        'leadName': f'Bench Lead {i}',
+        'leadSource': 'Website',
+        'contactPhone': '1234567890',
+        'contactEmail': f'bench{i}@example.com',
+        'companyName': 'Bench Corp',
+        'leadStatus': 'active',
+        'assignedSalesRep': 'Bench Rep',
+        'nextFollowUpDate': '2025-06-01',
+    }
+
+
+def lifecycle(i):
+    """Create, update and delete one lead, timing each request"""
+    client = app.test_client()
+    timings = {}
+
+    def timed(name, call, expected):
+        statements.count = 0
+        start = time.perf_counter()
+        response = call()
+        timings[name] = (time.perf_counter() - start, statements.count)
+        assert response.status_code == expected, response.get_data(as_text=True)
+        return response
+
+    created = timed('create', lambda: client.post('/api/leads', json=lead_payload(i)), 201)
+    lead_id = created.get_json()['id']
+    timed('update', lambda: client.put(f'/api/leads/{lead_id}', json=lead_payload(i)), 200)
+    timed('delete', lambda: client.delete(f'/api/leads/{lead_id}'), 200)
+    return timings
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500, help="lead lifecycles to run")
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        runs = list(pool.map(lifecycle, range(args.requests)))
+
+    print(f"{args.requests} create/update/delete lifecycles, concurrency {args.concurrency}, "
+          f"{engine.dialect.name}")
+    for name in ('create', 'update', 'delete'):
+        latencies = [run[name][0] * 1000 for run in runs]
+        counts = [run[name][1] for run in runs]
+        print(f"  {name:7s} p50 {percentile(latencies, 50):7.2f} ms   "
+              f"p99 {percentile(latencies, 99):7.2f} ms   "
+              f"statements/request {statistics.mean(counts):.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""Read-through cache for record and list responses.
+
+Serialized GET responses are cached together with their validators (an ETag
+digest of the body and a Last-Modified time from updatedAt/createdAt), so a
+repeat read is served without a query and a client that already holds the
+body gets a 304.
+
+    CACHE_BACKEND      memory (default), redis, or none
+    CACHE_URL          redis:// URL for the redis backend
+    CACHE_TTL          seconds an entry may be served (default 30)
+    CACHE_MAX_ENTRIES  memory backend size bound, least recently used first out (default 1000)
+
+Invalidation uses two counters per table. Every write bumps the table's
+list generation, which is part of every list key, and single-record writes
+delete that record's key. Records read with ?fields= are keyed by the list
+generation as well, so any write to the table drops them. Bulk writes
+(batch, import) also bump the record generation, which is part of every
+record key. The memory backend is private
+to each worker, so writes made through other workers are only seen after
+CACHE_TTL; use the redis backend to share entries and invalidations.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from urllib.parse import urlencode
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory').lower()
+CACHE_TTL = int(os.getenv('CACHE_TTL', 30))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1000))
+
+logger = logging.getLogger(__name__)
+
+CachedResponse = namedtuple('CachedResponse', ['body', 'etag', 'last_modified', 'next_cursor'])
+
+
+def build_entry(body, rows, next_cursor=None):
+    """Cache entry for a serialized body and the rows it was built from"""
+    etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+    changed = [row.updatedAt or row.createdAt for row in rows]
+    last_modified = max((value for value in changed if value is not None), default=None)
+    return CachedResponse(body, etag, last_modified, next_cursor)
+
+
+class MemoryBackend:
+    """Size-bounded LRU with per-entry expiry, local to this process"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (value, expires at)
+        self.counters = {}
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def counter(self, name):
+        with self.lock:
+            return self.counters.get(name, 0)
+
+    def incr(self, name):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def size(self):
+        return len(self.entries)
+
+
+class RedisBackend:
+    """Entries and counters shared by every worker through Redis.
+
+    Redis errors are logged and treated as misses so an unavailable cache
+    never fails a request.
+    """
+
+    name = 'redis'
+    prefix = 'cache:'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package (pip install redis)")
+        self.errors = (redis.RedisError,)
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self.prefix + key)
+        except self.errors as e:
+            logger.warning(f"Cache read failed: {e}")
+            return None
+        if raw is None:
+            return None
+        body, etag, last_modified, next_cursor = json.loads(raw)
+        if last_modified is not None:
+            last_modified = datetime.fromisoformat(last_modified)
+        return CachedResponse(body.encode('utf-8'), etag, last_modified, next_cursor)
+
+    def set(self, key, value, ttl):
+        last_modified = value.last_modified.isoformat() if value.last_modified else None
+        raw = json.dumps([value.body.decode('utf-8'), value.etag, last_modified, value.next_cursor])
+        try:
+            self.client.set(self.prefix + key, raw, ex=ttl)
+        except self.errors as e:
+            logger.warning(f"Cache write failed: {e}")
+
+    def delete(self, key):
+        try:
+            self.client.delete(self.prefix + key)
+        except self.errors as e:
+            logger.warning(f"Cache invalidation failed: {e}")
+
+    def counter(self, name):
+        try:
+            return int(self.client.get(self.prefix + name) or 0)
+        except self.errors as e:
+            logger.warning(f"Cache read failed: {e}")
+            return None
+
+    def incr(self, name):
+        try:
+            self.client.incr(self.prefix + name)
+        except self.errors as e:
+            logger.warning(f"Cache invalidation failed: {e}")
+
+    def size(self):
+        return None
+
+
+class NullBackend:
+    """Caching disabled; conditional GETs still work"""
+
+    name = 'none'
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def counter(self, name):
+        return None
+
+    def incr(self, name):
+        pass
+
+    def size(self):
+        return 0
+
+
+class ResponseCache:
+    """Read-through cache of serialized responses with hit/miss counters"""
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record_key(self, table_name, record_id, fields=None):
+        generation = self.backend.counter(f'{table_name}:records')
+        if not fields:
+            return f'{table_name}:record:{generation}:{record_id}'
+        # Projected variants are not deleted with their record, so they
+        # carry the list generation, which every write to the table bumps
+        lists = self.backend.counter(f'{table_name}:lists')
+        return f'{table_name}:record:{generation}.{lists}:{record_id}:{",".join(fields)}'
+
+    def list_key(self, table_name, args):
+        generation = self.backend.counter(f'{table_name}:lists')
+        query = urlencode(sorted(args.items(multi=True)))
+        digest = hashlib.blake2b(query.encode('utf-8'), digest_size=16).hexdigest()
+        return f'{table_name}:list:{generation}:{digest}'
+
+    def lookup(self, key):
+        """Return the cached entry for key, or None, counting the hit or miss"""
+        entry = self.backend.get(key)
+        with self.lock:
+            if entry is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry
+
+    def generation(self, table_name):
+        """Counter bumped by every write to a table; read before loading"""
+        return self.backend.counter(f'{table_name}:lists')
+
+    def store(self, table_name, generation, key, entry):
+        """Cache a loaded entry unless the table was written while loading it"""
+        if (entry is not None and generation is not None
+                and self.generation(table_name) == generation):
+            self.backend.set(key, entry, self.ttl)
+
+    def get_or_load(self, table_name, key, load, store=True):
+        """Return the entry for key, calling load() to build it on a miss.
+
+        load() returns a CachedResponse, or None when there is nothing to
+        cache (e.g. a missing record). With store=False a loaded entry is
+        served but not cached.
+        """
+        entry = self.lookup(key)
+        if entry is None:
+            generation = self.generation(table_name)
+            entry = load()
+            if store:
+                self.store(table_name, generation, key, entry)
+        return entry
+
+    def invalidate_record(self, table_name, record_id):
+        """Drop a written record and every list of its table"""
+        self.backend.delete(self.record_key(table_name, record_id))
+        self.backend.incr(f'{table_name}:lists')
+
+    def invalidate_table(self, table_name):
+        """Drop every record and list of a table after a bulk write"""
+        self.backend.incr(f'{table_name}:records')
+        self.backend.incr(f'{table_name}:lists')
+
+    def status(self):
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "backend": self.backend.name,
+            "entries": self.backend.size(),
+            "hits": hits,
+            "misses": misses,
+            "hitRatio": round(hits / lookups, 4) if lookups else None,
+        }
+
+
+def create_response_cache():
+    """Build the cache configured by CACHE_BACKEND"""
+    if CACHE_BACKEND == 'redis':
+        backend = RedisBackend(os.getenv('CACHE_URL', 'redis://localhost:6379/0'))
+    elif CACHE_BACKEND == 'none':
+        backend = NullBackend()
+    elif CACHE_BACKEND == 'memory':
+        backend = MemoryBackend(CACHE_MAX_ENTRIES)
+    else:
+        raise RuntimeError(f"Unknown CACHE_BACKEND '{CACHE_BACKEND}'")
+    return ResponseCache(backend, CACHE_TTL)
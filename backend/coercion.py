@@ -0,0 +1,97 @@
+"""Conversion between API wire values and native column types.
+
+Dates, times and coordinates are stored as DATE, TIME and FLOAT columns but
+keep the wire format the API has always used: dates as YYYY-MM-DD, times as
+HH:MM and coordinates as decimal strings.
+"""
+from datetime import date, datetime, time
+
+from sqlalchemy import Date, DateTime, Float, Time
+
+
+class ValidationError(ValueError):
+    """Raised when a request value cannot be stored in its column"""
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD (or ISO datetime) string into a date"""
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    value = str(value).strip()
+    if not value:
+        return None
+    return date.fromisoformat(value[:10])
+
+
+def parse_time(value):
+    """Parse an HH:MM or HH:MM:SS string into a time"""
+    if value is None or isinstance(value, time):
+        return value
+    value = str(value).strip()
+    if not value:
+        return None
+    return time.fromisoformat(value)
+
+
+def parse_float(value):
+    """Parse a number or numeric string into a float"""
+    if value is None or isinstance(value, float):
+        return value
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+    return float(value)
+
+
+def parse_datetime(value):
+    """Parse an ISO datetime string into a datetime"""
+    if value is None or isinstance(value, datetime):
+        return value
+    value = str(value).strip()
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+
+PARSERS = {
+    Date: parse_date,
+    Time: parse_time,
+    Float: parse_float,
+    DateTime: parse_datetime,
+}
+
+
+def column_parser(column):
+    """Return the parser for a column's type, or None for pass-through columns"""
+    for column_type, parser in PARSERS.items():
+        if isinstance(column.type, column_type):
+            return parser
+    return None
+
+
+def coerce_values(table, data):
+    """Keep only table columns from data, converting values to column types"""
+    values = {}
+    for column in table.columns:
+        if column.name not in data:
+            continue
+        value = data[column.name]
+        parser = column_parser(column)
+        if parser is not None:
+            try:
+                value = parser(value)
+            except (TypeError, ValueError):
+                raise ValidationError(f"Field '{column.name}' has an invalid value: {value!r}")
+        values[column.name] = value
+    return values
+
+
+def format_time(value):
+    """Format a time as HH:MM, keeping seconds only when they are set"""
+    if value.second or value.microsecond:
+        return value.isoformat()
+    return value.strftime('%H:%M')
+
@@ -0,0 +1,172 @@
+"""Negotiated gzip/brotli compression of API responses.
+
+install_compression hooks a Flask app so that JSON, NDJSON and text bodies
+are compressed when the client's Accept-Encoding allows it. Brotli is
+preferred when the brotli package is installed, gzip otherwise. Small bodies
+are sent as they are: below a few hundred bytes the framing costs more than
+it saves.
+
+    COMPRESS_MIN_SIZE      smallest body compressed, in bytes (default 1024)
+    COMPRESS_LEVEL         gzip level, 1-9 (default 6)
+    BROTLI_QUALITY         brotli quality, 0-11 (default 4; higher is much slower)
+    COMPRESS_CACHE_ENTRIES compressed bodies kept by ETag (default 500, 0 disables)
+
+Server-Sent Event streams (text/event-stream) are never compressed.
+
+Cached responses carry an ETag digest of their body, so their compressed
+form is memoized by (ETag, encoding) and a hot list is compressed once, not
+on every request. Streamed responses (exports) are compressed chunk by
+chunk with a sync flush after each one, so clients still receive rows as
+they are read. Compressed responses get a weak ETag, which If-None-Match
+still matches, and Vary: Accept-Encoding.
+"""
+import gzip
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 4))
+COMPRESS_CACHE_ENTRIES = int(os.getenv('COMPRESS_CACHE_ENTRIES', 500))
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+# Event streams are sent as they are: per-event gzip framing adds overhead and
+# invites proxies to buffer the stream
+UNCOMPRESSED_TYPES = ('text/event-stream',)
+
+# Server preference, best first
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encoding):
+    """The best encoding the client accepts, or None for identity"""
+    if not accept_encoding:
+        return None
+    return parse_accept_header(accept_encoding).best_match(ENCODINGS)
+
+
+def compressible(mimetype):
+    return (bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+            and not mimetype.startswith(UNCOMPRESSED_TYPES))
+
+
+def compress(body, encoding):
+    """Compress a complete body"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of byte chunks, flushing after each one"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class CompressedBodies:
+    """Compressed bodies by (ETag, encoding), least recently used first out"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get_or_compress(self, etag, body, encoding):
+        if not self.max_entries or not etag:
+            return compress(body, encoding)
+        key = (etag, encoding)
+        with self.lock:
+            compressed = self.entries.get(key)
+            if compressed is not None:
+                self.entries.move_to_end(key)
+                return compressed
+        compressed = compress(body, encoding)
+        with self.lock:
+            self.entries[key] = compressed
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return compressed
+
+
+compressed_bodies = CompressedBodies(COMPRESS_CACHE_ENTRIES)
+
+
+def add_vary(headers):
+    vary = headers.get('Vary')
+    if not vary:
+        headers['Vary'] = 'Accept-Encoding'
+    elif 'accept-encoding' not in vary.lower():
+        headers['Vary'] = f'{vary}, Accept-Encoding'
+
+
+def weaken_etag(etag_header):
+    """The weak form of an ETag header, since the encoded bytes differ"""
+    if not etag_header or etag_header.startswith('W/'):
+        return etag_header
+    return f'W/{etag_header}'
+
+
+def compress_body(body, accept_encoding, etag=None):
+    """Return (body, encoding) for a complete body, encoding None when left as is"""
+    if len(body) < COMPRESS_MIN_SIZE:
+        return body, None
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return body, None
+    return compressed_bodies.get_or_compress(etag, body, encoding), encoding
+
+
+def compress_response(response):
+    """after_request hook compressing a Flask response when worthwhile"""
+    if 'Content-Encoding' in response.headers or not compressible(response.mimetype):
+        return response
+    add_vary(response.headers)
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+
+    if response.is_streamed:
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+        response.response = compress_stream(response.iter_encoded(), encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        etag, _ = response.get_etag()
+        body, encoding = compress_body(
+            response.get_data(), request.headers.get('Accept-Encoding'), etag)
+        if encoding is None:
+            return response
+        response.set_data(body)
+
+    response.headers['Content-Encoding'] = encoding
+    if 'ETag' in response.headers:
+        response.headers['ETag'] = weaken_etag(response.headers['ETag'])
+    return response
+
+
+def install_compression(app):
+    """Compress the responses of a Flask app"""
+    app.after_request(compress_response)
@@ -0,0 +1,224 @@
+"""Engine construction with environment-driven connection pool settings.
+
+    DB_POOL_SIZE           persistent connections per process (default 5)
+    DB_MAX_OVERFLOW        extra connections allowed under burst (default 10)
+    DB_POOL_TIMEOUT        seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE        seconds before a connection is replaced (default 1800)
+    DB_POOL_PRE_PING       test connections on checkout (default true)
+    DB_STATEMENT_TIMEOUT   Postgres statement timeout in milliseconds (default off)
+    DB_PGBOUNCER           true when connecting through PgBouncer in transaction
+                           pooling mode; disables the local pool (default false)
+
+Connections inherited across fork() are discarded in the child, so an engine
+created before gunicorn forks its workers (e.g. with --preload) is safe.
+
+create_async_database_engine builds the asyncio equivalent (asyncpg, or
+aiosqlite for SQLite) with the same settings for the ASGI entry point.
+"""
+import importlib.util
+import logging
+import os
+import threading
+import time
+import weakref
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+
+def env_flag(name, default):
+    return os.getenv(name, str(default)).lower() in ('1', 'true', 'yes')
+
+
+class PoolStats:
+    """Checkout wait time totals for one pool"""
+
+    # Upper bounds of the wait-time histogram buckets, in seconds
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.bucket_counts = [0] * len(self.BUCKETS)
+
+    def record(self, waited):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            for i, bound in enumerate(self.BUCKETS):
+                if waited <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+
+    def record_timeout(self):
+        with self.lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "checkouts": self.checkouts,
+                "waitSecondsTotal": round(self.wait_total, 6),
+                "waitSecondsMax": round(self.wait_max, 6),
+                "timeouts": self.timeouts,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        self.stats = kwargs.pop('stats', None) or PoolStats()
+        super().__init__(*args, **kwargs)
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_timeout()
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """InstrumentedQueuePool for asyncio engines"""
+
+
+def pool_status(engine):
+    """Return pool occupancy and checkout wait statistics for an engine"""
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checkedOut": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "idle": pool.checkedin(),
+        })
+    stats = getattr(pool, 'stats', None)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
+
+
+def engine_options(url):
+    """Build create_engine keyword arguments from the environment"""
+    url = make_url(url)
+    options = {}
+
+    if url.get_backend_name() == 'postgresql':
+        if env_flag('DB_PGBOUNCER', False):
+            # PgBouncer owns the pool; a second pool in front of it only
+            # pins server connections.
+            options['poolclass'] = NullPool
+        else:
+            options.update(
+                poolclass=InstrumentedQueuePool,
+                pool_size=int(os.getenv('DB_POOL_SIZE', 5)),
+                max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 10)),
+                pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', 30)),
+                pool_recycle=int(os.getenv('DB_POOL_RECYCLE', 1800)),
+            )
+        options['pool_pre_ping'] = env_flag('DB_POOL_PRE_PING', True)
+
+        statement_timeout = os.getenv('DB_STATEMENT_TIMEOUT')
+        if statement_timeout:
+            if env_flag('DB_PGBOUNCER', False):
+                # Startup options are rejected by PgBouncer and SET would leak
+                # across transactions; configure it on the role instead.
+                logger.warning("DB_STATEMENT_TIMEOUT is ignored with DB_PGBOUNCER; "
+                               "use ALTER ROLE ... SET statement_timeout")
+            else:
+                options['connect_args'] = {'options': f'-c statement_timeout={int(statement_timeout)}'}
+    return options
+
+
+def dispose_after_fork(engine):
+    """Drop pooled connections inherited from the parent in a forked child"""
+    reference = weakref.ref(engine)
+
+    def reset():
+        inherited = reference()
+        if inherited is not None:
+            # close=False leaves the parent's sockets alone
+            inherited.dispose(close=False)
+            if hasattr(inherited.pool, 'stats'):
+                inherited.pool.stats = PoolStats()
+
+    os.register_at_fork(after_in_child=reset)
+
+
+def create_database_engine(url):
+    """Create an engine configured from the environment and safe across fork()"""
+    engine = create_engine(url, **engine_options(url))
+    dispose_after_fork(engine)
+    return engine
+
+
+# Drivers used by create_async_database_engine, and the packages providing them
+ASYNC_DRIVERS = {
+    'postgresql': ('postgresql+asyncpg', 'asyncpg'),
+    'sqlite': ('sqlite+aiosqlite', 'aiosqlite'),
+}
+
+
+def async_engine_options(url):
+    """Translate engine_options for an asyncio driver"""
+    options = engine_options(url)
+    if options.get('poolclass') is InstrumentedQueuePool:
+        options['poolclass'] = InstrumentedAsyncQueuePool
+
+    # asyncpg takes server settings and TLS mode as connect arguments
+    # rather than libpq options and URL parameters
+    connect_args = options.pop('connect_args', {})
+    if 'options' in connect_args:
+        timeout = connect_args.pop('options').split('=', 1)[1]
+        connect_args['server_settings'] = {'statement_timeout': timeout}
+    url = make_url(url)
+    if url.get_backend_name() == 'postgresql' and 'sslmode' in url.query:
+        connect_args['ssl'] = url.query['sslmode']
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def async_url(url):
+    """Rewrite a database URL to use the asyncio driver for its backend"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No asyncio driver configured for '{backend}'")
+    drivername, package = ASYNC_DRIVERS[backend]
+    if importlib.util.find_spec(package) is None:
+        raise RuntimeError(f"The asyncio driver for '{backend}' needs the {package} package; "
+                           f"install it with `pip install {package}`")
+    # libpq-only parameters (e.g. Neon's sslmode/channel_binding) are not
+    # understood by asyncpg
+    if backend == 'postgresql':
+        url = url.difference_update_query(['sslmode', 'channel_binding'])
+    return url.set(drivername=drivername)
+
+
+def create_async_database_engine(url):
+    """Create an asyncio engine configured like create_database_engine"""
+    # Imported here: the asyncio extension loads the ORM, which the WSGI app
+    # never uses and would add to every worker's cold start
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(async_url(url), **async_engine_options(url))
+    dispose_after_fork(engine.sync_engine)
+    return engine
@@ -0,0 +1,284 @@
+"""Server-Sent Events feed of lead and meeting changes.
+
+GET /api/events streams every create, update and delete as it is committed,
+so open pages can patch the rows they hold instead of refetching lists:
+
+    id: <token>
+    event: change
+    data: {"seq": 42, "type": "leads", "id": "...", "op": "upsert", "record": {...}}
+
+Changes come from the record_changes log that delta sync reads (see
+sync.py), so they include writes made by the importer, jobs and other
+processes, and event ids are sync tokens. A reconnecting EventSource sends
+the last id as Last-Event-ID (or pass ?lastEventId=, or a token from GET
+/api/sync) and the stream first replays what it missed. Like sync, it
+replays the latest state of each record rather than every intermediate
+change, and a change may be delivered twice; apply them as upserts and
+deletes by id.
+
+One ChangeFeed per process reads the log and fans each page of changes out
+to its subscribers. It reads when woken: on PostgreSQL by a statement-level
+trigger that NOTIFYs record_changes (migration 12), elsewhere, or while the
+LISTEN connection is down, by write requests served by this process, and in
+any case every EVENTS_POLL_INTERVAL seconds.
+
+Each subscriber buffers at most EVENTS_QUEUE_PAGES pages. A client that
+falls further behind loses its buffer and catches up by reading the change
+log from its last event id, so a slow connection costs no more memory than
+a fast one and still misses nothing.
+
+    EVENTS_POLL_INTERVAL      seconds between change log reads when nothing wakes the feed (default 2)
+    EVENTS_HEARTBEAT_SECONDS  seconds between keep-alive comments on an idle stream (default 15)
+    EVENTS_QUEUE_PAGES        pages buffered per connection before it falls back to the log (default 100)
+    EVENTS_MAX_SUBSCRIBERS    open streams per process; more are refused with 503 (default 100)
+
+Every open stream holds a connection for as long as the page is open, so
+streams are served from asgi.py (opt in by running it instead of wsgi.py)
+or by threaded WSGI servers. A gunicorn sync worker, as the Procfile runs,
+would be held by one stream until the page closes; there the route answers
+503 and the pages poll instead.
+"""
+import logging
+import os
+import select as selectors
+import threading
+from collections import deque
+
+from models import leads, meetings
+from serializers import RowSerializer, encode_json
+from sync import SYNC_PAGE_SIZE, SyncError, current_token, decode_token, fetch_changes
+
+EVENTS_POLL_INTERVAL = float(os.getenv('EVENTS_POLL_INTERVAL', 2))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
+EVENTS_QUEUE_PAGES = int(os.getenv('EVENTS_QUEUE_PAGES', 100))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv('EVENTS_MAX_SUBSCRIBERS', 100))
+
+NOTIFY_CHANNEL = 'record_changes'
+
+# Milliseconds an EventSource waits before reconnecting
+RETRY_MS = 3000
+
+TABLES = {'leads': leads, 'meetings': meetings}
+SERIALIZERS = {name: RowSerializer(table.columns) for name, table in TABLES.items()}
+
+logger = logging.getLogger(__name__)
+
+
+class FeedFull(Exception):
+    """Raised when a process already serves EVENTS_MAX_SUBSCRIBERS streams"""
+
+
+def blocking_server(environ):
+    """Whether environ comes from a gunicorn sync worker, which a stream would hold"""
+    return (environ.get('SERVER_SOFTWARE', '').startswith('gunicorn')
+            and not environ.get('wsgi.multithread'))
+
+
+def parse_last_event_id(headers, args):
+    """The token to resume from, or None to start at the latest change"""
+    token = headers.get('Last-Event-ID') or args.get('lastEventId')
+    if not token:
+        return None
+    try:
+        decode_token(token)
+    except SyncError:
+        raise SyncError("Invalid 'Last-Event-ID'")
+    return token
+
+
+def format_changes(changes, token):
+    """SSE frames for a page of changes; only the last one carries the page's token"""
+    frames = []
+    for i, change in enumerate(changes):
+        event_id = f'id: {token}\n' if i == len(changes) - 1 else ''
+        frames.append(f'{event_id}event: change\ndata: '.encode() + encode_json(change) + b'\n\n')
+    return b''.join(frames)
+
+
+class Subscription:
+    """One stream's bounded buffer of pages, with its position in the change log"""
+
+    def __init__(self, token, catching_up, max_pages=EVENTS_QUEUE_PAGES, notify=None):
+        self.token = token
+        self.max_pages = max_pages
+        self.pages = deque()
+        # Set when the buffer overflowed (or the client resumed); the stream
+        # then reads the change log from its token before taking pages again
+        self.catching_up = catching_up
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        # Asyncio streams pass a callback that wakes their event loop
+        self.notify = notify or self.ready.set
+
+    def deliver(self, page):
+        with self.lock:
+            if self.catching_up:
+                return
+            if len(self.pages) >= self.max_pages:
+                self.catching_up = True
+                self.pages.clear()
+            else:
+                self.pages.append(page)
+        self.notify()
+
+    def take(self):
+        """Buffered (changes, token) pages, or None when the log must be read first"""
+        with self.lock:
+            if self.catching_up:
+                # Pages published from here on are buffered; earlier ones are in the log
+                self.catching_up = False
+                self.pages.clear()
+                return None
+            pages = list(self.pages)
+            self.pages.clear()
+            return pages
+
+    def wait(self, timeout):
+        """Block until a page is delivered; False on timeout"""
+        return self.ready.wait(timeout)
+
+
+class ChangeFeed:
+    """Reads the change log of one process and fans it out to its subscribers"""
+
+    def __init__(self, engine, max_subscribers=EVENTS_MAX_SUBSCRIBERS):
+        self.engine = engine
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.token = None
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.listening = False
+        self.pid = None
+
+    def ensure_started(self):
+        """Start the reader (and listener) threads in this process; they do not survive fork()"""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.token = current_token(self.engine)
+            self.subscribers = set()
+            threads = [threading.Thread(target=self.run, name='change-feed', daemon=True)]
+            if self.engine.dialect.name == 'postgresql':
+                threads.append(threading.Thread(target=self.listen, name='change-feed-listen', daemon=True))
+            self.pid = os.getpid()
+            for thread in threads:
+                thread.start()
+
+    def subscribe(self, token=None, notify=None):
+        """A Subscription from token (None: from now on)"""
+        self.ensure_started()
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                raise FeedFull()
+            subscription = Subscription(token or self.token, token is not None, notify=notify)
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def notify(self):
+        """Read the log now, after a write committed in this process"""
+        self.wake.set()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+
+    def read_page(self, token):
+        """Return (changes, next token, more) after token"""
+        return fetch_changes(self.engine, TABLES, SERIALIZERS, decode_token(token), SYNC_PAGE_SIZE)
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.wake.wait(EVENTS_POLL_INTERVAL)
+            self.wake.clear()
+            try:
+                self.advance()
+            except Exception as e:
+                logger.error(f"Error reading the change log: {e}")
+
+    def advance(self):
+        """Publish every change after the feed's token"""
+        with self.lock:
+            idle = not self.subscribers
+        if idle:
+            # Nobody to tell; skip reading (and serializing) the changes
+            token = current_token(self.engine)
+            with self.lock:
+                self.token = token
+            return
+        more = True
+        while more:
+            changes, token, more = self.read_page(self.token)
+            with self.lock:
+                self.token = token
+                subscribers = list(self.subscribers)
+            if changes:
+                for subscription in subscribers:
+                    subscription.deliver((changes, token))
+
+    def listen(self):
+        """Wake the reader on every NOTIFY from the change triggers (PostgreSQL)"""
+        while not self.stopping.is_set():
+            connection = None
+            try:
+                # A connection of its own, outside the pool, in autocommit mode
+                connection = self.engine.raw_connection()
+                connection.detach()
+                driver = connection.driver_connection
+                driver.autocommit = True
+                with driver.cursor() as cursor:
+                    cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+                self.listening = True
+                logger.info("Change feed listening for notifications")
+                while not self.stopping.is_set():
+                    if selectors.select([driver], [], [], EVENTS_POLL_INTERVAL)[0]:
+                        driver.poll()
+                        if driver.notifies:
+                            driver.notifies.clear()
+                            self.wake.set()
+            except Exception as e:
+                logger.warning(f"Change feed LISTEN connection failed, polling instead: {e}")
+            finally:
+                self.listening = False
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            self.stopping.wait(EVENTS_POLL_INTERVAL)
+
+    def status(self):
+        with self.lock:
+            subscribers = len(self.subscribers)
+        return {"subscribers": subscribers, "listening": self.listening}
+
+
+def stream(feed, subscription, heartbeat=EVENTS_HEARTBEAT_SECONDS):
+    """Generate the SSE body of a subscription until the client disconnects"""
+    try:
+        yield f'retry: {RETRY_MS}\n\n'.encode()
+        while True:
+            subscription.ready.clear()
+            pages = subscription.take()
+            if pages is None:
+                more = True
+                while more:
+                    changes, token, more = feed.read_page(subscription.token)
+                    subscription.token = token
+                    if changes:
+                        yield format_changes(changes, token)
+                continue
+            for changes, token in pages:
+                subscription.token = token
+                yield format_changes(changes, token)
+            if not pages and not subscription.wait(heartbeat):
+                yield b': keep-alive\n\n'
+    finally:
+        feed.unsubscribe(subscription)
@@ -0,0 +1,64 @@
+"""Streaming full-table exports.
+
+Rows are read through a server-side cursor in fixed-size partitions and
+serialized partition by partition, so memory stays bounded by the chunk size
+no matter how large the table is.
+"""
+import logging
+import os
+
+from sqlalchemy import and_, select
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 1000))
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'json': ('application/json', 'json'),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def stream_partitions(engine, query, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of rows read through a server-side cursor"""
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True, yield_per=chunk_size).execute(query)
+        for partition in result.partitions():
+            yield partition
+
+
+def export_query(table, conditions, columns=None):
+    """Select every row of table matching conditions, in primary key order"""
+    query = select(*columns) if columns else select(table)
+    if conditions:
+        query = query.where(and_(*conditions))
+    return query.order_by(table.c.id)
+
+
+def generate_ndjson(engine, query, serializer):
+    """Yield NDJSON chunks, one line per row"""
+    for partition in stream_partitions(engine, query):
+        yield serializer.dumps_ndjson(partition)
+
+
+def generate_json_array(engine, query, serializer):
+    """Yield a JSON array in chunks; the opening bracket is sent immediately"""
+    yield b'['
+    first = True
+    for partition in stream_partitions(engine, query):
+        # dumps() returns a complete array; keep only its elements
+        body = serializer.dumps(partition)[1:-1]
+        yield body if first else b',' + body
+        first = False
+    yield b']'
+
+
+def generate_export(engine, query, serializer, export_format):
+    """Yield the export body, logging (not raising) errors after headers are sent"""
+    generate = generate_ndjson if export_format == 'ndjson' else generate_json_array
+    try:
+        yield from generate(engine, query, serializer)
+    except Exception:
+        # The status line is already sent; a truncated body signals the failure
+        logger.exception("Export stream failed")
@@ -0,0 +1,290 @@
+"""Follow-up queues and reminders over leads.nextFollowUpDate.
+
+A lead is due for follow-up on its nextFollowUpDate and overdue after it,
+unless its status is closed (lost or converted). Both read endpoints are
+index range scans on the follow-up date rather than scans of leads:
+
+    GET /api/followups/due       a rep's (or everyone's) due leads, oldest follow-up first
+    GET /api/followups/overdue   overdue and due-today counts per rep, in one grouped query
+
+The reminder sweeper keeps the next day's follow-ups in a heap ordered by
+reminder time (FOLLOWUP_REMIND_HOUR on the follow-up date). It sleeps until
+the earliest one is due, then pops every due entry and records the batch in
+followup_reminders with a single insert. The (lead, follow-up date) key of
+that table makes each reminder fire once, however many processes sweep, and
+a rescheduled follow-up gets a new reminder. The heap is reloaded every
+FOLLOWUP_REFRESH_SECONDS and after bulk lead writes; entries whose lead
+changed since are dropped when they are popped.
+
+    FOLLOWUP_SWEEPER          thread (default): web processes sweep in a background
+                              thread; process: `python followups.py` sweeps; off
+    FOLLOWUP_CLOSED_STATUSES  comma separated statuses that never come due (default lost,converted)
+    FOLLOWUP_REMIND_HOUR      local hour reminders fire on the follow-up date (default 9)
+    FOLLOWUP_GRACE_DAYS       overdue follow-ups older than this get no late reminder (default 7)
+    FOLLOWUP_REFRESH_SECONDS  seconds between reloads of the heap (default 300)
+    FOLLOWUP_BATCH_SIZE       reminders written per insert (default 500)
+
+Sales reps read their reminders from GET /api/followups/reminders.
+
+    python followups.py
+"""
+import argparse
+import heapq
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, time as time_of_day, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import create_database_engine
+from models import followup_reminders, leads
+from pagination import (QueryError, decode_cursor, keyset_condition, parse_date_arg, parse_fields,
+                        parse_limit, select_columns)
+
+FOLLOWUP_SWEEPER = os.getenv('FOLLOWUP_SWEEPER', 'thread')
+FOLLOWUP_CLOSED_STATUSES = [status.strip() for status in
+                            os.getenv('FOLLOWUP_CLOSED_STATUSES', 'lost,converted').split(',')
+                            if status.strip()]
+FOLLOWUP_REMIND_HOUR = int(os.getenv('FOLLOWUP_REMIND_HOUR', 9))
+FOLLOWUP_GRACE_DAYS = int(os.getenv('FOLLOWUP_GRACE_DAYS', 7))
+FOLLOWUP_REFRESH_SECONDS = float(os.getenv('FOLLOWUP_REFRESH_SECONDS', 300))
+FOLLOWUP_BATCH_SIZE = int(os.getenv('FOLLOWUP_BATCH_SIZE', 500))
+
+# Reminders returned by one GET /api/followups/reminders
+MAX_REMINDERS = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def open_condition():
+    """Leads with a follow-up scheduled and a status that can come due"""
+    conditions = [leads.c.nextFollowUpDate.isnot(None)]
+    if FOLLOWUP_CLOSED_STATUSES:
+        conditions.append(leads.c.leadStatus.notin_(FOLLOWUP_CLOSED_STATUSES))
+    return and_(*conditions)
+
+
+def parse_due_args(args, today):
+    """Return (rep, until, fields, limit, cursor) from the due queue arguments"""
+    until = parse_date_arg(args, 'until') or today
+    cursor = args.get('after')
+    if cursor:
+        cursor = decode_cursor(cursor, leads.c.nextFollowUpDate)
+    return args.get('rep') or None, until, parse_fields(leads, args), parse_limit(args), cursor
+
+
+def due_query(rep, until, fields=None, limit=None, cursor=None):
+    """Open leads due on or before until, oldest follow-up first.
+
+    Ordered by (nextFollowUpDate, id) to match the follow-up indexes; the
+    query fetches one extra row when limit is given, as build_list_query does.
+    """
+    column = leads.c.nextFollowUpDate
+    conditions = [open_condition(), column <= until]
+    if rep:
+        conditions.append(leads.c.assignedSalesRep == rep)
+    if cursor:
+        conditions.append(keyset_condition(leads, column, False, *cursor))
+    query = (select(*select_columns(leads, fields, column))
+             .where(*conditions).order_by(column, leads.c.id))
+    return query if limit is None else query.limit(limit + 1)
+
+
+def overdue_counts(connection, today, rep=None):
+    """Overdue and due-today lead counts per rep, from one grouped query"""
+    column = leads.c.nextFollowUpDate
+    overdue = func.sum(case((column < today, 1), else_=0))
+    query = (select(leads.c.assignedSalesRep, overdue, func.count())
+             .where(open_condition(), column <= today)
+             .group_by(leads.c.assignedSalesRep))
+    if rep:
+        query = query.where(leads.c.assignedSalesRep == rep)
+    reps = {name: {"overdue": int(late), "dueToday": total - int(late)}
+            for name, late, total in connection.execute(query)}
+    return {
+        "date": today.isoformat(),
+        "overdue": sum(counts['overdue'] for counts in reps.values()),
+        "dueToday": sum(counts['dueToday'] for counts in reps.values()),
+        "reps": reps,
+    }
+
+
+def parse_reminder_args(args):
+    """Return (rep, since, limit) from the reminder list arguments"""
+    since = args.get('since')
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            raise QueryError("'since' must be an ISO 8601 timestamp")
+    limit = min(parse_limit(args), MAX_REMINDERS)
+    return args.get('rep') or None, since or None, limit
+
+
+def fetch_reminders(connection, rep=None, since=None, limit=100):
+    """Reminders sent after since, newest first"""
+    query = (select(followup_reminders)
+             .order_by(followup_reminders.c.remindedAt.desc()).limit(limit))
+    if rep:
+        query = query.where(followup_reminders.c.assignedSalesRep == rep)
+    if since:
+        query = query.where(followup_reminders.c.remindedAt > since)
+    return [{
+        "leadId": row.leadId,
+        "leadName": row.leadName,
+        "assignedSalesRep": row.assignedSalesRep,
+        "followUpDate": row.followUpDate.isoformat(),
+        "remindedAt": row.remindedAt.isoformat(),
+    } for row in connection.execute(query)]
+
+
+def remind_at(follow_up_date):
+    """When the reminder for a follow-up on follow_up_date is due"""
+    return datetime.combine(follow_up_date, time_of_day(FOLLOWUP_REMIND_HOUR))
+
+
+class ReminderSweeper:
+    """Background thread emitting follow-up reminders as they come due"""
+
+    def __init__(self, engine, batch_size=FOLLOWUP_BATCH_SIZE):
+        self.engine = engine
+        self.batch_size = batch_size
+        # (remind at, lead id, follow-up date)
+        self.heap = []
+        self.loaded_at = None
+        self.stale = True
+        self.emitted = 0
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def ensure_started(self):
+        """Start the thread in this process; it does not survive fork()"""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.heap, self.stale = [], True
+            self.thread = threading.Thread(target=self.run, name='followup-sweeper', daemon=True)
+            self.thread.start()
+
+    def invalidate(self):
+        """Reload the heap before the next sweep, after leads changed in bulk"""
+        self.stale = True
+        self.wake.set()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+        if self.thread:
+            self.thread.join()
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                self.sweep(datetime.now())
+            except Exception as e:
+                logger.error(f"Error sweeping follow-up reminders: {e}")
+                self.stale = True
+            self.wake.wait(self.wait_seconds(datetime.now()))
+            self.wake.clear()
+
+    def wait_seconds(self, now):
+        """Seconds until the next reminder or reload is due"""
+        wait = FOLLOWUP_REFRESH_SECONDS
+        if self.loaded_at is not None:
+            wait = FOLLOWUP_REFRESH_SECONDS - (time.monotonic() - self.loaded_at)
+        if self.heap:
+            wait = min(wait, (self.heap[0][0] - now).total_seconds())
+        return max(wait, 0.01)
+
+    def reload(self, today):
+        """Load the unreminded follow-ups from the grace window through tomorrow"""
+        reminded = and_(followup_reminders.c.leadId == leads.c.id,
+                        followup_reminders.c.followUpDate == leads.c.nextFollowUpDate)
+        query = (select(leads.c.id, leads.c.nextFollowUpDate)
+                 .outerjoin(followup_reminders, reminded)
+                 .where(open_condition(),
+                        leads.c.nextFollowUpDate >= today - timedelta(days=FOLLOWUP_GRACE_DAYS),
+                        leads.c.nextFollowUpDate <= today + timedelta(days=1),
+                        followup_reminders.c.leadId.is_(None)))
+        with self.engine.connect() as connection:
+            heap = [(remind_at(day), lead_id, day) for lead_id, day in connection.execute(query)]
+        heapq.heapify(heap)
+        self.heap = heap
+        self.loaded_at = time.monotonic()
+        self.stale = False
+
+    def sweep(self, now):
+        """Emit every reminder due at now; return how many were emitted"""
+        refresh_due = (self.loaded_at is None
+                       or time.monotonic() - self.loaded_at >= FOLLOWUP_REFRESH_SECONDS)
+        if self.stale or refresh_due:
+            self.reload(now.date())
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, lead_id, day = heapq.heappop(self.heap)
+            due.append((lead_id, day))
+        emitted = 0
+        for start in range(0, len(due), self.batch_size):
+            emitted += self.emit(due[start:start + self.batch_size], now)
+        return emitted
+
+    def emit(self, due, now):
+        """Record a batch of reminders; return how many were new"""
+        scheduled = dict(due)
+        with self.engine.begin() as connection:
+            # Leads edited since the heap was loaded are dropped here
+            current = connection.execute(
+                select(leads.c.id, leads.c.leadName, leads.c.assignedSalesRep, leads.c.nextFollowUpDate)
+                .where(leads.c.id.in_(list(scheduled)), open_condition())).all()
+            values = [{'leadId': row.id, 'followUpDate': row.nextFollowUpDate,
+                       'leadName': row.leadName, 'assignedSalesRep': row.assignedSalesRep,
+                       'remindedAt': now}
+                      for row in current if row.nextFollowUpDate == scheduled[row.id]]
+            if not values:
+                return 0
+            dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+            # Another process may have reminded some of these already
+            statement = (dialect.insert(followup_reminders).values(values)
+                         .on_conflict_do_nothing(index_elements=['leadId', 'followUpDate'])
+                         .returning(followup_reminders.c.assignedSalesRep))
+            reps = Counter(connection.execute(statement).scalars())
+        total = sum(reps.values())
+        self.emitted += total
+        for rep, count in reps.items():
+            logger.info(f"Sent {count} follow-up reminders to {rep}")
+        return total
+
+    def status(self):
+        return {"scheduled": len(self.heap), "emitted": self.emitted}
+
+
+def main(argv):
+    argparse.ArgumentParser(description="Send follow-up reminders as they come due").parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    sweeper = ReminderSweeper(create_database_engine(os.getenv('DATABASE_URL')))
+    sweeper.ensure_started()
+    logger.info("Follow-up reminder sweeper running")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sweeper.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
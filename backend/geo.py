@@ -0,0 +1,461 @@
+"""Nearby, bounding-box and nearest-N queries over meeting locations.
+
+With PostGIS (enabled by migration 7 when the extension is available), the
+queries run in the database against a GiST index on the meeting location:
+ST_DWithin for radius filters, && for bounding boxes and the <-> operator
+for nearest-first ordering.
+
+Without it, an in-process grid index over latitude/longitude is built lazily
+from the table and kept current by the write handlers, like the local search
+index. The grid narrows a query to a few cells, exact great-circle distances
+rank the candidates, and the other filters are applied by the database to
+the nearest candidates first. Each worker holds its own copy. Once it is
+GEO_INDEX_TTL seconds old a background thread builds a new grid while
+queries keep using the current one, then swaps it in.
+
+Distances are haversine great-circle kilometres, computed over whole arrays
+with numpy when it is installed.
+"""
+import logging
+import math
+import os
+import threading
+import time
+
+from sqlalchemy import and_, func, select, text
+
+from coercion import parse_date, parse_float
+from pagination import filter_conditions
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+GEO_INDEX_TTL = int(os.getenv('GEO_INDEX_TTL', 60))
+# Grid cell edge in degrees; 0.1 is about 11 km north-south
+GEO_GRID_CELL_DEGREES = float(os.getenv('GEO_GRID_CELL_DEGREES', 0.1))
+
+DEFAULT_NEARBY_LIMIT = 50
+MAX_NEARBY_LIMIT = 500
+
+EARTH_RADIUS_KM = 6371.0088
+# Half the earth's circumference: no two points are further apart
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Candidate ids sent to the database per filtering query
+CANDIDATE_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class GeoError(ValueError):
+    """Raised when geo query parameters are invalid"""
+
+
+def location_expression(table):
+    """The indexed PostGIS geography of a meeting; must match migration 7"""
+    point = func.ST_SetSRID(func.ST_MakePoint(table.c.longitude, table.c.latitude), 4326)
+    return func.geography(point)
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Distances in km from (lat, lng) to each point of two sequences"""
+    if numpy is not None:
+        lat1, lng1 = numpy.radians(lat), numpy.radians(lng)
+        lat2 = numpy.radians(numpy.asarray(lats, dtype=float))
+        lng2 = numpy.radians(numpy.asarray(lngs, dtype=float))
+        a = (numpy.sin((lat2 - lat1) / 2) ** 2
+             + numpy.cos(lat1) * numpy.cos(lat2) * numpy.sin((lng2 - lng1) / 2) ** 2)
+        return (2 * EARTH_RADIUS_KM * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))).tolist()
+
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    cos_lat1 = math.cos(lat1)
+    distances = []
+    for lat2, lng2 in zip(lats, lngs):
+        lat2, lng2 = math.radians(lat2), math.radians(lng2)
+        a = (math.sin((lat2 - lat1) / 2) ** 2
+             + cos_lat1 * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+        distances.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0))))
+    return distances
+
+
+class GridIndex:
+    """Fixed-size latitude/longitude cells -> meeting ids"""
+
+    def __init__(self, cell_degrees=GEO_GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.columns = math.ceil(360 / cell_degrees)
+        self.cells = {}   # (row, column) -> {id: (lat, lng)}
+        self.points = {}  # id -> cell
+
+    def cell(self, lat, lng):
+        row = int((lat + 90) // self.cell_degrees)
+        column = int((lng + 180) // self.cell_degrees) % self.columns
+        return row, column
+
+    def add(self, row_id, lat, lng):
+        self.remove(row_id)
+        if lat is None or lng is None:
+            return
+        cell = self.cell(lat, lng)
+        self.cells.setdefault(cell, {})[row_id] = (lat, lng)
+        self.points[row_id] = cell
+
+    def remove(self, row_id):
+        cell = self.points.pop(row_id, None)
+        if cell is not None:
+            members = self.cells[cell]
+            del members[row_id]
+            if not members:
+                del self.cells[cell]
+
+    def points_in(self, min_lat, max_lat, min_lng, max_lng):
+        """Yield (id, lat, lng) in cells overlapping the box; the longitude
+        range may extend past +-180 and wraps around"""
+        first_row, _ = self.cell(max(min_lat, -90), 0)
+        last_row, _ = self.cell(min(max_lat, 90), 0)
+        if max_lng - min_lng >= 360:
+            columns = None
+        else:
+            first = int((min_lng + 180) // self.cell_degrees)
+            last = int((max_lng + 180) // self.cell_degrees)
+            columns = {column % self.columns for column in range(first, last + 1)}
+
+        rows = range(first_row, last_row + 1)
+        cell_count = len(rows) * (self.columns if columns is None else len(columns))
+        if cell_count <= len(self.cells):
+            cells = ((row, column) for row in rows
+                     for column in (range(self.columns) if columns is None else columns))
+        else:
+            # A large box: cheaper to scan the occupied cells
+            cells = (cell for cell in list(self.cells)
+                     if first_row <= cell[0] <= last_row and (columns is None or cell[1] in columns))
+        for cell in cells:
+            for row_id, (lat, lng) in self.cells.get(cell, {}).items():
+                yield row_id, lat, lng
+
+    def within(self, lat, lng, radius_km):
+        """Return [(distance, id, lat, lng)] for points within radius_km, nearest first"""
+        delta_lat = radius_km / KM_PER_DEGREE
+        min_lat, max_lat = lat - delta_lat, lat + delta_lat
+        widest = max(abs(min_lat), abs(max_lat))
+        if widest >= 90:
+            delta_lng = 180
+        else:
+            delta_lng = min(180, delta_lat / math.cos(math.radians(widest)))
+
+        candidates = list(self.points_in(min_lat, max_lat, lng - delta_lng, lng + delta_lng))
+        if not candidates:
+            return []
+        ids, lats, lngs = zip(*candidates)
+        distances = haversine_km(lat, lng, lats, lngs)
+        hits = [hit for hit in zip(distances, ids, lats, lngs) if hit[0] <= radius_km]
+        hits.sort()
+        return hits
+
+    def nearest(self, lat, lng, max_radius_km=None):
+        """Yield batches of within() hits in increasing distance order,
+        searching outwards in rings of doubling radius"""
+        limit = min(max_radius_km or MAX_DISTANCE_KM, MAX_DISTANCE_KM)
+        radius = self.cell_degrees * KM_PER_DEGREE
+        previous = -1.0
+        while True:
+            radius = min(radius, limit)
+            batch = [hit for hit in self.within(lat, lng, radius) if hit[0] > previous]
+            if batch:
+                yield batch
+            if radius >= limit:
+                return
+            previous = radius
+            radius *= 2
+
+
+def parse_coordinate(args, name, bound):
+    try:
+        value = parse_float(args.get(name))
+    except ValueError:
+        raise GeoError(f"'{name}' must be a number")
+    if value is not None and not -bound <= value <= bound:
+        raise GeoError(f"'{name}' must be between -{bound} and {bound}")
+    return value
+
+
+def parse_nearby_args(args):
+    """Return (lat, lng, radius km, bbox, limit) from request arguments.
+
+    Either lat and lng (optionally with radius) or bbox is required. With
+    only a bbox, results are ordered by distance from its centre.
+    """
+    lat = parse_coordinate(args, 'lat', 90)
+    lng = parse_coordinate(args, 'lng', 180)
+    if (lat is None) != (lng is None):
+        raise GeoError("'lat' and 'lng' must be given together")
+
+    try:
+        radius = parse_float(args.get('radius'))
+    except ValueError:
+        raise GeoError("'radius' must be a number of kilometres")
+    if radius is not None and radius <= 0:
+        raise GeoError("'radius' must be positive")
+
+    bbox = None
+    if args.get('bbox'):
+        try:
+            bbox = [float(value) for value in args['bbox'].split(',')]
+        except ValueError:
+            bbox = []
+        if len(bbox) != 4:
+            raise GeoError("'bbox' must be minLng,minLat,maxLng,maxLat")
+        min_lng, min_lat, max_lng, max_lat = bbox
+        if not (-180 <= min_lng <= max_lng <= 180 and -90 <= min_lat <= max_lat <= 90):
+            raise GeoError("'bbox' must be minLng,minLat,maxLng,maxLat within -180..180, -90..90 "
+                           "and may not cross the antimeridian")
+
+    if lat is None:
+        if bbox is None:
+            raise GeoError("'lat' and 'lng', or 'bbox', are required")
+        if radius is not None:
+            raise GeoError("'radius' requires 'lat' and 'lng'")
+        lat, lng = (bbox[1] + bbox[3]) / 2, (bbox[0] + bbox[2]) / 2
+
+    try:
+        limit = int(args.get('limit', DEFAULT_NEARBY_LIMIT))
+    except ValueError:
+        raise GeoError("'limit' must be an integer")
+    if limit < 1:
+        raise GeoError("'limit' must be positive")
+    return lat, lng, radius, bbox, min(limit, MAX_NEARBY_LIMIT)
+
+
+def in_bbox(lat, lng, bbox):
+    min_lng, min_lat, max_lng, max_lat = bbox
+    return min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+
+
+class LocalGeo:
+    """Nearby queries answered from an in-process grid index.
+
+    Grids are built outside the lock. The first query waits for the initial
+    build; after that a stale grid keeps serving queries while a background
+    thread builds its replacement. Writes recorded during a build are
+    replayed onto the new grid before it is swapped in.
+    """
+
+    def __init__(self, engine, table):
+        self.engine = engine
+        self.table = table
+        self.lock = threading.Lock()
+        self.built = threading.Condition(self.lock)
+        self.index = None
+        self.built_at = -math.inf
+        self.pending = None   # (id, lat, lng) written since the running build started
+        self.stale = False    # invalidated while a build was running
+
+    def grid(self):
+        with self.lock:
+            while self.index is None and self.pending is not None:
+                self.built.wait()
+            index = self.index
+            if index is not None and time.monotonic() - self.built_at < GEO_INDEX_TTL:
+                return index
+            if self.pending is not None:
+                return index
+            self.pending = []
+        if index is not None:
+            threading.Thread(target=self.rebuild_in_background, name='geo-index', daemon=True).start()
+            return index
+        return self.rebuild()
+
+    def build_grid(self):
+        index = GridIndex()
+        table = self.table
+        with self.engine.connect() as connection:
+            result = connection.execution_options(yield_per=5000).execute(
+                select(table.c.id, table.c.latitude, table.c.longitude)
+                .where(table.c.latitude.is_not(None), table.c.longitude.is_not(None)))
+            for row_id, lat, lng in result:
+                index.add(row_id, lat, lng)
+        return index
+
+    def rebuild(self):
+        """Build a grid outside the lock and swap it in"""
+        try:
+            index = self.build_grid()
+        except Exception:
+            with self.lock:
+                self.pending, self.stale = None, False
+                self.built.notify_all()
+            raise
+        with self.lock:
+            for row_id, lat, lng in self.pending:
+                index.add(row_id, lat, lng)
+            self.index = index
+            self.built_at = -math.inf if self.stale else time.monotonic()
+            self.pending, self.stale = None, False
+            self.built.notify_all()
+        return index
+
+    def rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            # The current grid keeps serving; the next query tries again
+            logger.error(f"Rebuilding the meeting location grid failed: {e}")
+
+    def record_write(self, row):
+        with self.lock:
+            if self.index is not None:
+                self.index.add(row.id, row.latitude, row.longitude)
+            if self.pending is not None:
+                self.pending.append((row.id, row.latitude, row.longitude))
+
+    def record_delete(self, row_id):
+        with self.lock:
+            if self.index is not None:
+                self.index.remove(row_id)
+            if self.pending is not None:
+                self.pending.append((row_id, None, None))
+
+    def invalidate(self):
+        with self.lock:
+            self.index = None
+            if self.pending is not None:
+                self.stale = True
+
+    def nearby(self, lat, lng, radius, bbox, conditions, limit):
+        """Return up to limit (row, distance km) pairs, nearest first"""
+        index = self.grid()
+        if bbox is not None:
+            # The box bounds the search: nothing outside its farthest corner
+            corners = haversine_km(lat, lng, [bbox[1], bbox[1], bbox[3], bbox[3]],
+                                   [bbox[0], bbox[2], bbox[0], bbox[2]])
+            radius = min(radius or MAX_DISTANCE_KM, max(corners))
+
+        table = self.table
+        found = []
+        batches = index.nearest(lat, lng, radius)
+        with self.engine.connect() as connection:
+            while True:
+                # Each ring is computed under the lock; the database is queried outside it
+                with self.lock:
+                    batch = next(batches, None)
+                if batch is None:
+                    break
+                if bbox is not None:
+                    batch = [hit for hit in batch if in_bbox(hit[2], hit[3], bbox)]
+                for start in range(0, len(batch), CANDIDATE_BATCH_SIZE):
+                    chunk = {row_id: distance for distance, row_id, _, _
+                             in batch[start:start + CANDIDATE_BATCH_SIZE]}
+                    query = select(table).where(table.c.id.in_(chunk), *conditions)
+                    rows = connection.execute(query).all()
+                    rows.sort(key=lambda row: (chunk[row.id], row.id))
+                    found.extend((row, chunk[row.id]) for row in rows)
+                    if len(found) >= limit:
+                        return found[:limit]
+        return found
+
+
+class PostgisGeo:
+    """Nearby queries executed by PostGIS against the migration 7 GiST index"""
+
+    def __init__(self, engine, table):
+        self.engine = engine
+        self.table = table
+
+    def record_write(self, row):
+        pass
+
+    def record_delete(self, row_id):
+        pass
+
+    def invalidate(self):
+        pass
+
+    def nearby(self, lat, lng, radius, bbox, conditions, limit):
+        table = self.table
+        location = location_expression(table)
+        origin = func.geography(func.ST_SetSRID(func.ST_MakePoint(lng, lat), 4326))
+        distance = (func.ST_Distance(location, origin) / 1000).label('distanceKm')
+
+        # The located-rows predicate matches the partial index
+        where = [table.c.latitude.is_not(None), table.c.longitude.is_not(None), *conditions]
+        if radius is not None:
+            where.append(func.ST_DWithin(location, origin, radius * 1000))
+        if bbox is not None:
+            envelope = func.geography(func.ST_MakeEnvelope(*bbox, 4326))
+            where.append(location.op('&&')(envelope))
+
+        query = (select(table, distance).where(and_(*where))
+                 .order_by(location.op('<->')(origin)).limit(limit))
+        with self.engine.connect() as connection:
+            return [(row, row.distanceKm) for row in connection.execute(query)]
+
+
+def create_geo_backend(engine, table):
+    """Use PostGIS when the extension is installed"""
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as connection:
+            installed = connection.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")).first()
+        if installed:
+            return PostgisGeo(engine, table)
+    return LocalGeo(engine, table)
+
+
+def run_nearby(backend, table, serializer, args):
+    """Parse a nearby request and return its JSON body"""
+    lat, lng, radius, bbox, limit = parse_nearby_args(args)
+    conditions = filter_conditions(table, args)
+    hits = backend.nearby(lat, lng, radius, bbox, conditions, limit)
+    return {
+        "center": {"lat": lat, "lng": lng},
+        "radiusKm": radius,
+        "bbox": bbox,
+        "results": [{
+            "id": row.id,
+            "distanceKm": round(float(distance), 3),
+            "record": serializer.to_dict(row),
+        } for row, distance in hits],
+    }
+
+
+def plan_route(engine, table, serializer, args, today):
+    """Order one day's meetings for travel.
+
+    Greedy nearest-neighbour from the start point (lat/lng, or the earliest
+    located meeting): each leg goes to the closest unvisited meeting.
+    Meetings without coordinates are listed last, by time.
+    """
+    try:
+        day = parse_date(args.get('date')) or today
+    except ValueError:
+        raise GeoError("'date' must be YYYY-MM-DD")
+    lat = parse_coordinate(args, 'lat', 90)
+    lng = parse_coordinate(args, 'lng', 180)
+    if (lat is None) != (lng is None):
+        raise GeoError("'lat' and 'lng' must be given together")
+
+    conditions = filter_conditions(table, args)
+    query = (select(table).where(table.c.meetingDate == day, *conditions)
+             .order_by(table.c.meetingTime, table.c.id))
+    with engine.connect() as connection:
+        rows = connection.execute(query).all()
+
+    located = [row for row in rows if row.latitude is not None and row.longitude is not None]
+    unlocated = [row for row in rows if row.latitude is None or row.longitude is None]
+    if lat is None and located:
+        lat, lng = located[0].latitude, located[0].longitude
+
+    stops, total = [], 0.0
+    while located:
+        distances = haversine_km(lat, lng, [row.latitude for row in located],
+                                 [row.longitude for row in located])
+        nearest = min(range(len(located)), key=distances.__getitem__)
+        row = located.pop(nearest)
+        total += distances[nearest]
+        stops.append({"legKm": round(distances[nearest], 3), "record": serializer.to_dict(row)})
+        lat, lng = row.latitude, row.longitude
+    stops.extend({"legKm": None, "record": serializer.to_dict(row)} for row in unlocated)
+    return {"date": day.isoformat(), "totalKm": round(total, 3), "stops": stops}
@@ -0,0 +1,475 @@
+"""Server-side geocoding with a persistent, shared cache.
+
+Lookups go through three tiers: an in-process LRU (cache.MemoryBackend), the
+geocode_cache table shared by every worker and user, and finally the
+provider. Addresses are cached under a normalized key (case, accents,
+punctuation and spacing folded) and reverse lookups under coordinates
+rounded to about a metre, so every rep geocoding the same client office
+shares one entry. Misses are cached too, for a shorter time. Concurrent
+identical lookups in a process share one provider call.
+
+    GEOCODER                nominatim (default), stub, or module:Class for a custom provider
+    NOMINATIM_URL           Nominatim base URL (default the public OpenStreetMap server)
+    GEOCODER_USER_AGENT     User-Agent sent to Nominatim, which requires one
+    GEOCODE_TTL_DAYS        days a found result is reused (default 90)
+    GEOCODE_MISS_TTL_HOURS  hours a not-found result is reused (default 24)
+    GEOCODE_CACHE_MAX_ROWS  table size bound, least recently used rows pruned first (default 100000)
+    GEOCODE_BATCH_MAX_MISSES  provider lookups per batch request; the rest are reported pending (default 10)
+    GEOCODE_STUB_FILE       JSON {address: [lat, lng, display name]} for the stub provider
+
+Meetings imported without coordinates can be geocoded from their location
+in bulk:
+
+    python geocoding.py --meetings [--limit 500]
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from cache import MemoryBackend
+from database import create_database_engine
+from models import geocode_cache, meetings
+
+GEOCODER = os.getenv('GEOCODER', 'nominatim')
+NOMINATIM_URL = os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+GEOCODER_USER_AGENT = os.getenv('GEOCODER_USER_AGENT', 'FieldSense Meeting App')
+GEOCODE_TTL_DAYS = int(os.getenv('GEOCODE_TTL_DAYS', 90))
+GEOCODE_MISS_TTL_HOURS = int(os.getenv('GEOCODE_MISS_TTL_HOURS', 24))
+GEOCODE_CACHE_MAX_ROWS = int(os.getenv('GEOCODE_CACHE_MAX_ROWS', 100000))
+# Nominatim answers one lookup a second, so this bounds a batch request to about 10 s
+GEOCODE_BATCH_MAX_MISSES = int(os.getenv('GEOCODE_BATCH_MAX_MISSES', 10))
+
+# In-process tier: entries and how long they are trusted before re-reading the table
+MEMORY_ENTRIES = 10000
+MEMORY_TTL = 3600
+
+# Nominatim's usage policy allows one request per second
+NOMINATIM_MIN_INTERVAL = 1.0
+
+# Rows written between table size checks
+PRUNE_INTERVAL = 100
+
+MAX_BATCH_ADDRESSES = 100
+
+# Reverse lookups are keyed on coordinates rounded to 5 places (about 1 m)
+COORDINATE_PLACES = 5
+
+GeocodeResult = namedtuple('GeocodeResult', ['latitude', 'longitude', 'address'])
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodeError(ValueError):
+    """Raised when geocoding parameters are invalid"""
+
+
+class GeocodeProviderError(RuntimeError):
+    """Raised when the provider cannot be reached or fails"""
+
+
+def normalize_address(address):
+    """Fold case, accents, punctuation and spacing into a cache key"""
+    folded = unicodedata.normalize('NFKD', address)
+    folded = ''.join(ch for ch in folded if not unicodedata.combining(ch)).lower()
+    return ' '.join(re.findall(r'\w+', folded))
+
+
+def address_key(address):
+    return 'address:' + normalize_address(address)
+
+
+def coordinate_key(lat, lng):
+    return f'reverse:{lat:.{COORDINATE_PLACES}f},{lng:.{COORDINATE_PLACES}f}'
+
+
+class NominatimProvider:
+    """OpenStreetMap Nominatim, rate limited per process"""
+
+    def __init__(self, base_url=NOMINATIM_URL, user_agent=GEOCODER_USER_AGENT):
+        self.base_url = base_url.rstrip('/')
+        self.user_agent = user_agent
+        self.lock = threading.Lock()
+        self.last_request = 0.0
+
+    def request(self, path, params):
+        url = f'{self.base_url}/{path}?{urllib.parse.urlencode({**params, "format": "json"})}'
+        request = urllib.request.Request(url, headers={
+            'Accept': 'application/json', 'User-Agent': self.user_agent})
+        with self.lock:
+            wait = self.last_request + NOMINATIM_MIN_INTERVAL - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self.last_request = time.monotonic()
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return json.load(response)
+        except (urllib.error.URLError, TimeoutError, ValueError) as e:
+            raise GeocodeProviderError(f"Nominatim request failed: {e}")
+
+    def geocode(self, address):
+        places = self.request('search', {'q': address, 'limit': 1})
+        if not places:
+            return None
+        place = places[0]
+        return GeocodeResult(float(place['lat']), float(place['lon']), place.get('display_name'))
+
+    def reverse(self, lat, lng):
+        place = self.request('reverse', {'lat': lat, 'lon': lng, 'zoom': 18})
+        if not place or 'error' in place:
+            return None
+        return GeocodeResult(float(place['lat']), float(place['lon']), place.get('display_name'))
+
+
+class StubProvider:
+    """Offline provider for development and tests.
+
+    Known addresses come from GEOCODE_STUB_FILE; any other address gets
+    stable coordinates derived from its normalized form, and addresses
+    containing "nowhere" are not found.
+    """
+
+    def __init__(self, path=None):
+        self.places = {}
+        path = path or os.getenv('GEOCODE_STUB_FILE')
+        if path:
+            with open(path, encoding='utf-8') as f:
+                for address, (lat, lng, name) in json.load(f).items():
+                    self.places[normalize_address(address)] = GeocodeResult(lat, lng, name)
+
+    def geocode(self, address):
+        key = normalize_address(address)
+        if key in self.places:
+            return self.places[key]
+        if 'nowhere' in key:
+            return None
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        lat = int.from_bytes(digest[:4], 'big') / 2 ** 32 * 120 - 60
+        lng = int.from_bytes(digest[4:], 'big') / 2 ** 32 * 360 - 180
+        return GeocodeResult(round(lat, 6), round(lng, 6), address)
+
+    def reverse(self, lat, lng):
+        return GeocodeResult(lat, lng, f'{lat:.6f}, {lng:.6f}')
+
+
+PROVIDERS = {
+    'nominatim': NominatimProvider,
+    'stub': StubProvider,
+}
+
+
+def create_provider(name=GEOCODER):
+    """Instantiate a named provider, or module:Class"""
+    if name in PROVIDERS:
+        return PROVIDERS[name]()
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise RuntimeError(f"Unknown GEOCODER '{name}'")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class SingleFlight:
+    """Run one call per key at a time; concurrent callers share its result"""
+
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = self.Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+
+class Geocoder:
+    """Tiered geocoding cache in front of a provider"""
+
+    def __init__(self, engine, provider):
+        self.engine = engine
+        self.provider = provider
+        self.memory = MemoryBackend(MEMORY_ENTRIES)
+        self.flight = SingleFlight()
+        self.lock = threading.Lock()
+        self.counts = {'memory': 0, 'database': 0, 'provider': 0}
+        self.writes = 0
+
+    def count(self, tier):
+        with self.lock:
+            self.counts[tier] += 1
+
+    def is_fresh(self, row, now):
+        if row.found:
+            return row.createdAt >= now - timedelta(days=GEOCODE_TTL_DAYS)
+        return row.createdAt >= now - timedelta(hours=GEOCODE_MISS_TTL_HOURS)
+
+    def read_rows(self, connection, keys):
+        """Return {key: result or None} for fresh table rows, touching their lastUsedAt"""
+        now = datetime.now()
+        rows = connection.execute(select(geocode_cache).where(geocode_cache.c.key.in_(keys))).all()
+        found, stale_use = {}, []
+        for row in rows:
+            if not self.is_fresh(row, now):
+                continue
+            found[row.key] = GeocodeResult(row.latitude, row.longitude, row.address) if row.found else None
+            # Recency only matters at day granularity; avoid a write per hit
+            if row.lastUsedAt < now - timedelta(days=1):
+                stale_use.append(row.key)
+        if stale_use:
+            connection.execute(update(geocode_cache).where(geocode_cache.c.key.in_(stale_use))
+                               .values(lastUsedAt=now))
+        return found
+
+    def write_rows(self, connection, entries):
+        """Upsert {key: (query, result or None)} into the table"""
+        now = datetime.now()
+        values = [{
+            'key': key, 'query': query, 'found': result is not None,
+            'latitude': result.latitude if result else None,
+            'longitude': result.longitude if result else None,
+            'address': result.address if result else None,
+            'createdAt': now, 'lastUsedAt': now,
+        } for key, (query, result) in entries.items()]
+        dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+        statement = dialect.insert(geocode_cache)
+        statement = statement.on_conflict_do_update(
+            index_elements=['key'],
+            set_={column: statement.excluded[column] for column in
+                  ('query', 'found', 'latitude', 'longitude', 'address', 'createdAt', 'lastUsedAt')})
+        connection.execute(statement, values)
+
+        with self.lock:
+            before = self.writes
+            self.writes += len(values)
+            due = before // PRUNE_INTERVAL != self.writes // PRUNE_INTERVAL
+        if due:
+            self.prune(connection)
+
+    def prune(self, connection):
+        """Drop the least recently used rows beyond GEOCODE_CACHE_MAX_ROWS"""
+        excess = connection.execute(select(func.count()).select_from(geocode_cache)).scalar() \
+            - GEOCODE_CACHE_MAX_ROWS
+        if excess > 0:
+            oldest = (select(geocode_cache.c.key).order_by(geocode_cache.c.lastUsedAt)
+                      .limit(excess).scalar_subquery())
+            connection.execute(delete(geocode_cache).where(geocode_cache.c.key.in_(oldest)))
+            logger.info(f"Pruned {excess} geocode cache rows")
+
+    def lookup(self, key, query, fetch):
+        """Return (result or None, tier that answered) for one cache key"""
+        cached = self.memory.get(key)
+        if cached is not None:
+            self.count('memory')
+            return cached[0], 'memory'
+
+        def load():
+            with self.engine.begin() as connection:
+                rows = self.read_rows(connection, [key])
+            if key in rows:
+                self.count('database')
+                tier = 'database'
+                result = rows[key]
+            else:
+                self.count('provider')
+                tier = 'provider'
+                result = fetch()
+                with self.engine.begin() as connection:
+                    self.write_rows(connection, {key: (query, result)})
+            # Wrapped so a cached miss is distinguishable from no entry
+            self.memory.set(key, (result,), MEMORY_TTL)
+            return result, tier
+
+        return self.flight.do(key, load)
+
+    def geocode(self, address):
+        """Coordinates for an address: (GeocodeResult or None, tier)"""
+        address = address.strip()
+        if not normalize_address(address):
+            raise GeocodeError("'address' must contain letters or digits")
+        return self.lookup(address_key(address), address, lambda: self.provider.geocode(address))
+
+    def reverse(self, lat, lng):
+        """Address for coordinates: (GeocodeResult or None, tier)"""
+        lat, lng = round(lat, COORDINATE_PLACES), round(lng, COORDINATE_PLACES)
+        return self.lookup(coordinate_key(lat, lng), f'{lat},{lng}',
+                           lambda: self.provider.reverse(lat, lng))
+
+    def geocode_many(self, addresses, max_misses=GEOCODE_BATCH_MAX_MISSES):
+        """Return ({address: GeocodeResult or None}, pending addresses).
+
+        The table is read once for every address not in memory. Only the
+        first max_misses distinct misses (all of them when None) go to the
+        provider, each cached as soon as it is answered; the others are
+        returned as pending so the caller can ask again later.
+        """
+        keys = {}
+        for address in addresses:
+            if normalize_address(address):
+                keys.setdefault(address_key(address), []).append(address)
+
+        results = {}
+        missing = []
+        for key in keys:
+            cached = self.memory.get(key)
+            if cached is not None:
+                self.count('memory')
+                results[key] = cached[0]
+            else:
+                missing.append(key)
+        if missing:
+            with self.engine.begin() as connection:
+                rows = self.read_rows(connection, missing)
+            for key, result in rows.items():
+                self.count('database')
+                results[key] = result
+                self.memory.set(key, (result,), MEMORY_TTL)
+
+        pending = []
+        misses = 0
+        for key in keys:
+            if key in results:
+                continue
+            if max_misses is not None and misses >= max_misses:
+                pending.append(key)
+                continue
+            misses += 1
+            query = keys[key][0].strip()
+            results[key], _ = self.lookup(key, query, lambda: self.provider.geocode(query))
+
+        found = {address: results[key] for key, group in keys.items() if key in results for address in group}
+        return found, [address for key in pending for address in keys[key]]
+
+    def status(self):
+        with self.lock:
+            return dict(self.counts)
+
+
+def result_body(query, result, tier):
+    return {
+        "query": query,
+        "latitude": result.latitude,
+        "longitude": result.longitude,
+        "address": result.address,
+        "cached": tier != 'provider',
+    }
+
+
+def run_geocode(geocoder, args):
+    """Handle a forward (address=) or reverse (lat=&lng=) lookup; None if not found"""
+    address = args.get('address')
+    if address:
+        result, tier = geocoder.geocode(address)
+        return result and result_body(address, result, tier)
+
+    try:
+        lat, lng = float(args['lat']), float(args['lng'])
+    except KeyError:
+        raise GeocodeError("'address', or 'lat' and 'lng', are required")
+    except ValueError:
+        raise GeocodeError("'lat' and 'lng' must be numbers")
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise GeocodeError("'lat' and 'lng' are out of range")
+    result, tier = geocoder.reverse(lat, lng)
+    return result and result_body(f'{lat},{lng}', result, tier)
+
+
+def parse_batch(payload):
+    """Return the address list from a batch request body"""
+    addresses = payload.get('addresses') if isinstance(payload, dict) else payload
+    if not isinstance(addresses, list) or not all(isinstance(a, str) for a in addresses):
+        raise GeocodeError("Body must be a list of addresses or {\"addresses\": [...]}")
+    if len(addresses) > MAX_BATCH_ADDRESSES:
+        raise GeocodeError(f"A batch may contain at most {MAX_BATCH_ADDRESSES} addresses")
+    return addresses
+
+
+def geocode_meetings(engine, geocoder, limit=None, batch_size=MAX_BATCH_ADDRESSES):
+    """Fill in coordinates for meetings that have a location but none; return (updated, not found)"""
+    updated = not_found = 0
+    last_id = ''
+    write = (update(meetings).where(meetings.c.id == bindparam('_id'))
+             .values(latitude=bindparam('_latitude'), longitude=bindparam('_longitude'),
+                     updatedAt=bindparam('_updatedAt')))
+    while limit is None or updated + not_found < limit:
+        size = batch_size if limit is None else min(batch_size, limit - updated - not_found)
+        with engine.connect() as connection:
+            batch = connection.execute(
+                select(meetings.c.id, meetings.c.location)
+                .where(meetings.c.id > last_id, meetings.c.location != '',
+                       meetings.c.latitude.is_(None) | meetings.c.longitude.is_(None))
+                .order_by(meetings.c.id).limit(size)).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        results, _ = geocoder.geocode_many([row.location for row in batch], max_misses=None)
+        now = datetime.now()
+        params = []
+        for row in batch:
+            result = results.get(row.location)
+            if result is None:
+                not_found += 1
+            else:
+                params.append({'_id': row.id, '_latitude': result.latitude,
+                               '_longitude': result.longitude, '_updatedAt': now})
+        if params:
+            with engine.begin() as connection:
+                connection.execute(write, params)
+            updated += len(params)
+        logger.info(f"Geocoded meetings: {updated} updated, {not_found} not found")
+    return updated, not_found
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Geocode meetings that have no coordinates")
+    parser.add_argument('--meetings', action='store_true', required=True)
+    parser.add_argument('--limit', type=int, help="stop after this many meetings")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    engine = create_database_engine(os.getenv('DATABASE_URL'))
+    geocode_meetings(engine, Geocoder(engine, create_provider()), limit=args.limit)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
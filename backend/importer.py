@@ -0,0 +1,310 @@
+"""Bulk, idempotent import of leads and meetings.
+
+Records are read incrementally from JSON arrays, NDJSON or CSV files,
+validated and converted one at a time, and written in batches with a single
+multi-row upsert per batch (INSERT ... ON CONFLICT (id)), so re-running an
+import is safe. Rows that fail validation, or that the database rejects,
+are reported individually instead of aborting the import.
+
+Large migrations should use the command line rather than the HTTP endpoint:
+
+    python importer.py data/leads.json
+    python importer.py exports/meetings.ndjson --batch-size 5000 --on-conflict skip
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import uuid
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+from coercion import ValidationError, coerce_values
+from database import create_database_engine
+from models import leads, meetings
+from validation import validate_lead, validate_meeting
+
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+
+# Rejected rows echoed back in full; the rest are only counted
+MAX_REPORTED_REJECTS = 100
+
+TABLES = {
+    'leads': (leads, validate_lead),
+    'meetings': (meetings, validate_meeting),
+}
+
+ON_CONFLICT_CHOICES = ('update', 'skip')
+
+EXTENSIONS = {
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.csv': 'csv',
+}
+
+# Characters that can continue a JSON number
+NUMBER_CHARS = '0123456789.eE+-'
+
+logger = logging.getLogger(__name__)
+
+
+class ImportFormatError(ValueError):
+    """Raised when an import file cannot be parsed"""
+
+
+def read_json_array(f, chunk_size=65536):
+    """Yield the elements of a top-level JSON array without loading the file"""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size)
+    position = 0
+    eof = False
+
+    def skip(chars):
+        nonlocal buffer, position, eof
+        while True:
+            while position < len(buffer) and buffer[position] in chars:
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            buffer, position = f.read(chunk_size), 0
+            eof = not buffer
+
+    skip(' \t\r\n')
+    if buffer[position:position + 1] != '[':
+        raise ImportFormatError("Expected a JSON array")
+    position += 1
+
+    while True:
+        skip(' \t\r\n,')
+        if position >= len(buffer):
+            raise ImportFormatError("Unterminated JSON array")
+        if buffer[position] == ']':
+            return
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+                error = None
+            except json.JSONDecodeError as e:
+                error = e
+            else:
+                # A number that ends the buffer may continue in the next chunk
+                if (eof or (end < len(buffer) and buffer[end] not in NUMBER_CHARS)
+                        or buffer[end:].lstrip(NUMBER_CHARS)):
+                    break
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                if error is None:
+                    break
+                raise ImportFormatError(f"Invalid JSON: {error}")
+            buffer = buffer[position:] + chunk
+            position = 0
+        yield value
+        # The buffer is only compacted when the next chunk is read
+        position = end
+
+
+def read_ndjson(f):
+    """Yield one JSON value per non-blank line.
+
+    Unparseable lines are yielded as ImportFormatError instances so they are
+    reported as rejects rather than stopping the import.
+    """
+    for number, line in enumerate(f, start=1):
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ImportFormatError(f"Line {number}: {e}")
+
+
+def read_csv(f):
+    """Yield one dict per CSV row, keyed by the header line"""
+    for row in csv.DictReader(f):
+        yield row
+
+
+READERS = {
+    'json': read_json_array,
+    'ndjson': read_ndjson,
+    'csv': read_csv,
+}
+
+
+def detect_format(path):
+    """Pick a reader from the file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise ImportFormatError(f"Unsupported file type '{extension}'")
+    return EXTENSIONS[extension]
+
+
+def upsert_statement(connection, table, on_conflict):
+    """Build a multi-row INSERT that resolves id conflicts as requested"""
+    if connection.dialect.name == 'postgresql':
+        statement = postgresql.insert(table)
+    elif connection.dialect.name == 'sqlite':
+        statement = sqlite.insert(table)
+    else:
+        return insert(table)
+
+    if on_conflict == 'skip':
+        return statement.on_conflict_do_nothing(index_elements=['id'])
+    updated = {c.name: statement.excluded[c.name] for c in table.columns
+               if c.name not in ('id', 'createdAt')}
+    return statement.on_conflict_do_update(index_elements=['id'], set_=updated)
+
+
+class ImportResult:
+    """Running totals for one table import"""
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.processed = 0
+        self.written = 0
+        self.rejected = 0
+        self.rejects = []
+
+    def reject(self, index, record_id, error):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append({"row": index, "id": record_id, "error": error})
+
+    def to_dict(self):
+        return {
+            "processed": self.processed,
+            "written": self.written,
+            "rejected": self.rejected,
+            "rejects": self.rejects,
+        }
+
+
+def prepare_record(table, validate, record, now):
+    """Validate a raw record and return a full row of column values"""
+    if isinstance(record, Exception):
+        raise ValidationError(str(record))
+    if not isinstance(record, dict):
+        raise ValidationError("Record must be an object")
+    is_valid, error_msg = validate(record)
+    if not is_valid:
+        raise ValidationError(error_msg)
+
+    record = dict(record)
+    if not record.get('id'):
+        record['id'] = str(uuid.uuid4())
+    if not record.get('createdAt'):
+        record['createdAt'] = now
+    if not record.get('updatedAt'):
+        record['updatedAt'] = record['createdAt']
+
+    values = coerce_values(table, record)
+    # executemany needs the same keys in every parameter set
+    return {column.name: values.get(column.name) for column in table.columns}
+
+
+def write_batch(engine, table, batch, on_conflict, result):
+    """Write a batch in one statement, isolating bad rows if the batch fails"""
+    # A multi-row upsert may not touch the same id twice; the last copy wins
+    unique = {}
+    for index, row in batch:
+        unique[row['id']] = (index, row)
+    batch = list(unique.values())
+
+    try:
+        with engine.begin() as connection:
+            statement = upsert_statement(connection, table, on_conflict)
+            connection.execute(statement, [row for _, row in batch])
+        result.written += len(batch)
+        return
+    except Exception as e:
+        if len(batch) == 1:
+            index, row = batch[0]
+            result.reject(index, row['id'], str(getattr(e, 'orig', e)))
+            return
+
+    for index, row in batch:
+        write_batch(engine, table, [(index, row)], on_conflict, result)
+
+
+def import_records(engine, table_name, records, batch_size=IMPORT_BATCH_SIZE,
+                   on_conflict='update', progress=None):
+    """Import an iterable of raw records into a table and return an ImportResult"""
+    table, validate = TABLES[table_name]
+    result = ImportResult(table_name)
+    now = datetime.now()
+    batch = []
+
+    for index, record in enumerate(records):
+        result.processed += 1
+        try:
+            batch.append((index, prepare_record(table, validate, record, now)))
+        except ValidationError as e:
+            record_id = record.get('id') if isinstance(record, dict) else None
+            result.reject(index, record_id, str(e))
+
+        if len(batch) >= batch_size:
+            write_batch(engine, table, batch, on_conflict, result)
+            batch = []
+            if progress:
+                progress(result)
+
+    if batch:
+        write_batch(engine, table, batch, on_conflict, result)
+    if progress:
+        progress(result)
+    return result
+
+
+def import_file(engine, path, table_name=None, **options):
+    """Import a JSON, NDJSON or CSV file; the table defaults to the file name"""
+    if table_name is None:
+        table_name = os.path.splitext(os.path.basename(path))[0]
+    if table_name not in TABLES:
+        raise ImportFormatError(f"Unknown table '{table_name}'")
+    reader = READERS[detect_format(path)]
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        return import_records(engine, table_name, reader(f), **options)
+
+
+def find_data_file(data_dir, table_name):
+    """Return the first <table>.json/.ndjson/.jsonl/.csv file in data_dir"""
+    for extension in EXTENSIONS:
+        path = os.path.join(data_dir, table_name + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def log_progress(result):
+    logger.info(f"{result.table_name}: {result.processed} processed, "
+                f"{result.written} written, {result.rejected} rejected")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Import leads or meetings from a data file")
+    parser.add_argument('path', help="JSON array, NDJSON/JSONL or CSV file")
+    parser.add_argument('--table', choices=sorted(TABLES), help="defaults to the file name")
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument('--on-conflict', choices=ON_CONFLICT_CHOICES, default='update')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    engine = create_database_engine(os.getenv('DATABASE_URL'))
+
+    result = import_file(engine, args.path, args.table, batch_size=args.batch_size,
+                         on_conflict=args.on_conflict, progress=log_progress)
+    for reject in result.rejects:
+        logger.warning(f"Rejected row {reject['row']} (id={reject['id']}): {reject['error']}")
+    return 1 if result.rejected else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
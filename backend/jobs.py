@@ -0,0 +1,499 @@
+"""Background jobs for imports, exports, bulk updates and archival.
+
+Jobs are rows in the jobs table of the application database; there is no
+separate broker. A request enqueues a job and returns at once, and worker
+threads claim queued jobs one at a time with a conditional UPDATE (after
+SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL), so any number of workers
+in any number of processes can share the queue.
+
+Handlers report progress through their JobContext, which also checks for
+cancellation; a cancelled job stops at its next progress report. A job that
+raises is retried with exponential backoff up to maxAttempts. While a job
+runs its worker renews the lease every third of JOB_LEASE_SECONDS, whether
+or not the handler reports progress; a job whose worker stopped
+heartbeating (the process died) is requeued after JOB_LEASE_SECONDS.
+Handlers must therefore be safe to run again: imports upsert, and bulk
+updates are idempotent.
+
+    JOB_RUNNER          thread (default): web processes run jobs in JOB_WORKERS
+                        background threads; process: web processes only
+                        enqueue and `python jobs.py` runs them
+    JOB_WORKERS         worker threads per process (default 1)
+    JOB_POLL_INTERVAL   seconds between polls of an empty queue (default 1)
+    JOB_LEASE_SECONDS   heartbeat age after which a running job is requeued (default 300)
+    JOB_MAX_ATTEMPTS    attempts before a job fails (default 3)
+    JOB_OUTPUT_DIR      where export jobs write their files (default exports)
+
+Running jobs outside the web processes keeps request latency flat while
+large jobs run:
+
+    python jobs.py [--workers 2]
+"""
+import argparse
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import func, insert, select, update
+
+from archive import ARCHIVE_RETENTION_DAYS, archive_cutoff, archive_meetings
+from cache import create_response_cache
+from database import create_database_engine
+from exports import EXPORT_CHUNK_SIZE, FORMATS, export_query
+from importer import IMPORT_BATCH_SIZE, ON_CONFLICT_CHOICES, find_data_file, import_file
+from models import jobs, leads, meetings
+from pagination import QueryError, filter_conditions
+from serializers import RowSerializer
+
+JOB_RUNNER = os.getenv('JOB_RUNNER', 'thread')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 1))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1))
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 300))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+JOB_OUTPUT_DIR = os.getenv('JOB_OUTPUT_DIR', 'exports')
+
+# Seconds before the first retry; doubled for each further attempt
+RETRY_DELAY = 5
+
+# Progress is written (and cancellation checked) at most this often
+PROGRESS_INTERVAL = 1.0
+
+# Seconds between lease renewals of a running job
+HEARTBEAT_SECONDS = JOB_LEASE_SECONDS / 3
+
+# Leads reassigned per transaction
+REASSIGN_BATCH_SIZE = 1000
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+
+TABLES = {'leads': leads, 'meetings': meetings}
+
+logger = logging.getLogger(__name__)
+
+
+class JobError(ValueError):
+    """Raised when a job cannot be enqueued with the given parameters"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job has been cancelled"""
+
+
+class JobContext:
+    """Progress reporting and cancellation checks for a running job"""
+
+    def __init__(self, engine, job_id, worker_id):
+        self.engine = engine
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.last_report = 0.0
+
+    def progress(self, done, total=None, force=False, **details):
+        """Record progress, raising JobCancelled if the job was cancelled"""
+        now = time.monotonic()
+        if not force and now - self.last_report < PROGRESS_INTERVAL:
+            return
+        self.last_report = now
+        with self.engine.begin() as connection:
+            # The heartbeat shows the lease is still held
+            cancelled = connection.execute(
+                update(jobs)
+                .where(jobs.c.id == self.job_id, jobs.c.lockedBy == self.worker_id)
+                .values(progress={"done": done, "total": total, **details},
+                        heartbeatAt=datetime.now())
+                .returning(jobs.c.cancelRequested)).scalar()
+        if cancelled is None or cancelled:
+            raise JobCancelled()
+
+
+def run_import(engine, context, params, invalidate):
+    """Import DATA_DIR/leads.* and meetings.*, as /api/import-data does"""
+    data_dir = os.getenv('DATA_DIR', 'data')
+    counts, details = {}, {}
+    for table_name in ('leads', 'meetings'):
+        path = find_data_file(data_dir, table_name)
+        if path is None:
+            continue
+
+        def report(result):
+            context.progress(result.processed, table=table_name, written=result.written,
+                             rejected=result.rejected)
+
+        try:
+            result = import_file(engine, path, table_name, batch_size=params['batchSize'],
+                                 on_conflict=params['onConflict'], progress=report)
+        finally:
+            invalidate(table_name)
+        context.progress(result.processed, force=True, table=table_name, written=result.written,
+                         rejected=result.rejected)
+        counts[table_name] = result.written
+        details[table_name] = result.to_dict()
+    return {"counts": counts, "details": details}
+
+
+def run_export(engine, context, params, invalidate):
+    """Write a table export to JOB_OUTPUT_DIR"""
+    table = TABLES[params['table']]
+    serializer = RowSerializer(table.columns)
+    query = export_query(table, filter_conditions(table, params['filters']))
+    with engine.connect() as connection:
+        total = connection.execute(select(func.count()).select_from(query.subquery())).scalar()
+
+    os.makedirs(JOB_OUTPUT_DIR, exist_ok=True)
+    extension = FORMATS[params['format']][1]
+    path = os.path.join(JOB_OUTPUT_DIR, f"{context.job_id}.{extension}")
+    rows = 0
+    last_id = None
+    with open(path, 'wb') as f:
+        if params['format'] == 'json':
+            f.write(b'[')
+        # Pages by id in short transactions rather than one long cursor, so
+        # progress writes are not blocked (SQLite) and no snapshot is held
+        # open for the whole export (PostgreSQL)
+        while True:
+            page = query if last_id is None else query.where(table.c.id > last_id)
+            with engine.connect() as connection:
+                partition = connection.execute(page.limit(EXPORT_CHUNK_SIZE)).all()
+            if not partition:
+                break
+            if params['format'] == 'ndjson':
+                f.write(serializer.dumps_ndjson(partition))
+            else:
+                f.write((b',' if rows else b'') + serializer.dumps(partition)[1:-1])
+            rows += len(partition)
+            last_id = partition[-1].id
+            context.progress(rows, total)
+        if params['format'] == 'json':
+            f.write(b']')
+    context.progress(rows, total, force=True)
+    return {"file": os.path.basename(path), "rows": rows, "bytes": os.path.getsize(path)}
+
+
+def run_reassign_leads(engine, context, params, invalidate):
+    """Move every lead of one sales rep to another, a batch per transaction"""
+    source, target = params['from'], params['to']
+    conditions = [leads.c.assignedSalesRep == source]
+    if params.get('leadStatus'):
+        conditions.append(leads.c.leadStatus == params['leadStatus'])
+    with engine.connect() as connection:
+        total = connection.execute(select(func.count()).select_from(leads).where(*conditions)).scalar()
+
+    done = 0
+    last_id = ''
+    try:
+        while True:
+            with engine.begin() as connection:
+                ids = connection.execute(
+                    select(leads.c.id).where(*conditions, leads.c.id > last_id)
+                    .order_by(leads.c.id).limit(REASSIGN_BATCH_SIZE)).scalars().all()
+                if not ids:
+                    break
+                connection.execute(
+                    update(leads).where(leads.c.id.in_(ids), leads.c.assignedSalesRep == source)
+                    .values(assignedSalesRep=target, updatedAt=datetime.now()))
+            last_id = ids[-1]
+            done += len(ids)
+            context.progress(done, total)
+        context.progress(done, total, force=True)
+    finally:
+        invalidate('leads')
+    return {"reassigned": done}
+
+
+def run_archive_meetings(engine, context, params, invalidate):
+    """Move meetings dated before the cutoff into the archive"""
+    before = date.fromisoformat(params['before']) if params.get('before') else archive_cutoff(
+        params['retentionDays'])
+    try:
+        moved = archive_meetings(engine, before, progress=context.progress)
+        context.progress(moved, moved, force=True)
+    finally:
+        invalidate('meetings')
+    return {"archived": moved, "before": before.isoformat()}
+
+
+def parse_import_params(params):
+    batch_size = params.get('batchSize', IMPORT_BATCH_SIZE)
+    on_conflict = params.get('onConflict', 'update')
+    if not isinstance(batch_size, int) or batch_size < 1:
+        raise JobError("'batchSize' must be a positive integer")
+    if on_conflict not in ON_CONFLICT_CHOICES:
+        raise JobError("'onConflict' must be 'update' or 'skip'")
+    return {"batchSize": batch_size, "onConflict": on_conflict}
+
+
+def parse_export_params(params):
+    table_name = params.get('table')
+    if table_name not in TABLES:
+        raise JobError("'table' must be 'leads' or 'meetings'")
+    export_format = params.get('format', 'ndjson')
+    if export_format not in FORMATS:
+        raise JobError("'format' must be 'ndjson' or 'json'")
+    filters = params.get('filters') or {}
+    if not isinstance(filters, dict):
+        raise JobError("'filters' must be an object")
+    filters = {name: str(value) for name, value in filters.items()}
+    try:
+        filter_conditions(TABLES[table_name], filters)
+    except QueryError as e:
+        raise JobError(str(e))
+    return {"table": table_name, "format": export_format, "filters": filters}
+
+
+def parse_reassign_params(params):
+    source, target = params.get('from'), params.get('to')
+    if not (isinstance(source, str) and source and isinstance(target, str) and target):
+        raise JobError("'from' and 'to' sales reps are required")
+    if source == target:
+        raise JobError("'from' and 'to' must differ")
+    status = params.get('leadStatus')
+    return {"from": source, "to": target, "leadStatus": status if isinstance(status, str) else None}
+
+
+def parse_archive_params(params):
+    before = params.get('before')
+    if before is not None:
+        try:
+            date.fromisoformat(before)
+        except (TypeError, ValueError):
+            raise JobError("'before' must be a date in YYYY-MM-DD format")
+        return {"before": before}
+    retention_days = params.get('retentionDays', ARCHIVE_RETENTION_DAYS)
+    if not isinstance(retention_days, int) or retention_days < 0:
+        raise JobError("'retentionDays' must be a non-negative integer")
+    return {"retentionDays": retention_days}
+
+
+# type -> (handler, parameter validation)
+HANDLERS = {
+    'import': (run_import, parse_import_params),
+    'export': (run_export, parse_export_params),
+    'reassign_leads': (run_reassign_leads, parse_reassign_params),
+    'archive_meetings': (run_archive_meetings, parse_archive_params),
+}
+
+
+def job_to_dict(row):
+    return {
+        "id": row.id,
+        "type": row.type,
+        "status": row.status,
+        "params": row.params,
+        "progress": row.progress,
+        "result": row.result,
+        "error": row.error,
+        "attempts": row.attempts,
+        "maxAttempts": row.maxAttempts,
+        "cancelRequested": row.cancelRequested,
+        "createdAt": row.createdAt.isoformat(),
+        "startedAt": row.startedAt.isoformat() if row.startedAt else None,
+        "finishedAt": row.finishedAt.isoformat() if row.finishedAt else None,
+    }
+
+
+def enqueue(engine, job_type, params):
+    """Validate and queue a job; return it as a dict"""
+    if job_type not in HANDLERS:
+        raise JobError(f"Unknown job type '{job_type}'; expected one of {', '.join(sorted(HANDLERS))}")
+    if not isinstance(params, dict):
+        raise JobError("'params' must be an object")
+    params = HANDLERS[job_type][1](params)
+    now = datetime.now()
+    with engine.begin() as connection:
+        row = connection.execute(insert(jobs).values(
+            id=str(uuid.uuid4()), type=job_type, status=QUEUED, params=params,
+            attempts=0, maxAttempts=JOB_MAX_ATTEMPTS, cancelRequested=False,
+            runAfter=now, createdAt=now).returning(*jobs.columns)).fetchone()
+    return job_to_dict(row)
+
+
+def get_job(engine, job_id):
+    with engine.connect() as connection:
+        row = connection.execute(select(jobs).where(jobs.c.id == job_id)).fetchone()
+    return job_to_dict(row) if row else None
+
+
+def list_jobs(engine, status=None, limit=50):
+    """The most recently created jobs, optionally with one status"""
+    query = select(jobs).order_by(jobs.c.createdAt.desc()).limit(limit)
+    if status:
+        query = query.where(jobs.c.status == status)
+    with engine.connect() as connection:
+        return [job_to_dict(row) for row in connection.execute(query)]
+
+
+def cancel_job(engine, job_id):
+    """Cancel a queued job now, or ask a running one to stop; None if missing"""
+    now = datetime.now()
+    with engine.begin() as connection:
+        connection.execute(update(jobs).where(jobs.c.id == job_id, jobs.c.status == QUEUED)
+                           .values(status=CANCELLED, cancelRequested=True, finishedAt=now))
+        connection.execute(update(jobs).where(jobs.c.id == job_id, jobs.c.status == RUNNING)
+                           .values(cancelRequested=True))
+        row = connection.execute(select(jobs).where(jobs.c.id == job_id)).fetchone()
+    return job_to_dict(row) if row else None
+
+
+class JobRunner:
+    """Worker threads that claim and run queued jobs"""
+
+    def __init__(self, engine, workers=JOB_WORKERS, invalidate=None):
+        self.engine = engine
+        self.workers = workers
+        self.invalidate = invalidate or (lambda table_name: None)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def ensure_started(self):
+        """Start the threads in this process; they do not survive fork()"""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.worker_id = f"{socket.gethostname()}:{self.pid}:{uuid.uuid4().hex[:8]}"
+            self.threads = [threading.Thread(target=self.run, name=f'job-worker-{i}', daemon=True)
+                            for i in range(self.workers)]
+            for thread in self.threads:
+                thread.start()
+
+    def notify(self):
+        """Wake an idle worker in this process after enqueueing"""
+        self.wake.set()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+        for thread in self.threads:
+            thread.join()
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                self.requeue_expired()
+                job = self.claim()
+            except Exception as e:
+                logger.error(f"Error polling the job queue: {e}")
+                job = None
+            if job is None:
+                self.wake.wait(JOB_POLL_INTERVAL)
+                self.wake.clear()
+                continue
+            try:
+                self.execute(job)
+            except Exception as e:
+                # e.g. the connection dropped while recording the outcome; the
+                # lease expires and the job is requeued, but the thread lives on
+                logger.error(f"Error running job {job.id}: {e}")
+
+    def claim(self):
+        """Mark the oldest runnable job as ours and return it, or None"""
+        now = datetime.now()
+        with self.engine.begin() as connection:
+            candidate = connection.execute(
+                select(jobs.c.id).where(jobs.c.status == QUEUED, jobs.c.runAfter <= now)
+                .order_by(jobs.c.runAfter, jobs.c.createdAt).limit(1)
+                .with_for_update(skip_locked=True)).scalar()
+            if candidate is None:
+                return None
+            # The status check makes the claim safe where SKIP LOCKED is unavailable
+            return connection.execute(
+                update(jobs).where(jobs.c.id == candidate, jobs.c.status == QUEUED)
+                .values(status=RUNNING, lockedBy=self.worker_id, heartbeatAt=now,
+                        startedAt=func.coalesce(jobs.c.startedAt, now),
+                        attempts=jobs.c.attempts + 1)
+                .returning(*jobs.columns)).fetchone()
+
+    def requeue_expired(self):
+        """Return jobs whose worker stopped heartbeating to the queue"""
+        expired = datetime.now() - timedelta(seconds=JOB_LEASE_SECONDS)
+        with self.engine.begin() as connection:
+            result = connection.execute(
+                update(jobs).where(jobs.c.status == RUNNING, jobs.c.heartbeatAt < expired)
+                .values(status=QUEUED, lockedBy=None, runAfter=datetime.now()))
+        if result.rowcount:
+            logger.warning(f"Requeued {result.rowcount} jobs with expired leases")
+
+    def finish(self, job_id, **values):
+        values.setdefault('finishedAt', datetime.now())
+        with self.engine.begin() as connection:
+            connection.execute(update(jobs).where(jobs.c.id == job_id, jobs.c.lockedBy == self.worker_id)
+                               .values(lockedBy=None, **values))
+
+    def heartbeat(self, job_id, done):
+        """Renew the lease of job_id every HEARTBEAT_SECONDS until done is set"""
+        while not done.wait(HEARTBEAT_SECONDS):
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(
+                        update(jobs).where(jobs.c.id == job_id, jobs.c.lockedBy == self.worker_id)
+                        .values(heartbeatAt=datetime.now()))
+            except Exception as e:
+                logger.warning(f"Could not renew the lease of job {job_id}: {e}")
+
+    def execute(self, job):
+        handler = HANDLERS[job.type][0]
+        context = JobContext(self.engine, job.id, self.worker_id)
+        logger.info(f"Running job {job.id} ({job.type}), attempt {job.attempts}")
+        done = threading.Event()
+        threading.Thread(target=self.heartbeat, args=(job.id, done), name=f'job-heartbeat-{job.id}',
+                         daemon=True).start()
+        try:
+            if job.cancelRequested:
+                raise JobCancelled()
+            result = handler(self.engine, context, job.params, self.invalidate)
+        except JobCancelled:
+            logger.info(f"Job {job.id} cancelled")
+            self.finish(job.id, status=CANCELLED)
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed (attempt {job.attempts} of {job.maxAttempts})")
+            if job.attempts < job.maxAttempts:
+                delay = RETRY_DELAY * 2 ** (job.attempts - 1)
+                self.finish(job.id, status=QUEUED, error=str(e), finishedAt=None,
+                            runAfter=datetime.now() + timedelta(seconds=delay))
+            else:
+                self.finish(job.id, status=FAILED, error=str(e))
+        else:
+            self.finish(job.id, status=SUCCEEDED, result=result, error=None)
+            logger.info(f"Job {job.id} succeeded")
+        finally:
+            done.set()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Run queued background jobs")
+    parser.add_argument('--workers', type=int, default=JOB_WORKERS)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    engine = create_database_engine(os.getenv('DATABASE_URL'))
+
+    # A shared (redis) response cache is invalidated for the web processes;
+    # in-memory caches there expire after CACHE_TTL
+    response_cache = create_response_cache()
+
+    runner = JobRunner(engine, args.workers, invalidate=response_cache.invalidate_table)
+    runner.ensure_started()
+    logger.info(f"Job worker {runner.worker_id} running {args.workers} threads")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        runner.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
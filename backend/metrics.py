@@ -0,0 +1,325 @@
+"""Per-request instrumentation and Prometheus metrics.
+
+install_metrics hooks a Flask app (before/after request) and
+instrument_engine an engine (cursor execute events) to record, per route:
+
+    http_request_duration_seconds    latency histogram by method, route and status
+    http_request_db_statements       SQL statements issued per request
+    http_request_db_seconds          time spent in SQL per request
+    db_statement_duration_seconds    every statement, in or out of a request
+
+Pool occupancy and checkout waits come from the instrumented pool in
+database.py, and other modules register gauges at render time. GET /metrics
+returns them all in the Prometheus text exposition format. Each process
+keeps its own metrics; under gunicorn a scrape reports one worker, so label
+targets per worker or run one worker per container.
+
+    SLOW_QUERY_MS     log statements slower than this, with their route (default 500, 0 disables)
+    SLOW_REQUEST_MS   log requests slower than this, with their statement count (default 1000, 0 disables)
+    LOG_LEVEL         application log level (default INFO)
+    LOG_SAMPLE_RATE   fraction of requests logged at INFO with timing (default 0)
+
+Recording a request costs a few dictionary updates under a lock; statement
+text is only formatted when a threshold is crossed.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from database import pool_status
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 500))
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 1000))
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 0))
+
+# Histogram bucket upper bounds; +Inf is implied
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Statement text kept in slow query log lines
+MAX_LOGGED_STATEMENT = 500
+
+logger = logging.getLogger(__name__)
+
+
+def format_labels(names, values, extra=''):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{format_labels(self.labels, labels)} {value}'
+
+
+class Histogram:
+    """Cumulative bucket histogram keyed by label values"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # labels -> [count per bucket (last is +Inf), sum]
+        self.series = {}
+
+    def observe(self, value, labels=()):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+
+    def samples(self):
+        with self.lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self.series.items()}
+        bounds = self.buckets + (float('inf'),)
+        for labels, (counts, total) in sorted(series.items()):
+            yield from histogram_samples(self.name, self.labels, labels, bounds, counts, total)
+
+
+def histogram_samples(name, label_names, labels, bounds, counts, total):
+    """Exposition lines for one histogram series from per-bucket (non-cumulative) counts"""
+    cumulative = 0
+    for bound, count in zip(bounds, counts):
+        cumulative += count
+        le = f'le="{format_bound(bound)}"'
+        yield f'{name}_bucket{format_labels(label_names, labels, le)} {cumulative}'
+    yield f'{name}_sum{format_labels(label_names, labels)} {total}'
+    yield f'{name}_count{format_labels(label_names, labels)} {cumulative}'
+
+
+class Gauge:
+    """Values read from a callback when metrics are rendered.
+
+    kind='counter' exposes running totals kept elsewhere (e.g. cache hits).
+    """
+
+    def __init__(self, name, help, labels, read, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.read = read
+        self.kind = kind
+
+    def samples(self):
+        try:
+            values = self.read()
+        except Exception as e:
+            logger.warning(f"Could not read gauge {self.name}: {e}")
+            return
+        for labels, value in sorted(values.items()):
+            if value is not None:
+                yield f'{self.name}{format_labels(self.labels, labels)} {value}'
+
+
+class Registry:
+    """The metrics of one process"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        """Register a metric, replacing one of the same name (e.g. from an earlier app)"""
+        self.metrics = [existing for existing in self.metrics if existing.name != metric.name]
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, labels, read, kind='gauge'):
+        return self.add(Gauge(name, help, labels, read, kind))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+class PoolWaitHistogram:
+    """Checkout wait histogram read from an engine's PoolStats"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+
+    def samples(self):
+        for label, engine in list(engines.items()):
+            stats = getattr(engine.pool, 'stats', None)
+            if stats is None:
+                continue
+            with stats.lock:
+                counts, total = list(stats.bucket_counts), stats.wait_total
+            yield from histogram_samples(self.name, ('engine',), (label,), stats.BUCKETS, counts, total)
+
+
+registry = Registry()
+
+# Instrumented engines by label, for the pool metrics
+engines = {}
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Request latency', ('method', 'route', 'status'))
+request_statements = registry.histogram(
+    'http_request_db_statements', 'SQL statements issued per request', ('method', 'route'),
+    buckets=STATEMENT_BUCKETS)
+request_db_time = registry.histogram(
+    'http_request_db_seconds', 'Time spent in SQL per request', ('method', 'route'))
+statement_duration = registry.histogram(
+    'db_statement_duration_seconds', 'SQL statement latency', ('engine',))
+slow_statements = registry.counter(
+    'db_slow_statements_total', 'Statements slower than SLOW_QUERY_MS', ('engine',))
+
+# Statement totals of the request running on this thread
+current = threading.local()
+
+
+def configure_logging(app):
+    """Apply LOG_LEVEL to the application loggers"""
+    level = getattr(logging, LOG_LEVEL, logging.INFO)
+    app.logger.setLevel(level)
+    logging.getLogger().setLevel(level)
+
+
+def route_label():
+    """The matched URL rule, so ids do not create a series per record"""
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def begin_request():
+    current.statements = 0
+    current.db_seconds = 0.0
+    g.metrics_start = time.perf_counter()
+
+
+def end_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    statements, db_seconds = current.statements, current.db_seconds
+    current.statements = None
+    observe_request(request.method, route_label(), response.status_code, elapsed,
+                    statements, db_seconds)
+    return response
+
+
+def observe_request(method, route, status, elapsed, statements=None, db_seconds=None):
+    """Record one request, logging it when slow or sampled"""
+    request_duration.observe(elapsed, (method, route, str(status)))
+    if statements is not None:
+        request_statements.observe(statements, (method, route))
+        request_db_time.observe(db_seconds, (method, route))
+
+    elapsed_ms = elapsed * 1000
+    if SLOW_REQUEST_MS and elapsed_ms >= SLOW_REQUEST_MS:
+        logger.warning(f"Slow request {method} {route} {status}: {elapsed_ms:.0f} ms, "
+                       f"{statements} statements")
+    elif LOG_SAMPLE_RATE and random.random() < LOG_SAMPLE_RATE and logger.isEnabledFor(logging.INFO):
+        logger.info(f"{method} {route} {status}: {elapsed_ms:.1f} ms, {statements} statements")
+
+
+def pool_occupancy():
+    values = {}
+    for label, engine in list(engines.items()):
+        status = pool_status(engine)
+        for state in ('size', 'checkedOut', 'overflow', 'idle'):
+            if state in status:
+                values[(label, state)] = status[state]
+    return values
+
+
+def pool_timeouts():
+    return {(label,): pool_status(engine).get('timeouts') for label, engine in list(engines.items())}
+
+
+registry.gauge('db_pool_connections', 'Pool connections by state', ('engine', 'state'), pool_occupancy)
+registry.gauge('db_pool_checkout_timeouts_total', 'Checkouts that timed out waiting for a connection',
+               ('engine',), pool_timeouts, kind='counter')
+registry.add(PoolWaitHistogram('db_pool_checkout_wait_seconds', 'Time waited for a pooled connection'))
+
+
+def instrument_engine(engine, label='primary'):
+    """Time every statement run on an engine and expose its pool"""
+    engines[label] = engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('metrics_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        statement_duration.observe(elapsed, (label,))
+        if getattr(current, 'statements', None) is not None:
+            current.statements += 1
+            current.db_seconds += elapsed
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+            slow_statements.inc((label,))
+            route = route_label() if has_request_context() else 'no request'
+            logger.warning(f"Slow query ({elapsed * 1000:.0f} ms, {route}): "
+                           f"{' '.join(statement.split())[:MAX_LOGGED_STATEMENT]}")
+
+
+def install_metrics(app):
+    """Time the requests of a Flask app; engines are instrumented as they are built"""
+    configure_logging(app)
+    app.before_request(begin_request)
+    app.after_request(end_request)
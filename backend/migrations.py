@@ -0,0 +1,1078 @@
+"""Versioned schema migrations for the FieldSense database.
+
+Each migration is registered with the @migration decorator and applied once,
+in version order. Applied versions are recorded in the schema_migrations
+table, so running the migrator again is a no-op. Run it before workers start:
+
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # show current and pending versions
+"""
+import json
+import logging
+import os
+import re
+import sys
+import zlib
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from dotenv import load_dotenv
+from sqlalchemy import (JSON, Boolean, Column, Date, DateTime, Float, Integer, LargeBinary, MetaData, String,
+                        Table, Time, and_, bindparam, create_engine, insert, or_, select, text, update)
+from sqlalchemy.sql import column as sql_column, table as sql_table
+
+from coercion import parse_date, parse_float, parse_time
+
+logger = logging.getLogger(__name__)
+
+Migration = namedtuple('Migration', ['version', 'description', 'upgrade', 'transactional'])
+
+MIGRATIONS = []
+
+# Arbitrary key for the Postgres advisory lock that serialises migrators
+ADVISORY_LOCK_ID = 4721903
+
+# Rows converted per transaction by online backfills
+BACKFILL_BATCH_SIZE = int(os.getenv('BACKFILL_BATCH_SIZE', 1000))
+
+version_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations',
+    version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String, nullable=False),
+    Column('appliedAt', DateTime, nullable=False),
+)
+
+
+def migration(version, description, transactional=True):
+    """Register an upgrade function as a schema migration.
+
+    Non-transactional migrations run on an autocommit connection, which
+    Postgres requires for CREATE INDEX CONCURRENTLY.
+    """
+    def decorator(func):
+        MIGRATIONS.append(Migration(version, description, func, transactional))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return func
+    return decorator
+
+
+def is_postgres(connection):
+    """Return True when connected to PostgreSQL"""
+    return connection.dialect.name == 'postgresql'
+
+
+def create_index(connection, name, table, columns, where=None):
+    """Create an index if it is missing, without blocking writes on Postgres"""
+    concurrently = 'CONCURRENTLY ' if is_postgres(connection) else ''
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    statement = f'CREATE INDEX {concurrently}IF NOT EXISTS "{name}" ON "{table}" ({column_list})'
+    if where:
+        statement += f' WHERE {where}'
+    connection.execute(text(statement))
+
+
+@migration(1, 'Create leads and meetings tables')
+def create_base_tables(connection):
+    # Frozen copy of the original schema; later migrations alter it in place
+    baseline = MetaData()
+    Table(
+        'leads',
+        baseline,
+        Column('id', String, primary_key=True),
+        Column('leadName', String, nullable=False),
+        Column('leadSource', String, nullable=False),
+        Column('contactPhone', String, nullable=False),
+        Column('contactEmail', String, nullable=False),
+        Column('companyName', String, nullable=False),
+        Column('leadStatus', String, nullable=False),
+        Column('assignedSalesRep', String, nullable=False),
+        Column('lastContactDate', String),
+        Column('nextFollowUpDate', String),
+        Column('createdAt', DateTime),
+        Column('updatedAt', DateTime),
+    )
+    Table(
+        'meetings',
+        baseline,
+        Column('id', String, primary_key=True),
+        Column('meetingTitle', String, nullable=False),
+        Column('meetingDate', String, nullable=False),
+        Column('meetingTime', String, nullable=False),
+        Column('participants', String, nullable=False),
+        Column('location', String, nullable=False),
+        Column('travelMode', String),
+        Column('expenses', String),
+        Column('meetingAgenda', String),
+        Column('latitude', String),
+        Column('longitude', String),
+        Column('createdAt', DateTime),
+        Column('updatedAt', DateTime),
+    )
+    baseline.create_all(connection)
+
+
+@migration(2, 'Add filter and keyset sort indexes', transactional=False)
+def add_list_indexes(connection):
+    # Keyset pagination orders by (column, id)
+    for column in ['createdAt', 'updatedAt', 'leadName', 'companyName', 'nextFollowUpDate']:
+        create_index(connection, f'ix_leads_{column}_id', 'leads', [column, 'id'])
+    for column in ['meetingDate', 'createdAt', 'updatedAt', 'meetingTitle']:
+        create_index(connection, f'ix_meetings_{column}_id', 'meetings', [column, 'id'])
+
+    # Equality filters combined with the default newest-first ordering
+    for column in ['leadStatus', 'assignedSalesRep', 'leadSource']:
+        create_index(connection, f'ix_leads_{column}_createdAt', 'leads', [column, 'createdAt', 'id'])
+    create_index(connection, 'ix_meetings_travelMode_meetingDate', 'meetings',
+                 ['travelMode', 'meetingDate', 'id'])
+
+    # Follow-up queues only ever look at leads that have a follow-up scheduled
+    create_index(connection, 'ix_leads_assignedSalesRep_nextFollowUpDate', 'leads',
+                 ['assignedSalesRep', 'nextFollowUpDate'],
+                 where='"nextFollowUpDate" IS NOT NULL')
+
+
+def convert_column_type(engine, table, name, sql_type, parser, indexes=(), not_null=False):
+    """Convert a column to a new type without holding a long table lock.
+
+    The converted values are written to a shadow column in small committed
+    batches while the application keeps running. A final short transaction
+    blocks writers, reconverts rows inserted or updated since the batch pass
+    started, and swaps the shadow column in. Values the parser rejects are
+    stored as NULL. Indexes covering the column are dropped with it and
+    rebuilt afterwards from `indexes`, a sequence of create_index kwargs.
+    """
+    shadow = f'{name}__new'
+    rows = sql_table(table, sql_column('id'), sql_column('updatedAt'),
+                     sql_column(name), sql_column(shadow, sql_type))
+    write = (update(rows)
+             .where(rows.c.id == bindparam('row_id'))
+             .values({shadow: bindparam('converted', type_=sql_type)}))
+
+    def convert(connection, batch, write_nulls=False):
+        params = []
+        rejected = 0
+        for row_id, value in batch:
+            try:
+                converted = parser(value)
+            except (TypeError, ValueError):
+                converted = None
+                rejected += 1
+            if converted is not None or write_nulls:
+                params.append({'row_id': row_id, 'converted': converted})
+        if params:
+            connection.execute(write, params)
+        return rejected
+
+    # Margin for clock skew between the app servers and this process
+    started_at = datetime.now() - timedelta(minutes=5)
+
+    with engine.begin() as connection:
+        sql_type_ddl = sql_type.compile(dialect=connection.dialect)
+        connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{shadow}" {sql_type_ddl}'))
+
+    last_id = None
+    while True:
+        with engine.begin() as connection:
+            query = select(rows.c.id, rows.c[name]).order_by(rows.c.id).limit(BACKFILL_BATCH_SIZE)
+            if last_id is not None:
+                query = query.where(rows.c.id > last_id)
+            batch = connection.execute(query).all()
+            if not batch:
+                break
+            convert(connection, batch)
+            last_id = batch[-1][0]
+        logger.info(f"{table}.{name}: converted rows up to id {last_id}")
+
+    with engine.begin() as connection:
+        if is_postgres(connection):
+            connection.execute(text(f'LOCK TABLE "{table}" IN EXCLUSIVE MODE'))
+        # Rows written since the batch pass, plus values that failed to parse;
+        # the latter make this pass the authoritative reject count
+        stragglers = connection.execute(
+            select(rows.c.id, rows.c[name]).where(or_(
+                and_(rows.c[shadow].is_(None), rows.c[name].is_not(None)),
+                rows.c.updatedAt >= started_at,
+            ))
+        ).all()
+        rejected = convert(connection, stragglers, write_nulls=True)
+        for index in indexes:
+            connection.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+        connection.execute(text(f'ALTER TABLE "{table}" DROP COLUMN "{name}"'))
+        connection.execute(text(f'ALTER TABLE "{table}" RENAME COLUMN "{shadow}" TO "{name}"'))
+        if not_null and is_postgres(connection):
+            converted = sql_table(table, sql_column('id'), sql_column(name))
+            missing = connection.execute(
+                select(converted.c.id).where(converted.c[name].is_(None)).limit(1)).first()
+            if missing is None:
+                connection.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN "{name}" SET NOT NULL'))
+            else:
+                logger.warning(f"{table}.{name}: left nullable, some rows could not be converted")
+
+    if rejected:
+        logger.warning(f"{table}.{name}: {rejected} values could not be converted and were set to NULL")
+
+    with engine.connect() as connection:
+        autocommit = connection.execution_options(isolation_level='AUTOCOMMIT')
+        for index in indexes:
+            create_index(autocommit, **index)
+
+
+@migration(3, 'Convert date, time and coordinate columns to native types', transactional=False)
+def convert_native_types(connection):
+    engine = connection.engine
+    convert_column_type(engine, 'leads', 'lastContactDate', Date(), parse_date)
+    convert_column_type(engine, 'leads', 'nextFollowUpDate', Date(), parse_date, indexes=[
+        dict(name='ix_leads_nextFollowUpDate_id', table='leads', columns=['nextFollowUpDate', 'id']),
+        dict(name='ix_leads_assignedSalesRep_nextFollowUpDate', table='leads',
+             columns=['assignedSalesRep', 'nextFollowUpDate'], where='"nextFollowUpDate" IS NOT NULL'),
+    ])
+    convert_column_type(engine, 'meetings', 'meetingDate', Date(), parse_date, not_null=True, indexes=[
+        dict(name='ix_meetings_meetingDate_id', table='meetings', columns=['meetingDate', 'id']),
+        dict(name='ix_meetings_travelMode_meetingDate', table='meetings',
+             columns=['travelMode', 'meetingDate', 'id']),
+    ])
+    convert_column_type(engine, 'meetings', 'meetingTime', Time(), parse_time, not_null=True)
+    convert_column_type(engine, 'meetings', 'latitude', Float(), parse_float)
+    convert_column_type(engine, 'meetings', 'longitude', Float(), parse_float)
+
+
+@migration(4, 'Add full-text and trigram search indexes', transactional=False)
+def add_search_indexes(connection):
+    # SQLite deployments use the in-process index in search.py instead
+    if not is_postgres(connection):
+        return
+    connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    # The documents must stay identical to search.document_expression, or
+    # the planner will not use these indexes
+    documents = {
+        'leads': "coalesce(\"companyName\", '') || ' ' || coalesce(\"leadName\", '') || ' ' "
+                 "|| coalesce(\"contactEmail\", '') || ' ' || coalesce(\"contactPhone\", '')",
+        'meetings': "coalesce(\"meetingTitle\", '') || ' ' || coalesce(\"meetingAgenda\", '') || ' ' "
+                    "|| coalesce(\"participants\", '') || ' ' || coalesce(\"location\", '')",
+    }
+    for table, document in documents.items():
+        connection.execute(text(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "ix_{table}_search_fts" ON "{table}" '
+            f"USING GIN (to_tsvector('simple', {document}))"))
+        connection.execute(text(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "ix_{table}_search_trgm" ON "{table}" '
+            f'USING GIN (lower({document}) gin_trgm_ops)'))
+
+
+@migration(5, 'Add trigger-maintained dashboard rollups')
+def add_stat_rollups(connection):
+    rollups = MetaData()
+    Table(
+        'stat_rollups',
+        rollups,
+        Column('metric', String, primary_key=True),
+        Column('key', String, primary_key=True),
+        Column('count', Integer, nullable=False),
+    )
+    rollups.create_all(connection)
+
+    # Counters keyed by the column value as text, '' standing for NULL
+    if is_postgres(connection):
+        statements = [
+            """
+CREATE OR REPLACE FUNCTION bump_stat_rollup(p_metric text, p_key text, p_delta integer) RETURNS void AS $$
+BEGIN
+    INSERT INTO stat_rollups (metric, key, count) VALUES (p_metric, p_key, p_delta)
+    ON CONFLICT (metric, key) DO UPDATE SET count = stat_rollups.count + EXCLUDED.count;
+END
+$$ LANGUAGE plpgsql""",
+            """
+CREATE OR REPLACE FUNCTION leads_stat_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE'
+            OR (TG_OP = 'UPDATE' AND OLD."leadStatus" IS DISTINCT FROM NEW."leadStatus") THEN
+        PERFORM bump_stat_rollup('leads.status', coalesce(OLD."leadStatus"::text, ''), -1);
+    END IF;
+    IF TG_OP = 'DELETE'
+            OR (TG_OP = 'UPDATE' AND OLD."assignedSalesRep" IS DISTINCT FROM NEW."assignedSalesRep") THEN
+        PERFORM bump_stat_rollup('leads.rep', coalesce(OLD."assignedSalesRep"::text, ''), -1);
+    END IF;
+    IF TG_OP = 'DELETE'
+            OR (TG_OP = 'UPDATE' AND OLD."leadSource" IS DISTINCT FROM NEW."leadSource") THEN
+        PERFORM bump_stat_rollup('leads.source', coalesce(OLD."leadSource"::text, ''), -1);
+    END IF;
+    IF TG_OP = 'INSERT'
+            OR (TG_OP = 'UPDATE' AND OLD."leadStatus" IS DISTINCT FROM NEW."leadStatus") THEN
+        PERFORM bump_stat_rollup('leads.status', coalesce(NEW."leadStatus"::text, ''), 1);
+    END IF;
+    IF TG_OP = 'INSERT'
+            OR (TG_OP = 'UPDATE' AND OLD."assignedSalesRep" IS DISTINCT FROM NEW."assignedSalesRep") THEN
+        PERFORM bump_stat_rollup('leads.rep', coalesce(NEW."assignedSalesRep"::text, ''), 1);
+    END IF;
+    IF TG_OP = 'INSERT'
+            OR (TG_OP = 'UPDATE' AND OLD."leadSource" IS DISTINCT FROM NEW."leadSource") THEN
+        PERFORM bump_stat_rollup('leads.source', coalesce(NEW."leadSource"::text, ''), 1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql""",
+            'DROP TRIGGER IF EXISTS leads_stat_rollup ON "leads"',
+            """
+CREATE TRIGGER leads_stat_rollup AFTER INSERT OR UPDATE OR DELETE ON "leads"
+FOR EACH ROW EXECUTE PROCEDURE leads_stat_rollup()""",
+            """
+CREATE OR REPLACE FUNCTION meetings_stat_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE'
+            OR (TG_OP = 'UPDATE' AND OLD."meetingDate" IS DISTINCT FROM NEW."meetingDate") THEN
+        PERFORM bump_stat_rollup('meetings.date', coalesce(OLD."meetingDate"::text, ''), -1);
+    END IF;
+    IF TG_OP = 'DELETE'
+            OR (TG_OP = 'UPDATE' AND OLD."travelMode" IS DISTINCT FROM NEW."travelMode") THEN
+        PERFORM bump_stat_rollup('meetings.travelMode', coalesce(OLD."travelMode"::text, ''), -1);
+    END IF;
+    IF TG_OP = 'DELETE'
+            OR (TG_OP = 'UPDATE' AND OLD."expenses" IS DISTINCT FROM NEW."expenses") THEN
+        PERFORM bump_stat_rollup('meetings.expenses', coalesce(OLD."expenses"::text, ''), -1);
+    END IF;
+    IF TG_OP = 'INSERT'
+            OR (TG_OP = 'UPDATE' AND OLD."meetingDate" IS DISTINCT FROM NEW."meetingDate") THEN
+        PERFORM bump_stat_rollup('meetings.date', coalesce(NEW."meetingDate"::text, ''), 1);
+    END IF;
+    IF TG_OP = 'INSERT'
+            OR (TG_OP = 'UPDATE' AND OLD."travelMode" IS DISTINCT FROM NEW."travelMode") THEN
+        PERFORM bump_stat_rollup('meetings.travelMode', coalesce(NEW."travelMode"::text, ''), 1);
+    END IF;
+    IF TG_OP = 'INSERT'
+            OR (TG_OP = 'UPDATE' AND OLD."expenses" IS DISTINCT FROM NEW."expenses") THEN
+        PERFORM bump_stat_rollup('meetings.expenses', coalesce(NEW."expenses"::text, ''), 1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql""",
+            'DROP TRIGGER IF EXISTS meetings_stat_rollup ON "meetings"',
+            """
+CREATE TRIGGER meetings_stat_rollup AFTER INSERT OR UPDATE OR DELETE ON "meetings"
+FOR EACH ROW EXECUTE PROCEDURE meetings_stat_rollup()""",
+        ]
+        backfill = [
+            'DELETE FROM stat_rollups',
+            """
+INSERT INTO stat_rollups (metric, key, count)
+SELECT 'leads.status', coalesce("leads"."leadStatus"::text, ''), count(*)
+FROM "leads" GROUP BY coalesce("leads"."leadStatus"::text, '')""",
+            """
+INSERT INTO stat_rollups (metric, key, count)
+SELECT 'leads.rep', coalesce("leads"."assignedSalesRep"::text, ''), count(*)
+FROM "leads" GROUP BY coalesce("leads"."assignedSalesRep"::text, '')""",
+            """
+INSERT INTO stat_rollups (metric, key, count)
+SELECT 'leads.source', coalesce("leads"."leadSource"::text, ''), count(*)
+FROM "leads" GROUP BY coalesce("leads"."leadSource"::text, '')""",
+            """
+INSERT INTO stat_rollups (metric, key, count)
+SELECT 'meetings.date', coalesce("meetings"."meetingDate"::text, ''), count(*)
+FROM "meetings" GROUP BY coalesce("meetings"."meetingDate"::text, '')""",
+            """
+INSERT INTO stat_rollups (metric, key, count)
+SELECT 'meetings.travelMode', coalesce("meetings"."travelMode"::text, ''), count(*)
+FROM "meetings" GROUP BY coalesce("meetings"."travelMode"::text, '')""",
+            """
+INSERT INTO stat_rollups (metric, key, count)
+SELECT 'meetings.expenses', coalesce("meetings"."expenses"::text, ''), count(*)
+FROM "meetings" GROUP BY coalesce("meetings"."expenses"::text, '')""",
+        ]
+    else:
+        statements = [
+            """
+CREATE TRIGGER IF NOT EXISTS leads_stat_rollup_insert AFTER INSERT ON "leads" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('leads.status', coalesce(NEW."leadStatus", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('leads.rep', coalesce(NEW."assignedSalesRep", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('leads.source', coalesce(NEW."leadSource", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS leads_stat_rollup_delete AFTER DELETE ON "leads" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('leads.status', coalesce(OLD."leadStatus", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('leads.rep', coalesce(OLD."assignedSalesRep", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('leads.source', coalesce(OLD."leadSource", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS leads_stat_rollup_leadStatus AFTER UPDATE OF "leadStatus" ON "leads"
+WHEN OLD."leadStatus" IS NOT NEW."leadStatus" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('leads.status', coalesce(OLD."leadStatus", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('leads.status', coalesce(NEW."leadStatus", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS leads_stat_rollup_assignedSalesRep AFTER UPDATE OF "assignedSalesRep" ON "leads"
+WHEN OLD."assignedSalesRep" IS NOT NEW."assignedSalesRep" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('leads.rep', coalesce(OLD."assignedSalesRep", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('leads.rep', coalesce(NEW."assignedSalesRep", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS leads_stat_rollup_leadSource AFTER UPDATE OF "leadSource" ON "leads"
+WHEN OLD."leadSource" IS NOT NEW."leadSource" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('leads.source', coalesce(OLD."leadSource", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('leads.source', coalesce(NEW."leadSource", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_stat_rollup_insert AFTER INSERT ON "meetings" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.date', coalesce(NEW."meetingDate", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.travelMode', coalesce(NEW."travelMode", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.expenses', coalesce(NEW."expenses", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_stat_rollup_delete AFTER DELETE ON "meetings" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.date', coalesce(OLD."meetingDate", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.travelMode', coalesce(OLD."travelMode", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.expenses', coalesce(OLD."expenses", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_stat_rollup_meetingDate AFTER UPDATE OF "meetingDate" ON "meetings"
+WHEN OLD."meetingDate" IS NOT NEW."meetingDate" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.date', coalesce(OLD."meetingDate", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.date', coalesce(NEW."meetingDate", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_stat_rollup_travelMode AFTER UPDATE OF "travelMode" ON "meetings"
+WHEN OLD."travelMode" IS NOT NEW."travelMode" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.travelMode', coalesce(OLD."travelMode", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.travelMode', coalesce(NEW."travelMode", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_stat_rollup_expenses AFTER UPDATE OF "expenses" ON "meetings"
+WHEN OLD."expenses" IS NOT NEW."expenses" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.expenses', coalesce(OLD."expenses", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.expenses', coalesce(NEW."expenses", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+END""",
+        ]
+        backfill = [
+            'DELETE FROM stat_rollups',
+            """
+INSERT INTO stat_rollups (metric, key, count)
+SELECT 'leads.status', coalesce("leads"."leadStatus", ''), count(*)
+FROM "leads" GROUP BY coalesce("leads"."leadStatus", '')""",
+            """
+INSERT INTO stat_rollups (metric, key, count)
+SELECT 'leads.rep', coalesce("leads"."assignedSalesRep", ''), count(*)
+FROM "leads" GROUP BY coalesce("leads"."assignedSalesRep", '')""",
+            """
+INSERT INTO stat_rollups (metric, key, count)
+SELECT 'leads.source', coalesce("leads"."leadSource", ''), count(*)
+FROM "leads" GROUP BY coalesce("leads"."leadSource", '')""",
+            """
+INSERT INTO stat_rollups (metric, key, count)
+SELECT 'meetings.date', coalesce("meetings"."meetingDate", ''), count(*)
+FROM "meetings" GROUP BY coalesce("meetings"."meetingDate", '')""",
+            """
+INSERT INTO stat_rollups (metric, key, count)
+SELECT 'meetings.travelMode', coalesce("meetings"."travelMode", ''), count(*)
+FROM "meetings" GROUP BY coalesce("meetings"."travelMode", '')""",
+            """
+INSERT INTO stat_rollups (metric, key, count)
+SELECT 'meetings.expenses', coalesce("meetings"."expenses", ''), count(*)
+FROM "meetings" GROUP BY coalesce("meetings"."expenses", '')""",
+        ]
+    # Triggers first: the backfill runs in the same transaction, so no write
+    # can fall between the initial counts and incremental maintenance
+    for statement in statements + backfill:
+        connection.exec_driver_sql(statement)
+
+
+@migration(6, 'Add change log for delta sync')
+def add_record_changes(connection):
+    if is_postgres(connection):
+        statements = [
+            'CREATE SEQUENCE IF NOT EXISTS record_changes_seq',
+            """
+CREATE TABLE IF NOT EXISTS record_changes (
+    "tableName" varchar NOT NULL,
+    "recordId" varchar NOT NULL,
+    seq bigint NOT NULL DEFAULT nextval('record_changes_seq'),
+    op varchar NOT NULL,
+    "changedAt" timestamp NOT NULL DEFAULT now(),
+    txid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    PRIMARY KEY ("tableName", "recordId")
+)""",
+            'CREATE INDEX IF NOT EXISTS ix_record_changes_seq ON record_changes (seq)',
+            'CREATE INDEX IF NOT EXISTS ix_record_changes_txid ON record_changes (txid)',
+            """
+CREATE OR REPLACE FUNCTION record_change() RETURNS trigger AS $$
+DECLARE
+    row_id varchar;
+    change varchar;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        row_id := OLD.id;
+        change := 'delete';
+    ELSE
+        row_id := NEW.id;
+        change := 'upsert';
+    END IF;
+    INSERT INTO record_changes ("tableName", "recordId", op) VALUES (TG_TABLE_NAME, row_id, change)
+    ON CONFLICT ("tableName", "recordId") DO UPDATE
+        SET seq = EXCLUDED.seq, op = EXCLUDED.op, "changedAt" = EXCLUDED."changedAt", txid = EXCLUDED.txid;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql""",
+            'DROP TRIGGER IF EXISTS leads_record_change ON "leads"',
+            """
+CREATE TRIGGER leads_record_change AFTER INSERT OR UPDATE OR DELETE ON "leads"
+FOR EACH ROW EXECUTE PROCEDURE record_change()""",
+            'DROP TRIGGER IF EXISTS meetings_record_change ON "meetings"',
+            """
+CREATE TRIGGER meetings_record_change AFTER INSERT OR UPDATE OR DELETE ON "meetings"
+FOR EACH ROW EXECUTE PROCEDURE record_change()""",
+        ]
+    else:
+        # Deleting the record's previous entry lets the new one take the next
+        # AUTOINCREMENT value. (INSERT OR REPLACE would not do: inside a trigger
+        # its conflict policy is overridden by the outer statement's, e.g. the
+        # importer's upsert.)
+        statements = [
+            """
+CREATE TABLE IF NOT EXISTS record_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    "tableName" VARCHAR NOT NULL,
+    "recordId" VARCHAR NOT NULL,
+    op VARCHAR NOT NULL,
+    "changedAt" DATETIME NOT NULL,
+    UNIQUE ("tableName", "recordId")
+)""",
+            """
+CREATE TRIGGER IF NOT EXISTS leads_record_change_insert AFTER INSERT ON "leads" BEGIN
+    DELETE FROM record_changes WHERE "tableName" = 'leads' AND "recordId" = NEW.id;
+    INSERT INTO record_changes ("tableName", "recordId", op, "changedAt")
+        VALUES ('leads', NEW.id, 'upsert', CURRENT_TIMESTAMP);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS leads_record_change_update AFTER UPDATE ON "leads" BEGIN
+    DELETE FROM record_changes WHERE "tableName" = 'leads' AND "recordId" = NEW.id;
+    INSERT INTO record_changes ("tableName", "recordId", op, "changedAt")
+        VALUES ('leads', NEW.id, 'upsert', CURRENT_TIMESTAMP);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS leads_record_change_delete AFTER DELETE ON "leads" BEGIN
+    DELETE FROM record_changes WHERE "tableName" = 'leads' AND "recordId" = OLD.id;
+    INSERT INTO record_changes ("tableName", "recordId", op, "changedAt")
+        VALUES ('leads', OLD.id, 'delete', CURRENT_TIMESTAMP);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_record_change_insert AFTER INSERT ON "meetings" BEGIN
+    DELETE FROM record_changes WHERE "tableName" = 'meetings' AND "recordId" = NEW.id;
+    INSERT INTO record_changes ("tableName", "recordId", op, "changedAt")
+        VALUES ('meetings', NEW.id, 'upsert', CURRENT_TIMESTAMP);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_record_change_update AFTER UPDATE ON "meetings" BEGIN
+    DELETE FROM record_changes WHERE "tableName" = 'meetings' AND "recordId" = NEW.id;
+    INSERT INTO record_changes ("tableName", "recordId", op, "changedAt")
+        VALUES ('meetings', NEW.id, 'upsert', CURRENT_TIMESTAMP);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_record_change_delete AFTER DELETE ON "meetings" BEGIN
+    DELETE FROM record_changes WHERE "tableName" = 'meetings' AND "recordId" = OLD.id;
+    INSERT INTO record_changes ("tableName", "recordId", op, "changedAt")
+        VALUES ('meetings', OLD.id, 'delete', CURRENT_TIMESTAMP);
+END""",
+        ]
+    # Existing rows are logged as upserts so a first sync returns everything.
+    # SQLite needs the WHERE to parse ON CONFLICT after a SELECT
+    statements += [
+        """
+INSERT INTO record_changes ("tableName", "recordId", op, "changedAt")
+SELECT 'leads', id, 'upsert', CURRENT_TIMESTAMP FROM "leads" WHERE true
+ON CONFLICT ("tableName", "recordId") DO NOTHING""",
+        """
+INSERT INTO record_changes ("tableName", "recordId", op, "changedAt")
+SELECT 'meetings', id, 'upsert', CURRENT_TIMESTAMP FROM "meetings" WHERE true
+ON CONFLICT ("tableName", "recordId") DO NOTHING""",
+    ]
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+@migration(7, 'Add PostGIS location index for nearby queries', transactional=False)
+def add_location_index(connection):
+    # Without PostGIS, geo.py falls back to an in-process grid index
+    if not is_postgres(connection):
+        return
+    try:
+        connection.execute(text('CREATE EXTENSION IF NOT EXISTS postgis'))
+    except Exception as e:
+        logger.warning(f"PostGIS is not available, nearby queries will use the local grid: {e}")
+        return
+    # Same expression as geo.location_expression, which nearby queries use
+    connection.execute(text(
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS "ix_meetings_location" ON "meetings" '
+        'USING GIST (geography(ST_SetSRID(ST_MakePoint("longitude", "latitude"), 4326))) '
+        'WHERE "latitude" IS NOT NULL AND "longitude" IS NOT NULL'))
+
+
+@migration(8, 'Add geocoding cache')
+def add_geocode_cache(connection):
+    geocoding = MetaData()
+    Table(
+        'geocode_cache',
+        geocoding,
+        Column('key', String, primary_key=True),
+        Column('query', String, nullable=False),
+        Column('found', Boolean, nullable=False),
+        Column('latitude', Float),
+        Column('longitude', Float),
+        Column('address', String),
+        Column('createdAt', DateTime, nullable=False),
+        Column('lastUsedAt', DateTime, nullable=False),
+    )
+    geocoding.create_all(connection)
+    # Pruning removes the least recently used rows first. The table is new and
+    # empty, so a plain CREATE INDEX inside the transaction is fine
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS "ix_geocode_cache_lastUsedAt" ON "geocode_cache" ("lastUsedAt")'))
+
+
+@migration(9, 'Add background job queue')
+def add_jobs(connection):
+    queue = MetaData()
+    Table(
+        'jobs',
+        queue,
+        Column('id', String, primary_key=True),
+        Column('type', String, nullable=False),
+        Column('status', String, nullable=False),
+        Column('params', JSON, nullable=False),
+        Column('progress', JSON),
+        Column('result', JSON),
+        Column('error', String),
+        Column('attempts', Integer, nullable=False),
+        Column('maxAttempts', Integer, nullable=False),
+        Column('cancelRequested', Boolean, nullable=False),
+        Column('runAfter', DateTime, nullable=False),
+        Column('lockedBy', String),
+        Column('heartbeatAt', DateTime),
+        Column('createdAt', DateTime, nullable=False),
+        Column('startedAt', DateTime),
+        Column('finishedAt', DateTime),
+    )
+    queue.create_all(connection)
+    # Workers poll for the oldest runnable job and for expired leases
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS "ix_jobs_status_runAfter" ON "jobs" ("status", "runAfter")'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS "ix_jobs_createdAt" ON "jobs" ("createdAt")'))
+
+
+@migration(10, 'Add meetings archive')
+def add_meetings_archive(connection):
+    # archive.py creates the monthly partitions as it fills them
+    if is_postgres(connection):
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS "meetings_archive" ('
+            '"id" varchar NOT NULL, "meetingDate" date NOT NULL, '
+            '"archivedAt" timestamp NOT NULL, "document" bytea NOT NULL, '
+            'PRIMARY KEY ("id", "meetingDate")) PARTITION BY RANGE ("meetingDate")'))
+        return
+    archive = MetaData()
+    Table(
+        'meetings_archive',
+        archive,
+        Column('id', String, primary_key=True),
+        Column('meetingDate', Date, primary_key=True),
+        Column('archivedAt', DateTime, nullable=False),
+        Column('document', LargeBinary, nullable=False),
+    )
+    archive.create_all(connection)
+
+
+@migration(11, 'Add follow-up date index and reminder log', transactional=False)
+def add_followups(connection):
+    # Due queues across all reps and the overdue counts are range scans on
+    # the follow-up date; the rep and status columns let the counts be read
+    # from the index alone. A single rep's queue still uses migration 2's
+    # (assignedSalesRep, nextFollowUpDate) index, which reaches that rep's
+    # due leads directly instead of filtering every rep's out of the range
+    create_index(connection, 'ix_leads_nextFollowUpDate_assignedSalesRep', 'leads',
+                 ['nextFollowUpDate', 'assignedSalesRep', 'leadStatus'],
+                 where='"nextFollowUpDate" IS NOT NULL')
+    reminders = MetaData()
+    Table(
+        'followup_reminders',
+        reminders,
+        Column('leadId', String, primary_key=True),
+        Column('followUpDate', Date, primary_key=True),
+        Column('leadName', String),
+        Column('assignedSalesRep', String, nullable=False),
+        Column('remindedAt', DateTime, nullable=False),
+    )
+    reminders.create_all(connection)
+    create_index(connection, 'ix_followup_reminders_assignedSalesRep_remindedAt', 'followup_reminders',
+                 ['assignedSalesRep', 'remindedAt'])
+
+
+@migration(12, 'Add change notifications for the event stream')
+def add_change_notifications(connection):
+    # Elsewhere the event stream polls the change log
+    if not is_postgres(connection):
+        return
+    # Statement-level, and PostgreSQL folds identical notifications within a
+    # transaction, so a bulk write wakes listeners once per table
+    statements = [
+        """
+CREATE OR REPLACE FUNCTION notify_record_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('record_changes', TG_TABLE_NAME);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql""",
+        'DROP TRIGGER IF EXISTS leads_notify_change ON "leads"',
+        """
+CREATE TRIGGER leads_notify_change AFTER INSERT OR UPDATE OR DELETE ON "leads"
+FOR EACH STATEMENT EXECUTE PROCEDURE notify_record_change()""",
+        'DROP TRIGGER IF EXISTS meetings_notify_change ON "meetings"',
+        """
+CREATE TRIGGER meetings_notify_change AFTER INSERT OR UPDATE OR DELETE ON "meetings"
+FOR EACH STATEMENT EXECUTE PROCEDURE notify_record_change()""",
+    ]
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+@migration(13, 'Drop the meeting expenses rollup')
+def drop_expenses_rollup(connection):
+    # Reinstall the meetings triggers without the expenses metric
+    if is_postgres(connection):
+        statements = [
+            """
+CREATE OR REPLACE FUNCTION meetings_stat_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE'
+            OR (TG_OP = 'UPDATE' AND OLD."meetingDate" IS DISTINCT FROM NEW."meetingDate") THEN
+        PERFORM bump_stat_rollup('meetings.date', coalesce(OLD."meetingDate"::text, ''), -1);
+    END IF;
+    IF TG_OP = 'DELETE'
+            OR (TG_OP = 'UPDATE' AND OLD."travelMode" IS DISTINCT FROM NEW."travelMode") THEN
+        PERFORM bump_stat_rollup('meetings.travelMode', coalesce(OLD."travelMode"::text, ''), -1);
+    END IF;
+    IF TG_OP = 'INSERT'
+            OR (TG_OP = 'UPDATE' AND OLD."meetingDate" IS DISTINCT FROM NEW."meetingDate") THEN
+        PERFORM bump_stat_rollup('meetings.date', coalesce(NEW."meetingDate"::text, ''), 1);
+    END IF;
+    IF TG_OP = 'INSERT'
+            OR (TG_OP = 'UPDATE' AND OLD."travelMode" IS DISTINCT FROM NEW."travelMode") THEN
+        PERFORM bump_stat_rollup('meetings.travelMode', coalesce(NEW."travelMode"::text, ''), 1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql""",
+            'DROP TRIGGER IF EXISTS meetings_stat_rollup ON "meetings"',
+            """
+CREATE TRIGGER meetings_stat_rollup AFTER INSERT OR UPDATE OR DELETE ON "meetings"
+FOR EACH ROW EXECUTE PROCEDURE meetings_stat_rollup()""",
+        ]
+    else:
+        statements = [
+            'DROP TRIGGER IF EXISTS meetings_stat_rollup_insert',
+            'DROP TRIGGER IF EXISTS meetings_stat_rollup_delete',
+            'DROP TRIGGER IF EXISTS meetings_stat_rollup_expenses',
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_stat_rollup_insert AFTER INSERT ON "meetings" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.date', coalesce(NEW."meetingDate", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.travelMode', coalesce(NEW."travelMode", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_stat_rollup_delete AFTER DELETE ON "meetings" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.date', coalesce(OLD."meetingDate", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.travelMode', coalesce(OLD."travelMode", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_stat_rollup_meetingDate AFTER UPDATE OF "meetingDate" ON "meetings"
+WHEN OLD."meetingDate" IS NOT NEW."meetingDate" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.date', coalesce(OLD."meetingDate", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.date', coalesce(NEW."meetingDate", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_stat_rollup_travelMode AFTER UPDATE OF "travelMode" ON "meetings"
+WHEN OLD."travelMode" IS NOT NEW."travelMode" BEGIN
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.travelMode', coalesce(OLD."travelMode", ''), -1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (-1);
+    INSERT INTO stat_rollups (metric, key, count)
+        VALUES ('meetings.travelMode', coalesce(NEW."travelMode", ''), 1)
+        ON CONFLICT (metric, key) DO UPDATE SET count = count + (1);
+END""",
+        ]
+    statements.append("DELETE FROM stat_rollups WHERE metric = 'meetings.expenses'")
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+@migration(14, 'Add meeting expense totals by travel mode')
+def add_expense_totals(connection):
+    # expenses is free text. Only plain decimal amounts (digits with at most
+    # one point, up to 15 characters) are summed, so no value can make the
+    # cast, and with it the write, fail; stats.expense_cents applies the
+    # same rule in Python
+    if is_postgres(connection):
+        statements = [
+            'ALTER TABLE stat_rollups ADD COLUMN IF NOT EXISTS cents bigint NOT NULL DEFAULT 0',
+            r"""
+CREATE OR REPLACE FUNCTION expense_cents(p_value text) RETURNS bigint AS $$
+    SELECT CASE WHEN length(trim(p_value)) <= 15 AND trim(p_value) ~ '^[0-9]*\.?[0-9]*$'
+                     AND trim(p_value) ~ '[0-9]'
+                THEN round(trim(p_value)::numeric * 100)::bigint END
+$$ LANGUAGE sql IMMUTABLE""",
+            """
+CREATE OR REPLACE FUNCTION bump_stat_total(p_metric text, p_key text, p_delta integer, p_cents bigint)
+RETURNS void AS $$
+BEGIN
+    IF p_cents IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO stat_rollups (metric, key, count, cents) VALUES (p_metric, p_key, p_delta, p_cents)
+    ON CONFLICT (metric, key) DO UPDATE
+        SET count = stat_rollups.count + EXCLUDED.count, cents = stat_rollups.cents + EXCLUDED.cents;
+END
+$$ LANGUAGE plpgsql""",
+            """
+CREATE OR REPLACE FUNCTION meetings_stat_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE'
+            OR (TG_OP = 'UPDATE' AND OLD."meetingDate" IS DISTINCT FROM NEW."meetingDate") THEN
+        PERFORM bump_stat_rollup('meetings.date', coalesce(OLD."meetingDate"::text, ''), -1);
+    END IF;
+    IF TG_OP = 'DELETE'
+            OR (TG_OP = 'UPDATE' AND OLD."travelMode" IS DISTINCT FROM NEW."travelMode") THEN
+        PERFORM bump_stat_rollup('meetings.travelMode', coalesce(OLD."travelMode"::text, ''), -1);
+    END IF;
+    IF TG_OP = 'DELETE'
+            OR (TG_OP = 'UPDATE' AND (OLD."travelMode" IS DISTINCT FROM NEW."travelMode"
+                                      OR OLD."expenses" IS DISTINCT FROM NEW."expenses")) THEN
+        PERFORM bump_stat_total('meetings.expenses', coalesce(OLD."travelMode"::text, ''), -1,
+                                -expense_cents(OLD."expenses"));
+    END IF;
+    IF TG_OP = 'INSERT'
+            OR (TG_OP = 'UPDATE' AND OLD."meetingDate" IS DISTINCT FROM NEW."meetingDate") THEN
+        PERFORM bump_stat_rollup('meetings.date', coalesce(NEW."meetingDate"::text, ''), 1);
+    END IF;
+    IF TG_OP = 'INSERT'
+            OR (TG_OP = 'UPDATE' AND OLD."travelMode" IS DISTINCT FROM NEW."travelMode") THEN
+        PERFORM bump_stat_rollup('meetings.travelMode', coalesce(NEW."travelMode"::text, ''), 1);
+    END IF;
+    IF TG_OP = 'INSERT'
+            OR (TG_OP = 'UPDATE' AND (OLD."travelMode" IS DISTINCT FROM NEW."travelMode"
+                                      OR OLD."expenses" IS DISTINCT FROM NEW."expenses")) THEN
+        PERFORM bump_stat_total('meetings.expenses', coalesce(NEW."travelMode"::text, ''), 1,
+                                expense_cents(NEW."expenses"));
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql""",
+            "DELETE FROM stat_rollups WHERE metric = 'meetings.expenses'",
+            """
+INSERT INTO stat_rollups (metric, key, count, cents)
+SELECT 'meetings.expenses', coalesce("travelMode"::text, ''), count(*), sum(expense_cents("expenses"))
+FROM "meetings" WHERE expense_cents("expenses") IS NOT NULL
+GROUP BY coalesce("travelMode"::text, '')""",
+        ]
+    else:
+        statements = [
+            'ALTER TABLE stat_rollups ADD COLUMN cents BIGINT NOT NULL DEFAULT 0',
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_expense_total_insert AFTER INSERT ON "meetings" BEGIN
+    INSERT INTO stat_rollups (metric, key, count, cents)
+    SELECT 'meetings.expenses', coalesce(NEW."travelMode", ''), 1,
+        CAST(round(CAST(trim(NEW."expenses") AS REAL) * 100) AS INTEGER)
+    WHERE length(trim(NEW."expenses")) <= 15 AND trim(NEW."expenses") GLOB '*[0-9]*'
+        AND trim(NEW."expenses") NOT GLOB '*[^0-9.]*' AND trim(NEW."expenses") NOT GLOB '*.*.*'
+    ON CONFLICT (metric, key) DO UPDATE
+        SET count = count + excluded.count, cents = cents + excluded.cents;
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_expense_total_delete AFTER DELETE ON "meetings" BEGIN
+    INSERT INTO stat_rollups (metric, key, count, cents)
+    SELECT 'meetings.expenses', coalesce(OLD."travelMode", ''), -1,
+        -CAST(round(CAST(trim(OLD."expenses") AS REAL) * 100) AS INTEGER)
+    WHERE length(trim(OLD."expenses")) <= 15 AND trim(OLD."expenses") GLOB '*[0-9]*'
+        AND trim(OLD."expenses") NOT GLOB '*[^0-9.]*' AND trim(OLD."expenses") NOT GLOB '*.*.*'
+    ON CONFLICT (metric, key) DO UPDATE
+        SET count = count + excluded.count, cents = cents + excluded.cents;
+END""",
+            """
+CREATE TRIGGER IF NOT EXISTS meetings_expense_total_update
+AFTER UPDATE OF "travelMode", "expenses" ON "meetings"
+WHEN OLD."travelMode" IS NOT NEW."travelMode" OR OLD."expenses" IS NOT NEW."expenses" BEGIN
+    INSERT INTO stat_rollups (metric, key, count, cents)
+    SELECT 'meetings.expenses', coalesce(OLD."travelMode", ''), -1,
+        -CAST(round(CAST(trim(OLD."expenses") AS REAL) * 100) AS INTEGER)
+    WHERE length(trim(OLD."expenses")) <= 15 AND trim(OLD."expenses") GLOB '*[0-9]*'
+        AND trim(OLD."expenses") NOT GLOB '*[^0-9.]*' AND trim(OLD."expenses") NOT GLOB '*.*.*'
+    ON CONFLICT (metric, key) DO UPDATE
+        SET count = count + excluded.count, cents = cents + excluded.cents;
+    INSERT INTO stat_rollups (metric, key, count, cents)
+    SELECT 'meetings.expenses', coalesce(NEW."travelMode", ''), 1,
+        CAST(round(CAST(trim(NEW."expenses") AS REAL) * 100) AS INTEGER)
+    WHERE length(trim(NEW."expenses")) <= 15 AND trim(NEW."expenses") GLOB '*[0-9]*'
+        AND trim(NEW."expenses") NOT GLOB '*[^0-9.]*' AND trim(NEW."expenses") NOT GLOB '*.*.*'
+    ON CONFLICT (metric, key) DO UPDATE
+        SET count = count + excluded.count, cents = cents + excluded.cents;
+END""",
+            "DELETE FROM stat_rollups WHERE metric = 'meetings.expenses'",
+            """
+INSERT INTO stat_rollups (metric, key, count, cents)
+SELECT 'meetings.expenses', coalesce("travelMode", ''), count(*),
+    sum(CAST(round(CAST(trim("expenses") AS REAL) * 100) AS INTEGER))
+FROM "meetings"
+WHERE length(trim("expenses")) <= 15 AND trim("expenses") GLOB '*[0-9]*'
+    AND trim("expenses") NOT GLOB '*[^0-9.]*' AND trim("expenses") NOT GLOB '*.*.*'
+GROUP BY coalesce("travelMode", '')""",
+        ]
+    # Triggers before the backfill, in one transaction, as in migration 5
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+    # Archived meetings still count towards the dashboard (see archive.py).
+    # Their documents are zlib-compressed JSON, summed here by the same rule
+    counts, cents = Counter(), Counter()
+    for document in connection.execute(text('SELECT "document" FROM "meetings_archive"')).scalars():
+        meeting = json.loads(zlib.decompress(document))
+        value = str(meeting.get('expenses') or '').strip(' ')
+        if len(value) <= 15 and re.fullmatch(r'[0-9]*\.?[0-9]*', value) and re.search('[0-9]', value):
+            key = meeting.get('travelMode') or ''
+            counts[key] += 1
+            cents[key] += int((Decimal(value) * 100).quantize(Decimal(1), ROUND_HALF_UP))
+    if counts:
+        connection.execute(text(
+            "INSERT INTO stat_rollups (metric, key, count, cents) "
+            "VALUES ('meetings.expenses', :key, :count, :cents) "
+            "ON CONFLICT (metric, key) DO UPDATE "
+            "SET count = stat_rollups.count + excluded.count, cents = stat_rollups.cents + excluded.cents"),
+            [{'key': key, 'count': count, 'cents': cents[key]} for key, count in counts.items()])
+
+
+def current_version(connection):
+    """Return the highest applied migration version, or 0"""
+    schema_migrations.create(connection, checkfirst=True)
+    versions = connection.execute(select(schema_migrations.c.version)).scalars().all()
+    return max(versions, default=0)
+
+
+def pending_migrations(connection):
+    """Return the registered migrations that have not been applied yet"""
+    version = current_version(connection)
+    return [m for m in MIGRATIONS if m.version > version]
+
+
+def record_version(connection, m):
+    connection.execute(insert(schema_migrations).values(
+        version=m.version, description=m.description, appliedAt=datetime.now()))
+
+
+def run_migrations(engine):
+    """Apply all pending migrations and return the resulting schema version"""
+    with engine.connect() as lock_connection:
+        locked = is_postgres(lock_connection)
+        if locked:
+            lock_connection.execute(text('SELECT pg_advisory_lock(:id)'), {'id': ADVISORY_LOCK_ID})
+            lock_connection.commit()
+        try:
+            with engine.begin() as connection:
+                pending = pending_migrations(connection)
+
+            for m in pending:
+                logger.info(f"Applying migration {m.version}: {m.description}")
+                if m.transactional:
+                    with engine.begin() as connection:
+                        m.upgrade(connection)
+                        record_version(connection, m)
+                else:
+                    with engine.connect() as connection:
+                        autocommit = connection.execution_options(isolation_level='AUTOCOMMIT')
+                        m.upgrade(autocommit)
+                    with engine.begin() as connection:
+                        record_version(connection, m)
+
+            with engine.connect() as connection:
+                return current_version(connection)
+        finally:
+            if locked:
+                lock_connection.execute(text('SELECT pg_advisory_unlock(:id)'), {'id': ADVISORY_LOCK_ID})
+                lock_connection.commit()
+
+
+def main(argv):
+    load_dotenv()
+    engine = create_engine(os.getenv('DATABASE_URL'))
+
+    if '--status' in argv:
+        with engine.begin() as connection:
+            version = current_version(connection)
+            pending = pending_migrations(connection)
+        print(f"Current schema version: {version}")
+        for m in pending:
+            print(f"Pending: {m.version} {m.description}")
+        return 0
+
+    version = run_migrations(engine)
+    print(f"Schema is at version {version}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,111 @@
+"""Table definitions for the FieldSense database"""
+from sqlalchemy import (BigInteger, Boolean, Column, String, Date, DateTime, Float, Integer, JSON,
+                        LargeBinary, MetaData, Table, Time)
+
+metadata = MetaData()
+
+# Define tables
+leads = Table(
+    'leads',
+    metadata,
+    Column('id', String, primary_key=True),
+    Column('leadName', String, nullable=False),
+    Column('leadSource', String, nullable=False),
+    Column('contactPhone', String, nullable=False),
+    Column('contactEmail', String, nullable=False),
+    Column('companyName', String, nullable=False),
+    Column('leadStatus', String, nullable=False),
+    Column('assignedSalesRep', String, nullable=False),
+    Column('lastContactDate', Date),
+    Column('nextFollowUpDate', Date),
+    Column('createdAt', DateTime),
+    Column('updatedAt', DateTime),
+)
+
+meetings = Table(
+    'meetings',
+    metadata,
+    Column('id', String, primary_key=True),
+    Column('meetingTitle', String, nullable=False),
+    Column('meetingDate', Date, nullable=False),
+    Column('meetingTime', Time, nullable=False),
+    Column('participants', String, nullable=False),
+    Column('location', String, nullable=False),
+    Column('travelMode', String),
+    Column('expenses', String),
+    Column('meetingAgenda', String),
+    Column('latitude', Float),
+    Column('longitude', Float),
+    Column('createdAt', DateTime),
+    Column('updatedAt', DateTime),
+)
+
+# Precomputed counts, and expense totals in cents, maintained by database
+# triggers (migrations 5 and 14)
+stat_rollups = Table(
+    'stat_rollups',
+    metadata,
+    Column('metric', String, primary_key=True),
+    Column('key', String, primary_key=True),
+    Column('count', Integer, nullable=False),
+    Column('cents', BigInteger, nullable=False, default=0),
+)
+
+# Geocoding results keyed by normalized address or rounded coordinates (see
+# geocoding.py); found=False records an address the provider could not resolve
+geocode_cache = Table(
+    'geocode_cache',
+    metadata,
+    Column('key', String, primary_key=True),
+    Column('query', String, nullable=False),
+    Column('found', Boolean, nullable=False),
+    Column('latitude', Float),
+    Column('longitude', Float),
+    Column('address', String),
+    Column('createdAt', DateTime, nullable=False),
+    Column('lastUsedAt', DateTime, nullable=False),
+)
+
+# Background jobs (see jobs.py); params, progress and result are JSON documents
+jobs = Table(
+    'jobs',
+    metadata,
+    Column('id', String, primary_key=True),
+    Column('type', String, nullable=False),
+    Column('status', String, nullable=False),
+    Column('params', JSON, nullable=False),
+    Column('progress', JSON),
+    Column('result', JSON),
+    Column('error', String),
+    Column('attempts', Integer, nullable=False),
+    Column('maxAttempts', Integer, nullable=False),
+    Column('cancelRequested', Boolean, nullable=False),
+    Column('runAfter', DateTime, nullable=False),
+    Column('lockedBy', String),
+    Column('heartbeatAt', DateTime),
+    Column('createdAt', DateTime, nullable=False),
+    Column('startedAt', DateTime),
+    Column('finishedAt', DateTime),
+)
+
+# Archived meetings (see archive.py): the zlib compressed JSON document of each
+# meeting. Partitioned by meetingDate month on PostgreSQL, hence the composite key
+meetings_archive = Table(
+    'meetings_archive',
+    metadata,
+    Column('id', String, primary_key=True),
+    Column('meetingDate', Date, primary_key=True),
+    Column('archivedAt', DateTime, nullable=False),
+    Column('document', LargeBinary, nullable=False),
+)
+
+# Follow-up reminders already sent (see followups.py), one per lead and follow-up date
+followup_reminders = Table(
+    'followup_reminders',
+    metadata,
+    Column('leadId', String, primary_key=True),
+    Column('followUpDate', Date, primary_key=True),
+    Column('leadName', String),
+    Column('assignedSalesRep', String, nullable=False),
+    Column('remindedAt', DateTime, nullable=False),
+)
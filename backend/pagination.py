@@ -0,0 +1,231 @@
+"""Keyset pagination, filtering, sorting and field selection for the read endpoints"""
+import base64
+import binascii
+import json
+import os
+from datetime import date, datetime, time
+
+from sqlalchemy import and_, literal, select, tuple_, union_all
+
+from coercion import parse_date
+
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 1000))
+
+# Columns a list may be ordered by. Each one is backed by a (column, id)
+# index (see migrations) so that the keyset predicate turns into an index
+# range scan in either direction.
+SORTABLE_COLUMNS = {
+    'leads': ['createdAt', 'updatedAt', 'leadName', 'companyName', 'nextFollowUpDate'],
+    'meetings': ['meetingDate', 'createdAt', 'updatedAt', 'meetingTitle'],
+}
+
+DEFAULT_SORT = {
+    'leads': '-createdAt',
+    'meetings': '-meetingDate',
+}
+
+# Exact-match filters; a comma separated value matches any of the values
+EQUALITY_FILTERS = {
+    'leads': ['leadStatus', 'assignedSalesRep', 'leadSource'],
+    'meetings': ['travelMode'],
+}
+
+
+class QueryError(ValueError):
+    """Raised when list query parameters are invalid"""
+
+
+def encode_cursor(value, row_id):
+    """Encode the sort value and id of the last row into an opaque cursor"""
+    if isinstance(value, (datetime, date, time)):
+        value = value.isoformat()
+    payload = json.dumps([value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, column):
+    """Decode a cursor back into a (value, id) pair typed for column"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError):
+        raise QueryError("Invalid 'after' cursor")
+
+    if value is not None:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = None
+        if python_type in (datetime, date, time) and isinstance(value, str):
+            try:
+                value = python_type.fromisoformat(value)
+            except ValueError:
+                raise QueryError("Invalid 'after' cursor")
+    return value, row_id
+
+
+def parse_limit(args):
+    """Read the page size from the request arguments"""
+    raw = args.get('limit')
+    if raw is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise QueryError("'limit' must be an integer")
+    if limit < 1:
+        raise QueryError("'limit' must be positive")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_sort(table, args):
+    """Return the (column, descending) pair requested by the 'sort' argument"""
+    sort = args.get('sort') or DEFAULT_SORT[table.name]
+    descending = sort.startswith('-')
+    name = sort.lstrip('+-')
+    if name not in SORTABLE_COLUMNS[table.name]:
+        allowed = ', '.join(SORTABLE_COLUMNS[table.name])
+        raise QueryError(f"Cannot sort by '{name}'; allowed columns: {allowed}")
+    return table.c[name], descending
+
+
+def parse_fields(table, args):
+    """Return the column names requested by the 'fields' argument, id first, or None for all"""
+    raw = args.get('fields')
+    if not raw:
+        return None
+    names = ['id']
+    for name in raw.split(','):
+        name = name.strip()
+        if not name or name in names:
+            continue
+        if name not in table.c:
+            allowed = ', '.join(table.c.keys())
+            raise QueryError(f"Unknown field '{name}'; allowed fields: {allowed}")
+        names.append(name)
+    return names
+
+
+def select_columns(table, fields, *required):
+    """Columns to select for fields (None for every column).
+
+    Columns in required that were not asked for are appended after the
+    requested ones; a serializer built for fields ignores trailing columns.
+    """
+    if fields is None:
+        return list(table.columns)
+    names = list(fields)
+    for column in required:
+        if column.name not in names:
+            names.append(column.name)
+    return [table.c[name] for name in names]
+
+
+def parse_date_arg(args, name):
+    """Read an optional YYYY-MM-DD date argument"""
+    try:
+        return parse_date(args.get(name))
+    except ValueError:
+        raise QueryError(f"'{name}' must be a date in YYYY-MM-DD format")
+
+
+def filter_conditions(table, args):
+    """Build WHERE clauses from the filter arguments"""
+    conditions = []
+    for name in EQUALITY_FILTERS[table.name]:
+        raw = args.get(name)
+        if raw:
+            values = [value.strip() for value in raw.split(',') if value.strip()]
+            if len(values) == 1:
+                conditions.append(table.c[name] == values[0])
+            elif values:
+                conditions.append(table.c[name].in_(values))
+
+    if table.name == 'meetings':
+        date_from = parse_date_arg(args, 'meetingDateFrom')
+        date_to = parse_date_arg(args, 'meetingDateTo')
+        if date_from:
+            conditions.append(table.c.meetingDate >= date_from)
+        if date_to:
+            conditions.append(table.c.meetingDate <= date_to)
+        participant = args.get('participants')
+        if participant:
+            conditions.append(table.c.participants.ilike(f"%{participant}%"))
+    return conditions
+
+
+def keyset_condition(table, column, descending, value, row_id):
+    """Rows strictly after (value, id) within the cursor's phase of the list.
+
+    A non-NULL value gives a row-value bound on (column, id), which the
+    (column, id) indexes answer with a range scan; rows with a NULL sort value
+    are not included and are read as a separate phase (see build_list_query).
+    A NULL value bounds the NULL phase by id alone.
+    """
+    if value is None:
+        after_id = table.c.id < row_id if descending else table.c.id > row_id
+        return and_(column.is_(None), after_id)
+    if descending:
+        return tuple_(column, table.c.id) < tuple_(value, row_id)
+    return tuple_(column, table.c.id) > tuple_(value, row_id)
+
+
+def order_columns(columns, descending):
+    return [column.desc() if descending else column.asc() for column in columns]
+
+
+def build_list_query(table, args, fields=None):
+    """Build a filtered, sorted, keyset-paginated select for table.
+
+    Returns the query together with the page size and sort column; the query
+    fetches one extra row so callers can tell whether another page exists.
+    With fields (see parse_fields) only those columns are selected, plus the
+    sort column for the cursor and the timestamps for Last-Modified.
+
+    Rows with a NULL sort value come last in both directions. For a nullable
+    sort column the list is read in two phases, the non-NULL values and then
+    the NULLs by id, each a range scan of the (column, id) index; a page that
+    spans both is the UNION ALL of the two, each limited to the page size.
+    """
+    limit = parse_limit(args)
+    column, descending = parse_sort(table, args)
+    columns = select_columns(table, fields, column, table.c.updatedAt, table.c.createdAt)
+    conditions = filter_conditions(table, args)
+
+    cursor = args.get('after')
+    value = row_id = None
+    if cursor:
+        value, row_id = decode_cursor(cursor, column)
+
+    phases = []
+    if not cursor or value is not None:
+        bound = [keyset_condition(table, column, descending, value, row_id)] if cursor else []
+        if column.nullable:
+            bound.append(column.isnot(None))
+        phases.append((bound, [column, table.c.id]))
+    if column.nullable:
+        bound = [keyset_condition(table, column, descending, None, row_id) if cursor and value is None
+                 else column.is_(None)]
+        phases.append((bound, [table.c.id]))
+
+    parts = [select(*columns).where(*conditions, *bound)
+             .order_by(*order_columns(order, descending)).limit(limit + 1)
+             for bound, order in phases]
+    if len(parts) == 1:
+        return parts[0], limit, column
+
+    pages = union_all(*(select(*part.subquery().c, literal(phase).label('phase'))
+                        for phase, part in enumerate(parts))).subquery()
+    query = (select(*(pages.c[c.name] for c in columns))
+             .order_by(pages.c.phase, *order_columns([pages.c[column.name], pages.c.id], descending)))
+    return query.limit(limit + 1), limit, column
+
+
+def split_page(rows, limit, column):
+    """Trim the look-ahead row and return (rows, next cursor or None)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]._mapping
+    return rows, encode_cursor(last[column.name], last['id'])
@@ -0,0 +1,263 @@
+"""Read-replica routing with read-your-writes consistency.
+
+When DATABASE_REPLICA_URLS is set, the read routes take their connection
+from read_engine(), which picks a healthy replica in round-robin order.
+Writes and everything else stay on the primary engine.
+
+    DATABASE_REPLICA_URLS    comma separated replica database URLs (default none)
+    REPLICA_PIN_SECONDS      seconds a client's reads stay on the primary after it writes (default 5)
+    REPLICA_CHECK_INTERVAL   seconds between health checks of each replica (default 5)
+
+A successful write request is answered with a read-after token, both as the
+X-Read-After header and a read_after cookie. Requests that carry it (header
+or cookie) are pinned to the primary until it expires, so a client sees its
+own writes without every worker sharing state. On PostgreSQL the token also
+holds the primary's WAL position after the write, read on the connection
+that committed it as the connection returns to the pool; a replica whose
+replay position has passed it serves the client before the window ends.
+
+A background thread in each process checks the replicas every
+REPLICA_CHECK_INTERVAL seconds, and sooner when a pinned read finds none
+caught up; requests only read the last results. A replica that fails is
+skipped until a later check succeeds, and reads fall back to the primary
+when none is healthy.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event, text
+
+from database import create_database_engine
+
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',')
+                         if url.strip()]
+REPLICA_PIN_SECONDS = float(os.getenv('REPLICA_PIN_SECONDS', 5))
+REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', 5))
+
+# Pinned reads wake the checker at most this often
+LSN_REFRESH_SECONDS = 0.1
+
+# connection.info key marking a connection that committed in a write request
+WROTE_KEY = 'replicas_wrote'
+
+TOKEN_HEADER = 'X-Read-After'
+TOKEN_COOKIE = 'read_after'
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+logger = logging.getLogger(__name__)
+
+
+def parse_lsn(value):
+    """PostgreSQL 'XXX/YYY' WAL position as an integer"""
+    high, low = value.split('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def format_token(expires_at, lsn=None):
+    token = f'{expires_at:.3f}'
+    return token if lsn is None else f'{token}:{lsn}'
+
+
+def parse_token(token):
+    """Return (expires at, lsn or None), or None for a missing or malformed token"""
+    if not token:
+        return None
+    try:
+        expires, _, lsn = token.partition(':')
+        return float(expires), int(lsn) if lsn else None
+    except ValueError:
+        return None
+
+
+class Replica:
+    """One replica engine with its last health check"""
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.postgres = engine.dialect.name == 'postgresql'
+        self.healthy = True
+        self.checked_at = 0.0
+        self.lsn = None
+        self.error = None
+
+    def check(self):
+        """Probe the replica, recording its health and replay position"""
+        try:
+            with self.engine.connect() as connection:
+                if self.postgres:
+                    value = connection.execute(text(
+                        'SELECT COALESCE(pg_last_wal_replay_lsn(), pg_current_wal_lsn())')).scalar()
+                    self.lsn = parse_lsn(value)
+                else:
+                    connection.execute(text('SELECT 1'))
+            if not self.healthy:
+                logger.info(f"Replica {self.name} is healthy again")
+            self.healthy, self.error = True, None
+        except Exception as e:
+            if self.healthy:
+                logger.warning(f"Replica {self.name} failed its health check: {e}")
+            self.healthy, self.error = False, str(e)
+        self.checked_at = time.monotonic()
+
+    def caught_up(self, lsn):
+        return self.healthy and self.lsn is not None and self.lsn >= lsn
+
+    def status(self):
+        return {"healthy": self.healthy, "lsn": self.lsn, "error": self.error}
+
+
+class ReplicaRouter:
+    """Chooses the engine for each read and issues read-after tokens for writes"""
+
+    def __init__(self, primary, replica_engines, pin_seconds=REPLICA_PIN_SECONDS):
+        self.primary = primary
+        self.postgres = primary.dialect.name == 'postgresql'
+        self.replicas = [Replica(f'replica{i}', engine) for i, engine in enumerate(replica_engines)]
+        self.pin_seconds = pin_seconds
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.primary_reads = 0
+        self.replica_reads = 0
+        # Monotonic time of this process's last write
+        self.written_at = None
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.pid = None
+        if self.postgres and self.replicas:
+            self.capture_write_lsn()
+
+    def ensure_started(self):
+        """Start the checker thread in this process; it does not survive fork()"""
+        if not self.replicas or self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            threading.Thread(target=self.run, name='replica-checker', daemon=True).start()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+
+    def run(self):
+        while not self.stopping.is_set():
+            for replica in self.replicas:
+                replica.check()
+            if self.wake.wait(REPLICA_CHECK_INTERVAL):
+                self.wake.clear()
+                self.stopping.wait(LSN_REFRESH_SECONDS)
+
+    def choose(self, token=None):
+        """The replica to read from for a request carrying token, or None for the primary"""
+        if not self.replicas:
+            return None
+        self.ensure_started()
+        candidates = [replica for replica in self.replicas if replica.healthy]
+        pinned = parse_token(token)
+        if pinned is not None and pinned[0] > time.time():
+            lsn = pinned[1]
+            if lsn is None:
+                return None
+            candidates = [replica for replica in candidates if replica.caught_up(lsn)]
+            if not candidates:
+                # Have the checker re-read the replay positions soon
+                self.wake.set()
+        if not candidates:
+            return None
+        return candidates[next(self.counter) % len(candidates)]
+
+    def read_engine(self):
+        """Engine for a read in the current request"""
+        token = None
+        if has_request_context():
+            token = request.headers.get(TOKEN_HEADER) or request.cookies.get(TOKEN_COOKIE)
+        replica = self.choose(token)
+        with self.lock:
+            if replica is None:
+                self.primary_reads += 1
+            else:
+                self.replica_reads += 1
+        return self.primary if replica is None else replica.engine
+
+    def note_write(self):
+        """Record a write made by this process, for may_cache"""
+        self.written_at = time.monotonic()
+
+    def may_cache(self, engine):
+        """Whether a read from engine may fill the response cache.
+
+        A replica can still return rows older than a write this process has
+        just made and invalidated; caching them would serve the old rows to
+        every client, so replica reads are not cached during the pin window.
+        """
+        if engine is self.primary or self.written_at is None:
+            return True
+        return time.monotonic() - self.written_at >= self.pin_seconds
+
+    def capture_write_lsn(self):
+        """Record the primary's WAL position after each commit of a write request.
+
+        A commit marks its connection; when the connection is returned to the
+        pool the position is read on it, after the commit record, and kept on
+        flask.g for write_token, without taking a second connection.
+        """
+        @event.listens_for(self.primary, 'commit')
+        def mark_write(connection):
+            if has_request_context() and request.method in WRITE_METHODS:
+                connection.info[WROTE_KEY] = True
+
+        @event.listens_for(self.primary, 'reset')
+        def read_lsn(dbapi_connection, connection_record, reset_state):
+            if not connection_record.info.pop(WROTE_KEY, False) or reset_state.terminate_only:
+                return
+            try:
+                cursor = dbapi_connection.cursor()
+                try:
+                    cursor.execute('SELECT pg_current_wal_lsn()')
+                    lsn = parse_lsn(cursor.fetchone()[0])
+                finally:
+                    cursor.close()
+                    dbapi_connection.rollback()
+            except Exception as e:
+                logger.warning(f"Could not read the primary WAL position: {e}")
+                return
+            if has_request_context():
+                g.write_lsn = max(lsn, g.get('write_lsn', 0))
+
+    def write_token(self):
+        """A read-after token for the writes committed in this request"""
+        lsn = g.pop('write_lsn', None) if has_request_context() else None
+        return format_token(time.time() + self.pin_seconds, lsn)
+
+    def attach_token(self, response):
+        """after_request hook pinning a client that has just written"""
+        if (self.replicas and request.method in WRITE_METHODS
+                and 200 <= response.status_code < 400):
+            self.note_write()
+            token = self.write_token()
+            response.headers[TOKEN_HEADER] = token
+            response.set_cookie(TOKEN_COOKIE, token, max_age=int(self.pin_seconds) + 1,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def status(self):
+        with self.lock:
+            reads = {"primary": self.primary_reads, "replica": self.replica_reads}
+        return {
+            "replicas": {replica.name: replica.status() for replica in self.replicas},
+            "reads": reads,
+        }
+
+
+def create_replica_router(primary, urls=None):
+    """Router over replica engines built from DATABASE_REPLICA_URLS"""
+    urls = DATABASE_REPLICA_URLS if urls is None else urls
+    return ReplicaRouter(primary, [create_database_engine(url) for url in urls])
+
@@ -0,0 +1,329 @@
+"""Ranked full-text and fuzzy search over leads and meetings.
+
+On PostgreSQL, search runs in the database against GIN indexes (migration 4)
+on a per-table document expression: a 'simple' tsvector for whole-word
+matches and pg_trgm trigrams for partial words and typos. Rows are ranked by
+the better of ts_rank and word_similarity.
+
+Other databases (SQLite in development) use an in-process inverted index
+built lazily from the table and kept current by the write handlers. Each
+worker has its own copy, rebuilt after SEARCH_INDEX_TTL seconds so writes
+made by other workers become visible.
+"""
+import math
+import os
+import re
+import threading
+import time
+
+from sqlalchemy import Float, select, text
+
+SEARCH_INDEX_TTL = int(os.getenv('SEARCH_INDEX_TTL', 60))
+MAX_SEARCH_LIMIT = 100
+# Deep pages make every table rank limit + offset hits
+MAX_SEARCH_OFFSET = 1000
+
+SEARCH_COLUMNS = {
+    'leads': ['companyName', 'leadName', 'contactEmail', 'contactPhone'],
+    'meetings': ['meetingTitle', 'meetingAgenda', 'participants', 'location'],
+}
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+class SearchError(ValueError):
+    """Raised when search parameters are invalid"""
+
+
+def document_expression(columns):
+    """SQL for the searchable text of a row; must match the indexes of migration 4"""
+    return " || ' ' || ".join(f"coalesce(\"{column}\", '')" for column in columns)
+
+
+def tokenize(value):
+    """Lowercase word tokens, plus the bare digits of phone-like values"""
+    if not value:
+        return []
+    value = str(value).lower()
+    tokens = TOKEN_PATTERN.findall(value)
+    digits = ''.join(ch for ch in value if ch.isdigit())
+    if len(digits) >= 4 and digits not in tokens:
+        tokens.append(digits)
+    return tokens
+
+
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class InvertedIndex:
+    """Token -> postings index over the search columns of one table"""
+
+    # Minimum trigram Jaccard similarity for a fuzzy token match
+    FUZZY_THRESHOLD = 0.4
+
+    def __init__(self):
+        self.postings = {}       # token -> {row id: term frequency}
+        self.documents = {}      # row id -> tokens
+        self.trigram_tokens = {}  # trigram -> tokens containing it
+
+    def add(self, row_id, values):
+        self.remove(row_id)
+        tokens = []
+        for value in values:
+            tokens.extend(tokenize(value))
+        self.documents[row_id] = tokens
+        for token in tokens:
+            postings = self.postings.setdefault(token, {})
+            if not postings:
+                for gram in trigrams(token):
+                    self.trigram_tokens.setdefault(gram, set()).add(token)
+            postings[row_id] = postings.get(row_id, 0) + 1
+
+    def remove(self, row_id):
+        for token in self.documents.pop(row_id, ()):
+            postings = self.postings.get(token)
+            if postings is None or row_id not in postings:
+                continue
+            del postings[row_id]
+            if not postings:
+                del self.postings[token]
+                for gram in trigrams(token):
+                    tokens = self.trigram_tokens.get(gram)
+                    if tokens is not None:
+                        tokens.discard(token)
+
+    def candidates(self, query_token):
+        """Yield (token, weight) for exact, prefix and fuzzy matches"""
+        if query_token in self.postings:
+            yield query_token, 1.0
+        grams = trigrams(query_token)
+        counts = {}
+        for gram in grams:
+            for token in self.trigram_tokens.get(gram, ()):
+                counts[token] = counts.get(token, 0) + 1
+        for token, shared in counts.items():
+            if token == query_token:
+                continue
+            if token.startswith(query_token):
+                yield token, 0.8
+                continue
+            similarity = shared / (len(grams) + len(trigrams(token)) - shared)
+            if similarity >= self.FUZZY_THRESHOLD:
+                yield token, 0.6 * similarity
+
+    def search(self, query, limit):
+        """Return up to limit (row id, score) pairs, best first"""
+        total = len(self.documents) or 1
+        scores = {}
+        for query_token in set(tokenize(query)):
+            best = {}
+            for token, weight in self.candidates(query_token):
+                postings = self.postings[token]
+                idf = math.log(1 + total / len(postings))
+                for row_id, frequency in postings.items():
+                    score = weight * idf * (1 + math.log(frequency))
+                    if score > best.get(row_id, 0):
+                        best[row_id] = score
+            for row_id, score in best.items():
+                scores[row_id] = scores.get(row_id, 0) + score
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+
+class LocalSearch:
+    """In-process search used when the database has no full-text support.
+
+    Indexes are built outside the lock by the first request that finds one
+    missing or stale, while other requests keep searching the previous copy.
+    Writes recorded during a build are replayed onto the new index before it
+    is swapped in.
+    """
+
+    def __init__(self, engine, tables):
+        self.engine = engine
+        self.tables = tables
+        self.lock = threading.Lock()
+        self.built = threading.Condition(self.lock)
+        self.indexes = {}
+        self.built_at = {}
+        self.building = {}  # table name -> writes recorded since its build started
+        self.stale = set()  # tables invalidated while being built
+
+    def index_for(self, table_name):
+        with self.lock:
+            while True:
+                index = self.indexes.get(table_name)
+                fresh = time.monotonic() - self.built_at.get(table_name, -math.inf) < SEARCH_INDEX_TTL
+                if index is not None and (fresh or table_name in self.building):
+                    return index
+                if table_name not in self.building:
+                    break
+                self.built.wait()
+            self.building[table_name] = []
+
+        try:
+            index = self.build_index(table_name)
+        except Exception:
+            with self.lock:
+                del self.building[table_name]
+                self.stale.discard(table_name)
+                self.built.notify_all()
+            raise
+
+        with self.lock:
+            for row_id, values in self.building.pop(table_name):
+                if values is None:
+                    index.remove(row_id)
+                else:
+                    index.add(row_id, values)
+            self.indexes[table_name] = index
+            if table_name in self.stale:
+                self.stale.discard(table_name)
+                self.built_at.pop(table_name, None)
+            else:
+                self.built_at[table_name] = time.monotonic()
+            self.built.notify_all()
+        return index
+
+    def build_index(self, table_name):
+        table = self.tables[table_name]
+        columns = [table.c[name] for name in SEARCH_COLUMNS[table_name]]
+        index = InvertedIndex()
+        with self.engine.connect() as connection:
+            result = connection.execution_options(yield_per=1000).execute(
+                select(table.c.id, *columns))
+            for row in result:
+                index.add(row[0], row[1:])
+        return index
+
+    def record_write(self, table_name, row):
+        """Reindex a row returned by a create or update"""
+        mapping = row._mapping
+        values = [mapping[name] for name in SEARCH_COLUMNS[table_name]]
+        with self.lock:
+            index = self.indexes.get(table_name)
+            if index is not None:
+                index.add(mapping['id'], values)
+            if table_name in self.building:
+                self.building[table_name].append((mapping['id'], values))
+
+    def record_delete(self, table_name, row_id):
+        with self.lock:
+            index = self.indexes.get(table_name)
+            if index is not None:
+                index.remove(row_id)
+            if table_name in self.building:
+                self.building[table_name].append((row_id, None))
+
+    def invalidate(self, table_name):
+        """Force a rebuild after bulk writes"""
+        with self.lock:
+            self.indexes.pop(table_name, None)
+            if table_name in self.building:
+                self.stale.add(table_name)
+
+    def search(self, table_name, query, limit):
+        index = self.index_for(table_name)
+        with self.lock:
+            ranked = index.search(query, limit)
+        if not ranked:
+            return []
+        table = self.tables[table_name]
+        scores = dict(ranked)
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(table).where(table.c.id.in_(scores))).all()
+        rows.sort(key=lambda row: (-scores[row.id], row.id))
+        return [(row, scores[row.id]) for row in rows]
+
+
+class PostgresSearch:
+    """Search executed by PostgreSQL against the migration 4 GIN indexes"""
+
+    def __init__(self, engine, tables):
+        self.engine = engine
+        self.tables = tables
+        self.queries = {name: self.build_query(table) for name, table in tables.items()}
+
+    def build_query(self, table):
+        document = document_expression(SEARCH_COLUMNS[table.name])
+        vector = f"to_tsvector('simple', {document})"
+        columns = ', '.join(f'"{column.name}"' for column in table.columns)
+        sql = f"""
+            SELECT {columns},
+                   greatest(ts_rank({vector}, websearch_to_tsquery('simple', :q)),
+                            word_similarity(:q, lower({document}))) AS score
+            FROM "{table.name}"
+            WHERE {vector} @@ websearch_to_tsquery('simple', :q)
+               OR :q <% lower({document})
+            ORDER BY score DESC, id
+            LIMIT :limit
+        """
+        return text(sql).columns(*table.columns, score=Float)
+
+    def record_write(self, table_name, row):
+        pass
+
+    def record_delete(self, table_name, row_id):
+        pass
+
+    def invalidate(self, table_name):
+        pass
+
+    def search(self, table_name, query, limit):
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                self.queries[table_name], {'q': query.lower(), 'limit': limit}).all()
+        return [(row, row.score) for row in rows]
+
+
+def create_search_backend(engine, tables):
+    """Pick the database-backed search when available"""
+    if engine.dialect.name == 'postgresql':
+        return PostgresSearch(engine, tables)
+    return LocalSearch(engine, tables)
+
+
+def parse_search_args(args):
+    """Return (query, table names, limit, offset) from request arguments"""
+    query = (args.get('q') or '').strip()
+    if not query:
+        raise SearchError("'q' is required")
+
+    kind = args.get('type', 'all')
+    if kind == 'all':
+        table_names = list(SEARCH_COLUMNS)
+    elif kind in SEARCH_COLUMNS:
+        table_names = [kind]
+    else:
+        raise SearchError("'type' must be 'leads', 'meetings' or 'all'")
+
+    try:
+        limit = int(args.get('limit', 20))
+        offset = int(args.get('offset', 0))
+    except ValueError:
+        raise SearchError("'limit' and 'offset' must be integers")
+    if limit < 1 or offset < 0:
+        raise SearchError("'limit' must be positive and 'offset' non-negative")
+    if offset > MAX_SEARCH_OFFSET:
+        raise SearchError(f"'offset' may be at most {MAX_SEARCH_OFFSET}; refine the query instead")
+    return query, table_names, min(limit, MAX_SEARCH_LIMIT), offset
+
+
+def run_search(backend, serializers, query, table_names, limit, offset):
+    """Search each table and merge the hits into one ranked page"""
+    limit = min(limit, MAX_SEARCH_LIMIT)
+    offset = min(offset, MAX_SEARCH_OFFSET)
+    hits = []
+    for table_name in table_names:
+        serializer = serializers[table_name]
+        for row, score in backend.search(table_name, query, limit + offset):
+            hits.append({
+                "type": table_name,
+                "id": row.id,
+                "score": round(float(score), 4),
+                "record": serializer.to_dict(row),
+            })
+    hits.sort(key=lambda hit: (-hit["score"], hit["type"], hit["id"]))
+    return hits[offset:offset + limit]
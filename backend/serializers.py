@@ -0,0 +1,99 @@
+"""Row to JSON serialization compiled once per table.
+
+A RowSerializer looks at the column types a single time and keeps a short
+list of (position, converter) pairs for the columns that need converting.
+Serializing a result is then one pass over each row tuple, followed by one
+call into the JSON encoder. orjson is used when installed. Serializers for
+a subset of the columns (?fields=) are compiled on first use and kept.
+"""
+import json
+from datetime import date, datetime
+
+from sqlalchemy import Date, DateTime, Float, Time
+
+from coercion import format_time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _encode_stdlib(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+if orjson is not None:
+    encode_json = orjson.dumps
+    JSON_BACKEND = 'orjson'
+else:
+    encode_json = _encode_stdlib
+    JSON_BACKEND = 'json'
+
+
+def column_converter(column):
+    """Return the wire converter for a column type, or None to pass through"""
+    if isinstance(column.type, DateTime):
+        return datetime.isoformat
+    if isinstance(column.type, Date):
+        return date.isoformat
+    if isinstance(column.type, Time):
+        return format_time
+    if isinstance(column.type, Float):
+        return float.__repr__
+    return None
+
+
+class RowSerializer:
+    """Serializes result rows selected with a fixed list of columns"""
+
+    # Distinct field selections kept per serializer
+    MAX_PROJECTIONS = 256
+
+    def __init__(self, columns):
+        columns = list(columns)
+        self.columns = {str(column.name): column for column in columns}
+        self.projections = {}
+        self.keys = tuple(str(column.name) for column in columns)
+        self.converters = tuple(
+            (position, converter)
+            for position, converter in enumerate(column_converter(column) for column in columns)
+            if converter is not None
+        )
+
+    def project(self, fields):
+        """Serializer for the named columns, in that order; self when fields is None"""
+        if fields is None:
+            return self
+        key = tuple(fields)
+        serializer = self.projections.get(key)
+        if serializer is None:
+            if len(self.projections) >= self.MAX_PROJECTIONS:
+                self.projections.clear()
+            serializer = self.projections[key] = RowSerializer(self.columns[name] for name in key)
+        return serializer
+
+    def to_dict(self, row):
+        """Convert one row to a wire dictionary"""
+        if not self.converters:
+            return dict(zip(self.keys, row))
+        values = list(row)
+        for position, convert in self.converters:
+            value = values[position]
+            if value is not None:
+                values[position] = convert(value)
+        return dict(zip(self.keys, values))
+
+    def dumps_row(self, row):
+        """Serialize one row to JSON bytes"""
+        return encode_json(self.to_dict(row))
+
+    def dumps(self, rows):
+        """Serialize an iterable of rows to a JSON array in bytes"""
+        to_dict = self.to_dict
+        return encode_json([to_dict(row) for row in rows])
+
+    def dumps_ndjson(self, rows):
+        """Serialize rows as newline-delimited JSON, one object per line"""
+        to_dict = self.to_dict
+        return b''.join(encode_json(to_dict(row)) + b'\n' for row in rows)
@@ -0,0 +1,117 @@
+"""Engines, caches and backends of one app, each built on first use.
+
+create_app() only builds the Flask app and a Services object; nothing here
+runs until a request (or a job, or /health) asks for it. Importing the app
+therefore does no I/O, and a worker that boots while the database is briefly
+unreachable starts anyway and connects when it is back.
+
+Building is cheap except where noted: create_database_engine does not
+connect, but the geo backend asks PostgreSQL whether PostGIS is installed,
+and AUTO_MIGRATE runs the migrations when the engine is first built. A
+build that raises is not cached, so the next use retries it.
+
+Engines are created in the process that first uses them. Under gunicorn
+--preload that is normally a worker; an engine built in the master before
+fork() drops its inherited connections in each child (see database.py).
+"""
+import threading
+
+from cache import create_response_cache
+from database import create_database_engine
+from events import ChangeFeed
+from geo import create_geo_backend
+from followups import ReminderSweeper
+from geocoding import Geocoder, create_provider
+from jobs import JobRunner
+from metrics import instrument_engine
+from migrations import run_migrations
+from models import leads, meetings
+from replicas import create_replica_router
+from search import create_search_backend
+
+
+class lazy:
+    """Attribute built by a method on first access, then stored on the instance"""
+
+    def __init__(self, build):
+        self.build = build
+        self.name = build.__name__
+        self.__doc__ = build.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        # Later reads find the instance attribute and never get here
+        with instance.lock:
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.build(instance)
+            return instance.__dict__[self.name]
+
+
+class Services:
+    """Per-app dependencies, configured from app.config"""
+
+    def __init__(self, config):
+        self.config = config
+        # Reentrant: building one service may build another
+        self.lock = threading.RLock()
+
+    @lazy
+    def engine(self):
+        """The primary engine; migrated first when AUTO_MIGRATE is set"""
+        engine = create_database_engine(self.config['DATABASE_URL'])
+        if self.config['AUTO_MIGRATE']:
+            run_migrations(engine)
+        instrument_engine(engine)
+        return engine
+
+    @lazy
+    def replica_router(self):
+        router = create_replica_router(self.engine, self.config['DATABASE_REPLICA_URLS'])
+        for replica in router.replicas:
+            instrument_engine(replica.engine, replica.name)
+        return router
+
+    @lazy
+    def search_backend(self):
+        return create_search_backend(self.engine, {'leads': leads, 'meetings': meetings})
+
+    @lazy
+    def geo_backend(self):
+        return create_geo_backend(self.engine, meetings)
+
+    @lazy
+    def geocoder(self):
+        return Geocoder(self.engine, create_provider())
+
+    @lazy
+    def response_cache(self):
+        return create_response_cache()
+
+    @lazy
+    def job_runner(self):
+        return JobRunner(self.engine, invalidate=self.invalidate_table)
+
+    @lazy
+    def change_feed(self):
+        return ChangeFeed(self.engine)
+
+    @lazy
+    def reminder_sweeper(self):
+        return ReminderSweeper(self.engine)
+
+    def built(self, name):
+        """Whether a service has been built, for status reads that should not build it"""
+        return name in self.__dict__
+
+    def invalidate_table(self, table_name):
+        """Drop everything derived from a table after a bulk write"""
+        self.replica_router.note_write()
+        self.search_backend.invalidate(table_name)
+        self.response_cache.invalidate_table(table_name)
+        if table_name == 'meetings':
+            self.geo_backend.invalidate()
+        if table_name == 'leads' and self.built('reminder_sweeper'):
+            self.reminder_sweeper.invalidate()
+        if self.built('change_feed'):
+            self.change_feed.notify()
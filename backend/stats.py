@@ -0,0 +1,145 @@
+"""Dashboard statistics served from incrementally maintained rollups.
+
+Every insert, update and delete on leads and meetings adjusts per-value
+counters in the stat_rollups table through row-level triggers (installed by
+migrations 5, 13 and 14), in the same transaction as the write. Reading the
+dashboard is then a scan of a few hundred counter rows, independent of
+table size.
+
+A write holds the lock on each counter row it bumps until it commits, so on
+PostgreSQL concurrent transactions writing the same value (two imports of
+'new' leads, say) take turns on that row. Each value's counters therefore
+accept one committing writer at a time; distinct values do not contend.
+That is ample for interactive edits and batched imports. If it ever limits
+throughput, the fix is to spread each counter over several rows and sum
+them on read.
+"""
+import re
+from collections import Counter
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import stat_rollups
+
+# (metric name, table, column) for every counter kept in stat_rollups. The
+# triggers are frozen in migrations; changing this list needs a new migration
+# that reinstalls them and backfills the counts
+ROLLUP_METRICS = [
+    ('leads.status', 'leads', 'leadStatus'),
+    ('leads.rep', 'leads', 'assignedSalesRep'),
+    ('leads.source', 'leads', 'leadSource'),
+    ('meetings.date', 'meetings', 'meetingDate'),
+    ('meetings.travelMode', 'meetings', 'travelMode'),
+]
+
+# Key used for NULL or empty values
+UNSPECIFIED = ''
+
+# Meetings with a numeric expenses value and their total in cents, keyed by
+# travelMode. expenses is free text; values other than a plain decimal
+# amount (digits with at most one point, up to 15 characters) are left out
+EXPENSES_METRIC = 'meetings.expenses'
+EXPENSE_PATTERN = re.compile(r'^(?=.*[0-9])[0-9]*\.?[0-9]*$')
+MAX_EXPENSE_LENGTH = 15
+
+
+def metrics_for(table):
+    return [(metric, column) for metric, metric_table, column in ROLLUP_METRICS if metric_table == table]
+
+
+def rollup_key(value):
+    """Rollup key of a Python value, as the triggers render it in SQL"""
+    if value is None:
+        return UNSPECIFIED
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def expense_cents(value):
+    """Cents of an expenses value, or None when the triggers would not sum it"""
+    # SQL trim() strips spaces only
+    value = str(value).strip(' ') if value is not None else ''
+    if len(value) > MAX_EXPENSE_LENGTH or not EXPENSE_PATTERN.match(value):
+        return None
+    return int((Decimal(value) * 100).quantize(Decimal(1), ROUND_HALF_UP))
+
+
+def bump_counts(connection, table, rows, delta=1):
+    """Adjust the rollups of table by delta for rows given as mappings of column values.
+
+    Used where the triggers' view of a write is not the dashboard's, e.g.
+    archival deletes meetings that should still be counted.
+    """
+    counts, cents = Counter(), Counter()
+    for row in rows:
+        for metric, column in metrics_for(table):
+            counts[(metric, rollup_key(row.get(column)))] += delta
+        amount = expense_cents(row.get('expenses')) if table == 'meetings' else None
+        if amount is not None:
+            key = (EXPENSES_METRIC, rollup_key(row.get('travelMode')))
+            counts[key] += delta
+            cents[key] += delta * amount
+    if not counts:
+        return
+    dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(stat_rollups)
+    statement = statement.on_conflict_do_update(
+        index_elements=['metric', 'key'],
+        set_={'count': stat_rollups.c.count + statement.excluded.count,
+              'cents': stat_rollups.c.cents + statement.excluded.cents})
+    connection.execute(statement, [{'metric': metric, 'key': key, 'count': count, 'cents': cents[metric, key]}
+                                   for (metric, key), count in counts.items()])
+
+
+def read_counts(connection, metric):
+    """Return {key: count} for one rollup metric"""
+    rows = connection.execute(
+        select(stat_rollups.c.key, stat_rollups.c.count)
+        .where(stat_rollups.c.metric == metric, stat_rollups.c.count > 0)
+    )
+    return {(key if key != UNSPECIFIED else 'unspecified'): count for key, count in rows}
+
+
+def read_expenses(connection):
+    """Return {travelMode: {"meetings": count, "total": amount}} of summed expenses"""
+    rows = connection.execute(
+        select(stat_rollups.c.key, stat_rollups.c.count, stat_rollups.c.cents)
+        .where(stat_rollups.c.metric == EXPENSES_METRIC, stat_rollups.c.count > 0)
+    )
+    return {(key if key != UNSPECIFIED else 'unspecified'): {"meetings": count, "total": cents / 100}
+            for key, count, cents in rows}
+
+
+def fetch_stats(connection, today=None):
+    """Build the dashboard statistics document"""
+    today = (today or date.today()).isoformat()
+    by_status = read_counts(connection, 'leads.status')
+    meeting_dates = (stat_rollups.c.metric == 'meetings.date', stat_rollups.c.count > 0)
+    meetings_total = connection.execute(
+        select(func.coalesce(func.sum(stat_rollups.c.count), 0)).where(*meeting_dates)).scalar()
+    upcoming = connection.execute(
+        select(func.coalesce(func.sum(stat_rollups.c.count), 0))
+        .where(*meeting_dates, stat_rollups.c.key >= today)).scalar()
+    meetings_today = connection.execute(
+        select(func.coalesce(func.sum(stat_rollups.c.count), 0))
+        .where(*meeting_dates, stat_rollups.c.key == today)).scalar()
+
+    return {
+        "leads": {
+            "total": sum(by_status.values()),
+            "byStatus": by_status,
+            "byAssignedSalesRep": read_counts(connection, 'leads.rep'),
+            "bySource": read_counts(connection, 'leads.source'),
+        },
+        "meetings": {
+            "total": meetings_total,
+            "upcoming": upcoming,
+            "today": meetings_today,
+            "byTravelMode": read_counts(connection, 'meetings.travelMode'),
+            "expensesByTravelMode": read_expenses(connection),
+        },
+    }
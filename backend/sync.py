@@ -0,0 +1,137 @@
+"""Delta sync for offline clients.
+
+Row-level triggers (installed by migration 6) keep one row per lead and
+meeting in record_changes: the latest operation on the record ('upsert' or
+'delete') and a sequence number drawn on every change. A deleted record
+keeps its row as a tombstone. GET /api/sync returns the changes made since
+the client's token, oldest first, and a new token; reconnect traffic is
+proportional to the number of records changed, not to table size.
+
+Sequence numbers are drawn when a row is written, so on PostgreSQL they do
+not follow commit order: a transaction can commit a lower number after a
+higher one has been handed out. Tokens therefore hold the transaction
+snapshot of the first page of a sync, and the next sync returns every
+change committed by a transaction that snapshot could not see. A change
+delivered on a later page may be delivered again by the next sync, which is
+harmless since clients apply changes as upserts and deletes by id. SQLite
+serializes writers, so there the sequence number alone is the token.
+"""
+import base64
+import binascii
+import json
+import os
+import re
+
+from sqlalchemy import select, text
+
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', 500))
+MAX_SYNC_PAGE_SIZE = 5000
+
+SYNC_TABLES = ('leads', 'meetings')
+
+SNAPSHOT_PATTERN = re.compile(r'^\d+:\d+:[\d,]*$')
+
+
+class SyncError(ValueError):
+    """Raised when sync parameters are invalid"""
+
+
+def encode_token(state):
+    payload = json.dumps(state, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Decode a sync token into {"after": seq, "from": snapshot, "next": snapshot}"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded))
+        after = int(state['after'])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise SyncError("Invalid 'since' token")
+    snapshots = {key: state.get(key) for key in ('from', 'next')}
+    for snapshot in snapshots.values():
+        if snapshot is not None and not (isinstance(snapshot, str) and SNAPSHOT_PATTERN.match(snapshot)):
+            raise SyncError("Invalid 'since' token")
+    return {"after": after, **snapshots}
+
+
+def parse_sync_args(args):
+    """Return (token state, limit) from request arguments"""
+    since = args.get('since')
+    state = decode_token(since) if since else {"after": 0, "from": None, "next": None}
+    try:
+        limit = int(args.get('limit', SYNC_PAGE_SIZE))
+    except ValueError:
+        raise SyncError("'limit' must be an integer")
+    if limit < 1:
+        raise SyncError("'limit' must be positive")
+    return state, min(limit, MAX_SYNC_PAGE_SIZE)
+
+
+def current_token(engine):
+    """A token at the end of the change log, from which only later changes are returned"""
+    with engine.connect() as connection:
+        if engine.dialect.name == 'postgresql':
+            snapshot = connection.execute(text('SELECT CAST(pg_current_snapshot() AS text)')).scalar()
+            return encode_token({"after": 0, "from": snapshot})
+        last_seq = connection.execute(text('SELECT coalesce(max(seq), 0) FROM record_changes')).scalar()
+        return encode_token({"after": last_seq})
+
+
+def read_changes(connection, state, limit):
+    """Fetch up to limit + 1 change rows after the token position"""
+    sql = 'SELECT seq, "tableName", "recordId", op FROM record_changes WHERE seq > :after'
+    params = {'after': state['after'], 'limit': limit + 1}
+    if state['from'] is not None:
+        # Changes committed by transactions the previous sync could not see
+        sql += (' AND txid >= pg_snapshot_xmin(CAST(:from AS pg_snapshot))'
+                ' AND NOT pg_visible_in_snapshot(txid, CAST(:from AS pg_snapshot))')
+        params['from'] = state['from']
+    sql += ' ORDER BY seq LIMIT :limit'
+    return connection.execute(text(sql), params).all()
+
+
+def fetch_changes(engine, tables, serializers, state, limit):
+    """Return (changes, next token, more) for one sync page"""
+    postgres = engine.dialect.name == 'postgresql'
+    with engine.connect() as connection:
+        if postgres:
+            # Snapshot, change log and records must all be read at one point in time
+            connection.execution_options(isolation_level='REPEATABLE READ')
+        with connection.begin():
+            snapshot = None
+            if postgres:
+                snapshot = connection.execute(text('SELECT CAST(pg_current_snapshot() AS text)')).scalar()
+            rows = read_changes(connection, state, limit)
+            more = len(rows) > limit
+            rows = rows[:limit]
+
+            upserted = {}
+            for _, table_name, record_id, op in rows:
+                if op == 'upsert':
+                    upserted.setdefault(table_name, []).append(record_id)
+            records = {}
+            for table_name, ids in upserted.items():
+                table = tables[table_name]
+                for row in connection.execute(select(table).where(table.c.id.in_(ids))):
+                    records[table_name, row.id] = serializers[table_name].to_dict(row)
+
+    changes = []
+    for seq, table_name, record_id, op in rows:
+        change = {"seq": seq, "type": table_name, "id": record_id, "op": op}
+        record = records.get((table_name, record_id))
+        if op == 'upsert' and record is not None:
+            change["record"] = record
+        else:
+            change["op"] = 'delete'
+        changes.append(change)
+
+    last_seq = rows[-1][0] if rows else state['after']
+    if not postgres:
+        token = {"after": last_seq}
+    elif more:
+        token = {"after": last_seq, "from": state['from'], "next": state['next'] or snapshot}
+    else:
+        token = {"after": 0, "from": state['next'] or snapshot}
+    return changes, encode_token(token), more
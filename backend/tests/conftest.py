@@ -0,0 +1,86 @@
+"""Fixtures running the backend against a freshly migrated SQLite database"""
+import uuid
+from datetime import date, datetime, time
+
+import pytest
+from sqlalchemy import insert
+
+from app import create_app
+from database import create_database_engine
+from migrations import run_migrations
+from models import leads, meetings
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'fieldsense.db'}"
+
+
+@pytest.fixture
+def engine(database_url):
+    engine = create_database_engine(database_url)
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def app(engine, database_url):
+    """The API on the test database, with no background threads"""
+    app = create_app({'DATABASE_URL': database_url, 'DATABASE_REPLICA_URLS': [],
+                      'JOB_RUNNER': 'process', 'FOLLOWUP_SWEEPER': 'off'})
+    yield app
+    app.extensions['fieldsense'].engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def lead_values(**values):
+    """A complete leads row, with values overriding the defaults"""
+    now = datetime(2026, 1, 1, 9, 0)
+    row = {
+        'id': str(uuid.uuid4()), 'leadName': 'Ada', 'leadSource': 'web', 'contactPhone': '555-0100',
+        'contactEmail': 'ada@example.com', 'companyName': 'Analytical', 'leadStatus': 'new',
+        'assignedSalesRep': 'Jane', 'lastContactDate': None, 'nextFollowUpDate': None,
+        'createdAt': now, 'updatedAt': now,
+    }
+    row.update(values)
+    return row
+
+
+@pytest.fixture
+def add_leads(engine):
+    """Insert leads rows given as dicts of overrides; returns the full rows"""
+    def add(*overrides):
+        rows = [lead_values(**values) for values in overrides]
+        with engine.begin() as connection:
+            connection.execute(insert(leads), rows)
+        return rows
+    return add
+
+
+def meeting_values(**values):
+    """A complete meetings row, with values overriding the defaults"""
+    now = datetime(2026, 1, 1, 9, 0)
+    row = {
+        'id': str(uuid.uuid4()), 'meetingTitle': 'Kickoff', 'meetingDate': date(2026, 3, 1),
+        'meetingTime': time(9, 30), 'participants': 'Ada, Jane', 'location': 'HQ', 'travelMode': 'Car',
+        'expenses': None, 'meetingAgenda': None, 'latitude': None, 'longitude': None,
+        'createdAt': now, 'updatedAt': now,
+    }
+    row.update(values)
+    return row
+
+
+@pytest.fixture
+def add_meetings(engine):
+    """Insert meetings rows given as dicts of overrides; returns the full rows"""
+    def add(*overrides):
+        rows = [meeting_values(**values) for values in overrides]
+        with engine.begin() as connection:
+            connection.execute(insert(meetings), rows)
+        return rows
+    return add
@@ -0,0 +1,72 @@
+import importlib
+import sys
+
+import pytest
+from starlette.testclient import TestClient
+
+import app as app_module
+
+
+@pytest.fixture
+def asgi(engine, database_url, monkeypatch):
+    """asgi.py imported against the test database, with no background threads"""
+    monkeypatch.setenv('DATABASE_URL', database_url)
+    monkeypatch.setattr(app_module, 'DATABASE_REPLICA_URLS', [])
+    monkeypatch.setattr(app_module, 'JOB_RUNNER', 'process')
+    monkeypatch.setattr(app_module, 'FOLLOWUP_SWEEPER', 'off')
+    sys.modules.pop('asgi', None)
+    module = importlib.import_module('asgi')
+    yield module
+    sys.modules.pop('asgi', None)
+    module.flask_app.extensions['fieldsense'].engine.dispose()
+
+
+@pytest.fixture
+def asgi_client(asgi):
+    with TestClient(asgi.app) as client:
+        yield client
+
+
+def test_flask_health_reports_only_services_in_use(app, client):
+    services = app.extensions['fieldsense']
+    body = client.get('/health').get_json()
+    assert 'pool' in body
+    assert not {'cache', 'geocoding', 'replication', 'events'} & set(body)
+    assert not services.built('geocoder')
+
+    client.get('/api/leads')
+    assert {'cache', 'replication'} <= set(client.get('/health').get_json())
+
+
+def test_async_health_reports_the_async_pool(asgi, asgi_client):
+    body = asgi_client.get('/health').json()
+    assert body['status'] == 'healthy'
+    # asgi.py uses the cache and the change feed from import on
+    assert {'cache', 'events'} <= set(body)
+    assert 'geocoding' not in body
+    assert not asgi.app_services.built('geocoder')
+
+
+def test_async_reads_honour_if_none_match_and_if_modified_since(asgi_client, add_leads):
+    lead, = add_leads({})
+    first = asgi_client.get(f"/api/leads/{lead['id']}")
+    assert first.status_code == 200
+    assert first.headers['Last-Modified'] == 'Thu, 01 Jan 2026 09:00:00 GMT'
+
+    def status(**headers):
+        return asgi_client.get(f"/api/leads/{lead['id']}", headers=headers).status_code
+
+    assert status(**{'If-None-Match': first.headers['ETag']}) == 304
+    assert status(**{'If-Modified-Since': 'Thu, 01 Jan 2026 09:00:00 GMT'}) == 304
+    assert status(**{'If-Modified-Since': 'Thu, 01 Jan 2026 10:00:00 +0100'}) == 304
+    assert status(**{'If-Modified-Since': 'Thu, 01 Jan 2026 08:59:59 GMT'}) == 200
+    assert status(**{'If-Modified-Since': 'yesterday'}) == 200
+    # A stale ETag wins over a current date
+    assert status(**{'If-None-Match': '"other"', 'If-Modified-Since': 'Fri, 02 Jan 2026 00:00:00 GMT'}) == 200
+
+
+def test_async_list_304_matches_the_flask_app(asgi_client, client, add_leads):
+    add_leads({}, {})
+    flask_page = client.get('/api/leads', headers={'Accept-Encoding': 'identity'})
+    async_page = asgi_client.get('/api/leads', headers={'If-None-Match': flask_page.headers['ETag']})
+    assert async_page.status_code == 304
@@ -0,0 +1,71 @@
+from datetime import date
+
+from sqlalchemy import func, select
+
+from archive import archive_meetings
+from models import leads, meetings, meetings_archive
+
+
+def count(engine, table):
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(table)).scalar()
+
+
+def new_lead(**values):
+    lead = {'leadName': 'Grace', 'leadSource': 'referral', 'contactPhone': '555-0101',
+            'contactEmail': 'grace@example.com', 'companyName': 'Navy', 'leadStatus': 'new',
+            'assignedSalesRep': 'Raj'}
+    lead.update(values)
+    return lead
+
+
+def test_batch_reports_a_result_per_operation_in_order(client, engine, add_leads):
+    kept, removed = add_leads({}, {})
+    response = client.post('/api/leads/batch', json={'operations': [
+        {'op': 'create', 'data': new_lead()},
+        {'op': 'update', 'id': kept['id'], 'data': new_lead(leadStatus='won')},
+        {'op': 'delete', 'id': removed['id']},
+        {'op': 'update', 'id': 'missing', 'data': new_lead()},
+        {'op': 'delete', 'id': 'missing'},
+        {'op': 'create', 'data': new_lead(leadName='')},
+        {'op': 'rename', 'id': kept['id']},
+    ]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['index'] for result in results] == list(range(7))
+    assert [result['status'] for result in results] == [201, 200, 200, 404, 404, 400, 400]
+
+    assert results[0]['record']['leadName'] == 'Grace'
+    assert results[1]['record']['leadStatus'] == 'won'
+    assert results[5]['error'] == "Field 'leadName' is required"
+    assert count(engine, leads) == 2
+    assert client.get(f"/api/leads/{removed['id']}").status_code == 404
+
+
+def test_batch_accepts_a_bare_list_and_rejects_other_bodies(client):
+    response = client.post('/api/leads/batch', json=[{'op': 'create', 'data': new_lead()}])
+    assert [result['status'] for result in response.get_json()['results']] == [201]
+
+    assert client.post('/api/leads/batch', json={'operations': 'create'}).status_code == 400
+    assert client.post('/api/leads/batch', json={'ops': []}).status_code == 400
+
+
+def test_batch_delete_removes_archived_meetings(client, engine, add_meetings):
+    old, current = add_meetings({'meetingDate': date(2020, 1, 1)}, {})
+    assert archive_meetings(engine, date(2021, 1, 1)) == 1
+
+    response = client.post('/api/meetings/batch', json={'operations': [
+        {'op': 'delete', 'id': old['id']},
+        {'op': 'delete', 'id': current['id']},
+        {'op': 'delete', 'id': old['id']},
+    ]})
+    assert [result['status'] for result in response.get_json()['results']] == [200, 200, 200]
+    assert count(engine, meetings) == 0
+    assert count(engine, meetings_archive) == 0
+    assert client.get(f"/api/meetings/{old['id']}").status_code == 404
+
+
+def test_single_and_batch_deletes_agree_on_missing_records(client, add_meetings):
+    assert client.delete('/api/meetings/missing').status_code == 404
+    response = client.post('/api/meetings/batch', json=[{'op': 'delete', 'id': 'missing'}])
+    assert response.get_json()['results'][0]['status'] == 404
@@ -0,0 +1,108 @@
+from sqlalchemy import update
+
+from cache import MemoryBackend, ResponseCache, build_entry
+from models import leads
+
+LEAD_FIELDS = ('leadName', 'leadSource', 'contactPhone', 'contactEmail', 'companyName', 'leadStatus',
+               'assignedSalesRep')
+
+
+def lookups(app):
+    status = app.extensions['fieldsense'].response_cache.status()
+    return status['hits'], status['misses']
+
+
+def test_repeat_reads_are_served_from_the_cache(app, client, engine, add_leads):
+    lead, = add_leads({})
+    first = client.get(f"/api/leads/{lead['id']}")
+    # A write that bypasses the API is not seen until the entry is invalidated
+    with engine.begin() as connection:
+        connection.execute(update(leads).where(leads.c.id == lead['id']).values(leadName='Changed'))
+    second = client.get(f"/api/leads/{lead['id']}")
+
+    assert lookups(app) == (1, 1)
+    assert second.get_data() == first.get_data()
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+
+def test_current_validators_get_a_304(client, add_leads):
+    lead, = add_leads({})
+    first = client.get(f"/api/leads/{lead['id']}")
+    assert first.headers['Last-Modified'] == 'Thu, 01 Jan 2026 09:00:00 GMT'
+
+    matched = client.get(f"/api/leads/{lead['id']}", headers={'If-None-Match': first.headers['ETag']})
+    assert matched.status_code == 304
+    assert matched.get_data() == b''
+    unmodified = client.get(f"/api/leads/{lead['id']}",
+                            headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert unmodified.status_code == 304
+    stale = client.get(f"/api/leads/{lead['id']}", headers={'If-None-Match': '"other"'})
+    assert stale.status_code == 200
+
+
+def test_writes_invalidate_the_record_and_its_lists(client, add_leads):
+    lead, = add_leads({})
+    record = client.get(f"/api/leads/{lead['id']}")
+    listing = client.get('/api/leads')
+    assert len(listing.get_json()) == 1
+
+    data = {name: lead[name] for name in LEAD_FIELDS}
+    assert client.put(f"/api/leads/{lead['id']}", json={**data, 'leadStatus': 'won'}).status_code == 200
+    assert client.post('/api/leads', json=data).status_code == 201
+
+    updated = client.get(f"/api/leads/{lead['id']}", headers={'If-None-Match': record.headers['ETag']})
+    assert updated.status_code == 200
+    assert updated.get_json()['leadStatus'] == 'won'
+    relisted = client.get('/api/leads', headers={'If-None-Match': listing.headers['ETag']})
+    assert relisted.status_code == 200
+    assert len(relisted.get_json()) == 2
+
+
+def test_batch_writes_invalidate_every_record_of_the_table(app, client, add_leads):
+    first, second = add_leads({}, {})
+    cached = client.get(f"/api/leads/{second['id']}")
+    client.post('/api/leads/batch', json=[{'op': 'delete', 'id': first['id']}])
+    # The untouched record is read again, and its unchanged body keeps its ETag
+    reread = client.get(f"/api/leads/{second['id']}", headers={'If-None-Match': cached.headers['ETag']})
+    assert reread.status_code == 304
+    assert lookups(app) == (0, 2)
+
+
+def test_projected_reads_are_cached_separately(client, add_leads):
+    lead, = add_leads({})
+    full = client.get(f"/api/leads/{lead['id']}")
+    projected = client.get(f"/api/leads/{lead['id']}", query_string={'fields': 'leadName'})
+    assert projected.get_json() == {'id': lead['id'], 'leadName': 'Ada'}
+    assert projected.headers['ETag'] != full.headers['ETag']
+
+
+def test_memory_backend_evicts_least_recently_used_and_expired_entries(monkeypatch):
+    backend = MemoryBackend(max_entries=2)
+    backend.set('a', 1, ttl=30)
+    backend.set('b', 2, ttl=30)
+    assert backend.get('a') == 1
+    backend.set('c', 3, ttl=30)
+    assert backend.get('b') is None
+    assert backend.get('a') == 1
+
+    clock = iter([100.0, 131.0])
+    monkeypatch.setattr('cache.time.monotonic', lambda: next(clock))
+    backend.set('d', 4, ttl=30)
+    assert backend.get('d') is None
+
+
+def test_entries_loaded_across_a_write_are_not_stored():
+    cache = ResponseCache(MemoryBackend(max_entries=10), ttl=30)
+    row = type('Row', (), {'updatedAt': None, 'createdAt': None})()
+
+    def load():
+        cache.invalidate_record('leads', 'x')
+        return build_entry(b'{}', [row])
+
+    key = cache.record_key('leads', 'x')
+    assert cache.get_or_load('leads', key, load) is not None
+    assert cache.backend.get(key) is None
+
+    assert cache.get_or_load('leads', key, lambda: build_entry(b'{}', [row])) is not None
+    assert cache.backend.get(key) is not None
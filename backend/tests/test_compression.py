@@ -0,0 +1,82 @@
+import gzip
+import json
+
+import pytest
+
+import compression
+from compression import CompressedBodies, choose_encoding, compressible
+
+
+@pytest.fixture
+def many_leads(add_leads):
+    """Enough leads for a list body above COMPRESS_MIN_SIZE"""
+    return add_leads(*({'leadName': f'Lead {n}'} for n in range(20)))
+
+
+def test_json_lists_are_gzipped_when_accepted(client, many_leads):
+    plain = client.get('/api/leads')
+    zipped = client.get('/api/leads', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.get_data()) == plain.get_data()
+    assert len(zipped.get_data()) < len(plain.get_data())
+    assert zipped.headers['Vary'] == 'Accept-Encoding'
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+
+
+def test_compressed_responses_carry_a_weak_etag_that_still_matches(client, many_leads):
+    plain = client.get('/api/leads')
+    zipped = client.get('/api/leads', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.headers['ETag'] == f"W/{plain.headers['ETag']}"
+    revalidated = client.get('/api/leads', headers={'Accept-Encoding': 'gzip',
+                                                    'If-None-Match': zipped.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert 'Content-Encoding' not in revalidated.headers
+
+
+@pytest.mark.parametrize('accept_encoding', ['identity', 'gzip;q=0', 'deflate', ''])
+def test_identity_is_sent_unless_gzip_is_accepted(client, many_leads, accept_encoding):
+    response = client.get('/api/leads', headers={'Accept-Encoding': accept_encoding})
+    assert 'Content-Encoding' not in response.headers
+    assert len(response.get_json()) == 20
+
+
+def test_small_bodies_are_sent_as_they_are(client, add_leads):
+    lead, = add_leads({})
+    response = client.get(f"/api/leads/{lead['id']}", headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json()['id'] == lead['id']
+
+
+def test_streamed_exports_are_compressed_chunk_by_chunk(client, many_leads):
+    response = client.get('/api/export/leads', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    lines = gzip.decompress(response.get_data()).decode().splitlines()
+    assert sorted(json.loads(line)['id'] for line in lines) == sorted(lead['id'] for lead in many_leads)
+
+
+def test_negotiation_prefers_the_best_accepted_encoding(monkeypatch):
+    assert choose_encoding(None) is None
+    assert choose_encoding('gzip, deflate') == 'gzip'
+    assert choose_encoding('*') == compression.ENCODINGS[0]
+    monkeypatch.setattr(compression, 'ENCODINGS', ('br', 'gzip'))
+    assert choose_encoding('gzip, br') == 'br'
+    assert choose_encoding('br;q=0.5, gzip') == 'gzip'
+
+
+def test_event_streams_are_never_compressed():
+    assert compressible('application/json')
+    assert compressible('text/csv')
+    assert not compressible('text/event-stream')
+    assert not compressible('image/png')
+
+
+def test_compressed_bodies_are_memoized_by_etag():
+    bodies = CompressedBodies(max_entries=1)
+    body = b'x' * 2000
+    first = bodies.get_or_compress('a', body, 'gzip')
+    assert bodies.get_or_compress('a', body, 'gzip') is first
+    bodies.get_or_compress('b', body, 'gzip')
+    assert bodies.get_or_compress('a', body, 'gzip') is not first
+    assert gzip.decompress(first) == body
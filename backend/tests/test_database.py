@@ -0,0 +1,30 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import exc
+
+from database import InstrumentedQueuePool
+
+
+def test_pool_counts_checkout_timeouts():
+    pool = InstrumentedQueuePool(lambda: sqlite3.connect(':memory:'), pool_size=1, max_overflow=0,
+                                 timeout=0.05)
+    held = pool.connect()
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+    held.close()
+    pool.connect().close()
+
+    stats = pool.stats.snapshot()
+    assert stats['timeouts'] == 1
+    assert stats['checkouts'] == 2
+
+
+def test_pool_does_not_count_connection_errors_as_timeouts():
+    def refuse():
+        raise sqlite3.OperationalError("unable to open database file")
+
+    pool = InstrumentedQueuePool(refuse, pool_size=1, max_overflow=0, timeout=0.05)
+    with pytest.raises(sqlite3.OperationalError):
+        pool.connect()
+    assert pool.stats.snapshot()['timeouts'] == 0
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from events import ChangeFeed, FeedFull, Subscription, format_changes, parse_last_event_id, stream
+from sync import SyncError, current_token
+
+
+@pytest.fixture
+def feed(engine):
+    """A ChangeFeed driven by the test instead of its reader thread"""
+    feed = ChangeFeed(engine, max_subscribers=2)
+    feed.ensure_started = lambda: None
+    feed.token = current_token(engine)
+    return feed
+
+
+def frames(body):
+    """Each SSE frame of body as a {field: value} dict"""
+    parsed = []
+    for frame in body.decode().split('\n\n'):
+        if frame:
+            parsed.append(dict(line.split(': ', 1) for line in frame.splitlines()))
+    return parsed
+
+
+def test_only_the_last_change_of_a_page_carries_the_token():
+    changes = [{"seq": 1, "type": "leads", "id": "a", "op": "upsert"},
+               {"seq": 2, "type": "leads", "id": "b", "op": "delete"}]
+    first, last = frames(format_changes(changes, 'token'))
+    assert first == {'event': 'change', 'data': json.dumps(changes[0], separators=(',', ':'))}
+    assert last['id'] == 'token'
+    assert json.loads(last['data']) == changes[1]
+    assert format_changes([], 'token') == b''
+
+
+def test_an_overflowing_subscription_drops_its_buffer_and_reads_the_log():
+    subscription = Subscription('token', False, max_pages=2, notify=lambda: None)
+    subscription.deliver(('page 1', 't1'))
+    assert subscription.take() == [('page 1', 't1')]
+
+    for n in range(3):
+        subscription.deliver((f'page {n}', f't{n}'))
+    assert subscription.take() is None
+    # Pages are buffered again once the stream went back to the log
+    assert subscription.take() == []
+    subscription.deliver(('page 3', 't3'))
+    assert subscription.take() == [('page 3', 't3')]
+
+
+def test_a_slow_stream_catches_up_from_its_last_event_id(feed, add_leads):
+    subscription = feed.subscribe()
+    subscription.max_pages = 1
+    body = stream(feed, subscription, heartbeat=0)
+    assert next(body) == b'retry: 3000\n\n'
+
+    first, = add_leads({})
+    feed.advance()
+    second, = add_leads({})
+    feed.advance()
+    assert subscription.catching_up
+    # Nothing else publishes the second page; the stream reads it from the log
+    delivered = frames(next(body))
+    assert [json.loads(frame['data'])['id'] for frame in delivered] == [first['id'], second['id']]
+    assert delivered[-1]['id'] == subscription.token
+
+    body.close()
+    assert feed.status()['subscribers'] == 0
+
+
+def test_streams_beyond_the_limit_are_refused(feed):
+    feed.subscribe()
+    feed.subscribe()
+    with pytest.raises(FeedFull):
+        feed.subscribe()
+
+
+def test_last_event_id_comes_from_the_header_or_the_query(engine):
+    token = current_token(engine)
+    assert parse_last_event_id({}, {}) is None
+    assert parse_last_event_id({'Last-Event-ID': token}, {'lastEventId': 'ignored'}) == token
+    assert parse_last_event_id({}, {'lastEventId': token}) == token
+    with pytest.raises(SyncError):
+        parse_last_event_id({'Last-Event-ID': 'garbage'}, {})
+
+
+def test_events_route_refuses_gunicorn_sync_workers(client):
+    response = client.get('/api/events', environ_base={'SERVER_SOFTWARE': 'gunicorn/21.2.0'})
+    assert response.status_code == 503
+    assert client.get('/api/events', headers={'Last-Event-ID': 'garbage'}).status_code == 400
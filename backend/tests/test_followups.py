@@ -0,0 +1,110 @@
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from followups import ReminderSweeper, overdue_counts
+from models import followup_reminders, leads
+
+TODAY = date(2026, 3, 2)
+MORNING = datetime(2026, 3, 2, 8, 0)
+REMIND_TIME = datetime(2026, 3, 2, 9, 0)
+
+
+def reminded(engine):
+    with engine.connect() as connection:
+        return sorted(connection.execute(
+            select(followup_reminders.c.leadId, followup_reminders.c.followUpDate)).all())
+
+
+@pytest.fixture
+def schedule(add_leads):
+    """Follow-ups around TODAY: yesterday, today, tomorrow, closed, and past the grace window"""
+    return dict(zip(('yesterday', 'today', 'tomorrow', 'closed', 'expired'), add_leads(
+        {'nextFollowUpDate': TODAY - timedelta(days=1)},
+        {'nextFollowUpDate': TODAY, 'assignedSalesRep': 'Raj'},
+        {'nextFollowUpDate': TODAY + timedelta(days=1)},
+        {'nextFollowUpDate': TODAY, 'leadStatus': 'lost'},
+        {'nextFollowUpDate': TODAY - timedelta(days=30)},
+    )))
+
+
+def test_reminders_fire_once_at_the_remind_hour(engine, schedule):
+    sweeper = ReminderSweeper(engine)
+    # Yesterday's reminder is late but within the grace window
+    assert sweeper.sweep(MORNING) == 1
+    assert sweeper.sweep(REMIND_TIME) == 1
+    assert sweeper.sweep(REMIND_TIME + timedelta(hours=1)) == 0
+    assert reminded(engine) == sorted([(schedule['yesterday']['id'], TODAY - timedelta(days=1)),
+                                       (schedule['today']['id'], TODAY)])
+    assert sweeper.status() == {"scheduled": 1, "emitted": 2}
+
+    assert sweeper.sweep(REMIND_TIME + timedelta(days=1)) == 1
+    assert sweeper.status() == {"scheduled": 0, "emitted": 3}
+
+
+def test_rescheduled_follow_ups_are_dropped_then_reminded_on_the_new_date(engine, schedule):
+    sweeper = ReminderSweeper(engine)
+    sweeper.sweep(MORNING)
+    lead_id = schedule['today']['id']
+    with engine.begin() as connection:
+        connection.execute(update(leads).where(leads.c.id == lead_id)
+                           .values(nextFollowUpDate=TODAY + timedelta(days=1)))
+    assert sweeper.sweep(REMIND_TIME) == 0
+
+    sweeper.invalidate()
+    assert sweeper.sweep(REMIND_TIME + timedelta(days=1)) == 2
+    assert (lead_id, TODAY + timedelta(days=1)) in reminded(engine)
+
+
+def test_sweepers_in_several_processes_remind_once(engine, schedule):
+    first, second = ReminderSweeper(engine), ReminderSweeper(engine)
+    first.reload(TODAY)
+    second.reload(TODAY)
+    assert first.sweep(REMIND_TIME) == 2
+    assert second.sweep(REMIND_TIME) == 0
+    assert len(reminded(engine)) == 2
+
+
+def test_reminders_are_written_in_batches(engine, add_leads):
+    add_leads(*({'nextFollowUpDate': TODAY} for _ in range(5)))
+    assert ReminderSweeper(engine, batch_size=2).sweep(REMIND_TIME) == 5
+    assert len(reminded(engine)) == 5
+
+
+def test_the_sweeper_thread_emits_due_reminders_and_stops(engine, add_leads):
+    add_leads({'nextFollowUpDate': date.today() - timedelta(days=1)})
+    sweeper = ReminderSweeper(engine)
+    sweeper.ensure_started()
+    try:
+        for _ in range(500):
+            if sweeper.emitted:
+                break
+            time.sleep(0.01)
+    finally:
+        sweeper.stop()
+    assert sweeper.emitted == 1
+    assert not sweeper.thread.is_alive()
+
+
+def test_reminders_endpoint_lists_a_reps_reminders(client, engine, schedule):
+    ReminderSweeper(engine).sweep(REMIND_TIME)
+    body = client.get('/api/followups/reminders', query_string={'rep': 'Raj'}).get_json()
+    assert [(reminder['leadId'], reminder['followUpDate']) for reminder in body] == [
+        (schedule['today']['id'], TODAY.isoformat())]
+    assert client.get('/api/followups/reminders', query_string={'since': 'noon'}).status_code == 400
+
+
+def test_due_queue_and_overdue_counts(client, engine, schedule):
+    due = client.get('/api/followups/due', query_string={'until': TODAY.isoformat()}).get_json()
+    expected = [schedule[name]['id'] for name in ('expired', 'yesterday', 'today')]
+    assert [lead['id'] for lead in due] == expected
+    raj = client.get('/api/followups/due', query_string={'until': TODAY.isoformat(), 'rep': 'Raj'})
+    assert [lead['id'] for lead in raj.get_json()] == [schedule['today']['id']]
+
+    with engine.connect() as connection:
+        counts = overdue_counts(connection, TODAY)
+    assert counts == {"date": TODAY.isoformat(), "overdue": 2, "dueToday": 1,
+                      "reps": {"Jane": {"overdue": 2, "dueToday": 0}, "Raj": {"overdue": 0, "dueToday": 1}}}
+    assert client.get('/api/followups/overdue', query_string={'rep': 'Raj'}).status_code == 200
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+import geo
+from geo import GridIndex, LocalGeo
+from models import meetings
+
+# Around London: Westminster, the City, Greenwich and Oxford
+WESTMINSTER = (51.4995, -0.1248)
+CITY = (51.5155, -0.0922)
+GREENWICH = (51.4826, -0.0077)
+OXFORD = (51.7520, -1.2577)
+
+
+@pytest.fixture
+def located(add_meetings):
+    return add_meetings(*({'latitude': lat, 'longitude': lng} for lat, lng in
+                          (OXFORD, GREENWICH, CITY, WESTMINSTER)),
+                        {'latitude': None, 'longitude': None})
+
+
+def nearby_ids(client, **query):
+    response = client.get('/api/meetings/nearby', query_string=query)
+    assert response.status_code == 200
+    return [hit['id'] for hit in response.get_json()['results']]
+
+
+def test_nearby_orders_by_distance_and_applies_the_radius(client, located):
+    oxford, greenwich, city, westminster, _ = located
+    lat, lng = WESTMINSTER
+    assert nearby_ids(client, lat=lat, lng=lng) == [
+        westminster['id'], city['id'], greenwich['id'], oxford['id']]
+    assert nearby_ids(client, lat=lat, lng=lng, radius=5, limit=1) == [westminster['id']]
+
+
+def test_bbox_bounds_the_results(client, located):
+    _, greenwich, city, _, _ = located
+    # Ordered by distance from the centre of the box
+    assert nearby_ids(client, bbox='-0.1,51.45,0.0,51.52') == [greenwich['id'], city['id']]
+
+
+@pytest.mark.parametrize('query', [{}, {'lat': 51.5}, {'lat': 91, 'lng': 0},
+                                   {'lat': 0, 'lng': 0, 'radius': 0}, {'bbox': '1,2,3'},
+                                   {'bbox': '10,0,-10,1'}])
+def test_invalid_nearby_arguments_are_rejected(client, query):
+    assert client.get('/api/meetings/nearby', query_string=query).status_code == 400
+
+
+def test_grid_wraps_around_the_antimeridian():
+    index = GridIndex()
+    index.add('east', 0.0, 179.95)
+    index.add('west', 0.0, -179.95)
+    assert [hit[1] for hit in index.within(0.0, 179.99, 20)] == ['east', 'west']
+
+
+def test_stale_grid_keeps_serving_while_a_background_rebuild_runs(engine, located, monkeypatch):
+    oxford, _, _, westminster, _ = located
+    backend = LocalGeo(engine, meetings)
+    first = backend.grid()
+    assert set(first.points) == {row['id'] for row in located[:4]}
+
+    monkeypatch.setattr(geo, 'GEO_INDEX_TTL', 0)
+    started, release = threading.Event(), threading.Event()
+    build_grid = backend.build_grid
+
+    def slow_build():
+        started.set()
+        release.wait(5)
+        return build_grid()
+
+    monkeypatch.setattr(backend, 'build_grid', slow_build)
+    assert backend.grid() is first
+    assert started.wait(5)
+    # Queries and writes carry on against the current grid during the build
+    assert backend.grid() is first
+    backend.record_delete(oxford['id'])
+
+    release.set()
+    for _ in range(500):
+        with backend.lock:
+            if backend.pending is None:
+                break
+        time.sleep(0.01)
+    swapped = backend.index
+    assert swapped is not first
+    # The delete made during the build is replayed onto the new grid
+    assert oxford['id'] not in swapped.points
+    assert westminster['id'] in swapped.points
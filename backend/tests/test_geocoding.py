@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import select
+
+from geocoding import GEOCODE_BATCH_MAX_MISSES, GeocodeProviderError, Geocoder, StubProvider
+from models import geocode_cache
+
+
+class CountingProvider(StubProvider):
+    """The stub provider, counting calls and failing on addresses containing "offline" """
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def geocode(self, address):
+        self.calls.append(address)
+        if 'offline' in address.lower():
+            raise GeocodeProviderError("Provider unavailable")
+        return super().geocode(address)
+
+
+@pytest.fixture
+def provider():
+    return CountingProvider()
+
+
+@pytest.fixture
+def geocoder(engine, provider):
+    return Geocoder(engine, provider)
+
+
+def cached_queries(engine):
+    with engine.connect() as connection:
+        return set(connection.execute(select(geocode_cache.c.query)).scalars())
+
+
+def test_equivalent_addresses_share_one_provider_call(geocoder, provider):
+    first, tier = geocoder.geocode('10 Downing St, London')
+    assert tier == 'provider'
+    again, tier = geocoder.geocode('  10 downing st london ')
+    assert (again, tier) == (first, 'memory')
+    assert provider.calls == ['10 Downing St, London']
+
+
+def test_misses_are_cached(geocoder, provider):
+    assert geocoder.geocode('Nowhere Lane') == (None, 'provider')
+    assert geocoder.geocode('nowhere lane') == (None, 'memory')
+    assert len(provider.calls) == 1
+
+
+def test_a_new_process_reads_the_shared_table(engine, geocoder, provider):
+    geocoder.geocode('Baker Street')
+    result, tier = Geocoder(engine, provider).geocode('baker street')
+    assert tier == 'database'
+    assert result.address == 'Baker Street'
+
+
+def test_batches_cap_provider_lookups_and_report_the_rest_pending(geocoder, provider):
+    addresses = [f'{n} High Street' for n in range(5)]
+    found, pending = geocoder.geocode_many(addresses + ['0 high street'], max_misses=2)
+    assert set(found) == {'0 High Street', '0 high street', '1 High Street'}
+    assert pending == addresses[2:]
+    assert provider.calls == addresses[:2]
+
+    # Asking again continues where the last batch stopped
+    found, pending = geocoder.geocode_many(addresses, max_misses=2)
+    assert pending == addresses[4:]
+    assert provider.calls == addresses[:4]
+
+
+def test_batch_results_are_cached_as_they_arrive(engine, geocoder):
+    with pytest.raises(GeocodeProviderError):
+        geocoder.geocode_many(['Fleet Street', 'Strand', 'Offline Road'])
+    assert cached_queries(engine) == {'Fleet Street', 'Strand'}
+
+
+def test_batch_endpoint_marks_pending_addresses(client, monkeypatch):
+    monkeypatch.setattr('services.create_provider', StubProvider)
+    # The miss for 'Nowhere' uses one provider lookup too, leaving the last address pending
+    addresses = [f'{n} Oxford Street' for n in range(GEOCODE_BATCH_MAX_MISSES)]
+    response = client.post('/api/geocode/batch', json={'addresses': ['Nowhere', *addresses, addresses[-1]]})
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['results'][0] == {'query': 'Nowhere'}
+    assert all('latitude' in result for result in body['results'][1:-2])
+    assert body['results'][-2:] == [{'query': addresses[-1], 'pending': True}] * 2
+    assert body['pending'] == 2
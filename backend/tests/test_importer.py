@@ -0,0 +1,48 @@
+import io
+import json
+
+import pytest
+
+from importer import ImportFormatError, read_json_array
+
+RECORDS = [
+    {"id": "a", "leadName": "Ada, \"the\" first]", "tags": [1, 2, {"nested": None}]},
+    12345,
+    -5.5e3,
+    1e-7,
+    "text with [brackets] and, commas",
+    True,
+    None,
+    [],
+    {},
+]
+
+
+@pytest.mark.parametrize('separator', [',', ' ,\n', ',\r\n  '])
+def test_read_json_array_across_chunk_boundaries(separator):
+    text = ' [ ' + separator.join(json.dumps(record) for record in RECORDS) + ' ]\n'
+    for chunk_size in range(1, len(text) + 2):
+        assert list(read_json_array(io.StringIO(text), chunk_size=chunk_size)) == RECORDS, chunk_size
+
+
+@pytest.mark.parametrize('text', ['', '{"id": 1}', '[1, 2', '[{"id": 1}', '[1, tru]', '[1. , 2]'])
+@pytest.mark.parametrize('chunk_size', [1, 3, 65536])
+def test_read_json_array_rejects_malformed_input(text, chunk_size):
+    with pytest.raises(ImportFormatError):
+        list(read_json_array(io.StringIO(text), chunk_size=chunk_size))
+
+
+def test_read_json_array_reads_each_chunk_once():
+    text = '[' + ','.join(json.dumps({"id": str(i)}) for i in range(2000)) + ']'
+    reads = []
+
+    class Tracked(io.StringIO):
+        def read(self, size=-1):
+            chunk = super().read(size)
+            reads.append(len(chunk))
+            return chunk
+
+    records = list(read_json_array(Tracked(text), chunk_size=4096))
+    assert [record["id"] for record in records] == [str(i) for i in range(2000)]
+    assert sum(reads) == len(text)
+    assert len(reads) <= len(text) // 4096 + 2
@@ -0,0 +1,155 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+import jobs
+from jobs import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, JobRunner, cancel_job, enqueue, get_job
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    """Test job types: 'fail' raises, 'wait' reports progress, 'ok' returns at once"""
+    def fail(engine, context, params, invalidate):
+        raise RuntimeError("boom")
+
+    def wait(engine, context, params, invalidate):
+        context.progress(1, 2, force=True)
+        return {"done": True}
+
+    def ok(engine, context, params, invalidate):
+        return {"done": True}
+
+    monkeypatch.setitem(jobs.HANDLERS, 'fail', (fail, dict))
+    monkeypatch.setitem(jobs.HANDLERS, 'wait', (wait, dict))
+    monkeypatch.setitem(jobs.HANDLERS, 'ok', (ok, dict))
+    monkeypatch.setattr(jobs, 'JOB_MAX_ATTEMPTS', 2)
+
+
+def make_runnable(engine, job_id):
+    """Move a job's retry time into the past"""
+    with engine.begin() as connection:
+        connection.execute(update(jobs.jobs).where(jobs.jobs.c.id == job_id)
+                           .values(runAfter=datetime.now() - timedelta(seconds=1)))
+
+
+def test_claim_runs_a_job_once(engine, handlers):
+    job = enqueue(engine, 'ok', {})
+    runner = JobRunner(engine)
+    claimed = runner.claim()
+    assert claimed.id == job['id'] and claimed.status == RUNNING and claimed.attempts == 1
+    assert runner.claim() is None
+    runner.execute(claimed)
+    finished = get_job(engine, job['id'])
+    assert finished['status'] == SUCCEEDED and finished['result'] == {"done": True}
+
+
+def test_failed_job_is_retried_with_backoff_then_fails(engine, handlers):
+    job = enqueue(engine, 'fail', {})
+    runner = JobRunner(engine)
+
+    runner.execute(runner.claim())
+    retried = get_job(engine, job['id'])
+    assert retried['status'] == QUEUED
+    assert retried['attempts'] == 1 and retried['error'] == 'boom'
+    # Not runnable again until the backoff has passed
+    assert runner.claim() is None
+
+    make_runnable(engine, job['id'])
+    claimed = runner.claim()
+    assert claimed.attempts == 2
+    runner.execute(claimed)
+    failed = get_job(engine, job['id'])
+    assert failed['status'] == FAILED and failed['finishedAt'] is not None
+
+
+def test_cancel_queued_job(engine, handlers):
+    job = enqueue(engine, 'ok', {})
+    assert cancel_job(engine, job['id'])['status'] == CANCELLED
+    assert JobRunner(engine).claim() is None
+    assert cancel_job(engine, 'missing') is None
+
+
+def test_cancel_running_job_stops_at_next_progress_report(engine, handlers):
+    job = enqueue(engine, 'wait', {})
+    runner = JobRunner(engine)
+    claimed = runner.claim()
+    cancelled = cancel_job(engine, job['id'])
+    assert cancelled['status'] == RUNNING and cancelled['cancelRequested']
+
+    runner.execute(claimed)
+    assert get_job(engine, job['id'])['status'] == CANCELLED
+
+
+def test_expired_lease_is_requeued_and_claimed_by_another_worker(engine, handlers):
+    job = enqueue(engine, 'ok', {})
+    crashed, survivor = JobRunner(engine), JobRunner(engine)
+    stale = crashed.claim()
+
+    # A live lease is left alone
+    survivor.requeue_expired()
+    assert get_job(engine, job['id'])['status'] == RUNNING
+
+    with engine.begin() as connection:
+        connection.execute(
+            update(jobs.jobs).where(jobs.jobs.c.id == job['id'])
+            .values(heartbeatAt=datetime.now() - timedelta(seconds=jobs.JOB_LEASE_SECONDS + 1)))
+    survivor.requeue_expired()
+    requeued = get_job(engine, job['id'])
+    assert requeued['status'] == QUEUED
+
+    claimed = survivor.claim()
+    assert claimed.id == job['id'] and claimed.attempts == 2 and claimed.lockedBy == survivor.worker_id
+
+    # The worker that lost the lease can no longer finish the job
+    crashed.finish(stale.id, status=SUCCEEDED)
+    assert get_job(engine, job['id'])['status'] == RUNNING
+    survivor.execute(claimed)
+    assert get_job(engine, job['id'])['status'] == SUCCEEDED
+
+
+def test_lease_is_renewed_while_a_silent_handler_runs(engine, handlers, monkeypatch):
+    monkeypatch.setattr(jobs, 'HEARTBEAT_SECONDS', 0.05)
+
+    def silent(engine, context, params, invalidate):
+        time.sleep(0.3)
+        return {}
+
+    monkeypatch.setitem(jobs.HANDLERS, 'silent', (silent, dict))
+    job = enqueue(engine, 'silent', {})
+    runner = JobRunner(engine)
+    claimed = runner.claim()
+    runner.execute(claimed)
+    with engine.connect() as connection:
+        heartbeat = connection.execute(
+            select(jobs.jobs.c.heartbeatAt).where(jobs.jobs.c.id == job['id'])).scalar()
+    assert heartbeat > claimed.heartbeatAt + timedelta(seconds=0.1)
+
+
+def test_worker_thread_survives_a_failure_while_recording_the_outcome(engine, handlers, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_POLL_INTERVAL', 0.05)
+    runner = JobRunner(engine)
+    finish = runner.finish
+    failures = []
+
+    def flaky_finish(job_id, **values):
+        if not failures:
+            failures.append(job_id)
+            raise RuntimeError("connection dropped")
+        finish(job_id, **values)
+
+    monkeypatch.setattr(runner, 'finish', flaky_finish)
+    first = enqueue(engine, 'ok', {})
+    runner.ensure_started()
+    try:
+        second = enqueue(engine, 'ok', {})
+        runner.notify()
+        deadline = time.monotonic() + 5
+        while get_job(engine, second['id'])['status'] != SUCCEEDED and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert failures == [first['id']]
+        assert get_job(engine, second['id'])['status'] == SUCCEEDED
+        assert all(thread.is_alive() for thread in runner.threads)
+    finally:
+        runner.stop()
@@ -0,0 +1,66 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import text
+from werkzeug.datastructures import MultiDict
+
+from models import leads
+from pagination import SORTABLE_COLUMNS, build_list_query, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def mixed_leads(add_leads):
+    """Leads with repeated and NULL values in the nullable sort columns"""
+    follow_ups = [None, date(2026, 2, 1), date(2026, 2, 1), None, date(2026, 1, 15), None, date(2026, 3, 1)]
+    created = [datetime(2026, 1, 1), None, datetime(2026, 1, 1), datetime(2026, 1, 2), None,
+               datetime(2025, 12, 31), datetime(2026, 1, 1)]
+    return add_leads(*({'leadName': 'abcab'[i % 5], 'companyName': 'xy'[i % 2],
+                        'nextFollowUpDate': follow_up, 'createdAt': created_at}
+                       for i, (follow_up, created_at) in enumerate(zip(follow_ups, created * 3))))
+
+
+def expected_order(rows, sort):
+    """Non-NULL values by (value, id), then NULLs by id, both in the sort direction"""
+    name, descending = sort.lstrip('-'), sort.startswith('-')
+    values = sorted((row for row in rows if row[name] is not None),
+                    key=lambda row: (row[name], row['id']), reverse=descending)
+    nulls = sorted((row['id'] for row in rows if row[name] is None), reverse=descending)
+    return [row['id'] for row in values] + nulls
+
+
+def read_all_pages(client, sort, limit):
+    ids, after = [], None
+    while True:
+        query = {'sort': sort, 'limit': limit}
+        if after:
+            query['after'] = after
+        response = client.get('/api/leads', query_string=query)
+        assert response.status_code == 200
+        ids += [row['id'] for row in response.get_json()]
+        after = response.headers.get('X-Next-Cursor')
+        if not after:
+            return ids
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 100])
+@pytest.mark.parametrize('sort', [prefix + name for name in SORTABLE_COLUMNS['leads'] for prefix in ('', '-')])
+def test_cursor_round_trip_across_null_sort_values(client, mixed_leads, sort, limit):
+    assert read_all_pages(client, sort, limit) == expected_order(mixed_leads, sort)
+
+
+@pytest.mark.parametrize('value', [None, 'Acme', date(2026, 2, 1), datetime(2026, 1, 1, 9, 30)])
+def test_cursor_decodes_to_the_column_type(value):
+    column = {str: leads.c.companyName, date: leads.c.nextFollowUpDate,
+              datetime: leads.c.createdAt}.get(type(value), leads.c.nextFollowUpDate)
+    assert decode_cursor(encode_cursor(value, 'id-1'), column) == (value, 'id-1')
+
+
+@pytest.mark.parametrize('sort', ['leadName', '-createdAt', 'nextFollowUpDate'])
+def test_keyset_pages_are_index_range_scans(engine, client, mixed_leads, sort):
+    after = client.get('/api/leads', query_string={'sort': sort, 'limit': 2}).headers['X-Next-Cursor']
+    query, _, _ = build_list_query(leads, MultiDict({'sort': sort, 'limit': '2', 'after': after}))
+    sql = str(query.compile(engine, compile_kwargs={'literal_binds': True}))
+    with engine.connect() as connection:
+        plan = [row[-1] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+    assert not [step for step in plan if step.startswith('SCAN leads')]
+    assert [step for step in plan if step.startswith('SEARCH leads USING INDEX')]
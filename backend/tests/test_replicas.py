@@ -0,0 +1,117 @@
+import time
+
+import pytest
+from sqlalchemy import insert
+
+from app import create_app
+from database import create_database_engine
+from migrations import run_migrations
+from models import leads
+from replicas import TOKEN_HEADER, ReplicaRouter, format_token, parse_token
+
+from conftest import lead_values
+
+LEAD_FIELDS = ('leadName', 'leadSource', 'contactPhone', 'contactEmail', 'companyName', 'leadStatus',
+               'assignedSalesRep')
+
+
+@pytest.fixture
+def replica(tmp_path):
+    """A second SQLite file standing in for a replica; nothing copies writes to it"""
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def replicated_app(engine, database_url, replica):
+    app = create_app({'DATABASE_URL': database_url, 'DATABASE_REPLICA_URLS': [str(replica.url)],
+                      'JOB_RUNNER': 'process', 'FOLLOWUP_SWEEPER': 'off'})
+    yield app
+    services = app.extensions['fieldsense']
+    services.replica_router.stop()
+    for replica_engine in services.replica_router.replicas:
+        replica_engine.engine.dispose()
+    services.engine.dispose()
+
+
+def add_lead(engine, **values):
+    row = lead_values(**values)
+    with engine.begin() as connection:
+        connection.execute(insert(leads), [row])
+    return row
+
+
+def names(response):
+    assert response.status_code == 200
+    return [lead['leadName'] for lead in response.get_json()]
+
+
+def test_reads_go_to_the_replica(replicated_app, engine, replica):
+    add_lead(engine, leadName='On the primary')
+    on_replica = add_lead(replica, leadName='On the replica')
+    client = replicated_app.test_client()
+
+    assert names(client.get('/api/leads')) == ['On the replica']
+    assert client.get(f"/api/leads/{on_replica['id']}").status_code == 200
+    reads = client.get('/health').get_json()['replication']['reads']
+    assert reads == {'primary': 0, 'replica': 2}
+
+
+def test_a_writing_client_reads_its_own_writes_from_the_primary(replicated_app, replica):
+    add_lead(replica, leadName='On the replica')
+    writer = replicated_app.test_client()
+    created = writer.post('/api/leads', json={name: lead_values()[name] for name in LEAD_FIELDS})
+    token = created.headers[TOKEN_HEADER]
+    expires_at, lsn = parse_token(token)
+    assert expires_at > time.time() and lsn is None
+
+    # The read_after cookie pins the writer; the header does the same for any client
+    assert names(writer.get('/api/leads', query_string={'sort': 'leadName'})) == ['Ada']
+    other = replicated_app.test_client()
+    assert names(other.get('/api/leads', query_string={'sort': '-leadName'})) == ['On the replica']
+    assert names(other.get('/api/leads', query_string={'limit': 10},
+                           headers={TOKEN_HEADER: token})) == ['Ada']
+
+
+def test_replica_reads_are_not_cached_right_after_a_write(replicated_app, replica):
+    add_lead(replica, leadName='Stale')
+    writer = replicated_app.test_client()
+    writer.post('/api/leads', json={name: lead_values()[name] for name in LEAD_FIELDS})
+
+    other = replicated_app.test_client()
+    assert names(other.get('/api/leads')) == ['Stale']
+    add_lead(replica, leadName='Replayed')
+    # The stale replica page was not cached, so the next read sees the replica catch up
+    assert sorted(names(other.get('/api/leads'))) == ['Replayed', 'Stale']
+
+
+def test_router_rotates_over_healthy_replicas(engine, replica, tmp_path):
+    second = create_database_engine(f"sqlite:///{tmp_path / 'second.db'}")
+    router = ReplicaRouter(engine, [replica, second])
+    # Keep the checker thread out of the test
+    router.ensure_started = lambda: None
+
+    chosen = [router.choose().engine for _ in range(4)]
+    assert chosen == [replica, second, replica, second]
+    # A live token without a WAL position pins to the primary; expired or malformed ones do not
+    assert router.choose(format_token(time.time() + 5)) is None
+    assert router.choose(format_token(time.time() - 1)) is not None
+    assert router.choose('garbage') is not None
+
+    router.replicas[1].healthy = False
+    assert {router.choose().engine for _ in range(3)} == {replica}
+    router.replicas[0].healthy = False
+    assert router.choose() is None
+    second.dispose()
+
+
+def test_failed_health_checks_send_reads_to_the_primary(engine, tmp_path):
+    broken = create_database_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    router = ReplicaRouter(engine, [broken])
+    router.replicas[0].check()
+    assert router.status()['replicas']['replica0']['healthy'] is False
+    router.ensure_started = lambda: None
+    assert router.choose() is None
+    broken.dispose()
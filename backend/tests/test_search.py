@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+from sqlalchemy import insert, select
+
+import search
+from models import leads, meetings
+from search import MAX_SEARCH_OFFSET, LocalSearch
+
+from conftest import lead_values
+
+
+def search_ids(client, **query):
+    response = client.get('/api/search', query_string=query)
+    assert response.status_code == 200
+    return [(hit['type'], hit['id']) for hit in response.get_json()['results']]
+
+
+def test_exact_prefix_and_fuzzy_matches_rank_in_that_order(client, add_leads):
+    exact, prefix, fuzzy, _ = add_leads({'companyName': 'Globex'}, {'companyName': 'Globexcorp'},
+                                        {'companyName': 'Glbex'}, {'companyName': 'Initech'})
+    assert search_ids(client, q='globex', type='leads') == [
+        ('leads', exact['id']), ('leads', prefix['id']), ('leads', fuzzy['id'])]
+
+
+def test_phone_numbers_match_on_their_digits(client, add_leads):
+    lead, _ = add_leads({'contactPhone': '(555) 010-2233'}, {'contactPhone': '555-9999'})
+    assert search_ids(client, q='5550102233') == [('leads', lead['id'])]
+
+
+def test_all_types_are_searched_by_default(client, add_leads, add_meetings):
+    lead, = add_leads({'companyName': 'Umbrella'})
+    meeting, = add_meetings({'meetingTitle': 'Umbrella renewal'})
+    assert sorted(search_ids(client, q='umbrella')) == sorted(
+        [('leads', lead['id']), ('meetings', meeting['id'])])
+    assert search_ids(client, q='umbrella', type='meetings') == [('meetings', meeting['id'])]
+
+
+def test_limit_and_offset_page_through_the_ranking(client, add_leads):
+    add_leads(*({'companyName': 'Hooli'} for _ in range(5)))
+    everything = search_ids(client, q='hooli')
+    assert len(everything) == 5
+    assert search_ids(client, q='hooli', limit=2, offset=2) == everything[2:4]
+
+
+@pytest.mark.parametrize('query', [{}, {'q': ' '}, {'q': 'x', 'type': 'users'}, {'q': 'x', 'limit': 0},
+                                   {'q': 'x', 'offset': -1}, {'q': 'x', 'limit': 'ten'},
+                                   {'q': 'x', 'offset': MAX_SEARCH_OFFSET + 1}])
+def test_invalid_arguments_are_rejected(client, query):
+    assert client.get('/api/search', query_string=query).status_code == 400
+
+
+def test_writes_through_the_api_are_searchable_at_once(client, add_leads):
+    add_leads({'companyName': 'Vandelay'})
+    assert len(search_ids(client, q='vandelay')) == 1
+
+    created = client.post('/api/leads', json={
+        key: value for key, value in lead_values(companyName='Vandelay Industries').items()
+        if key not in ('id', 'createdAt', 'updatedAt', 'lastContactDate', 'nextFollowUpDate')})
+    assert created.status_code == 201
+    lead_id = created.get_json()['id']
+    assert ('leads', lead_id) in search_ids(client, q='vandelay')
+
+    assert client.delete(f'/api/leads/{lead_id}').status_code == 200
+    assert ('leads', lead_id) not in search_ids(client, q='vandelay')
+
+
+def test_stale_index_is_rebuilt_off_lock_and_keeps_concurrent_writes(engine, add_leads, monkeypatch):
+    old, = add_leads({'companyName': 'Acme'})
+    backend = LocalSearch(engine, {'leads': leads, 'meetings': meetings})
+    assert [row.id for row, _ in backend.search('leads', 'acme', 10)] == [old['id']]
+
+    monkeypatch.setattr(search, 'SEARCH_INDEX_TTL', 0)
+    started, release = threading.Event(), threading.Event()
+    build_index = backend.build_index
+
+    def slow_build(table_name):
+        started.set()
+        release.wait(5)
+        return build_index(table_name)
+
+    monkeypatch.setattr(backend, 'build_index', slow_build)
+    rebuild = threading.Thread(target=backend.index_for, args=('leads',))
+    rebuild.start()
+    assert started.wait(5)
+
+    # Searches and writes go on against the previous index during the build
+    assert [row.id for row, _ in backend.search('leads', 'acme', 10)] == [old['id']]
+    written = lead_values(companyName='Acme Rockets')
+    with engine.begin() as connection:
+        connection.execute(insert(leads), [written])
+        row = connection.execute(select(leads).where(leads.c.id == written['id'])).one()
+    backend.record_write('leads', row)
+    backend.record_delete('leads', old['id'])
+
+    release.set()
+    rebuild.join(5)
+    assert not rebuild.is_alive()
+    # The row deleted during the build stays out of the swapped-in index
+    assert set(backend.indexes['leads'].documents) == {written['id']}
@@ -0,0 +1,127 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import delete, insert, select, update
+
+import migrations
+from archive import archive_meetings, delete_archived, write_archive
+from database import create_database_engine
+from models import leads, meetings
+from stats import expense_cents, read_counts, read_expenses
+
+from conftest import meeting_values
+
+
+def rollups(engine, metric):
+    with engine.connect() as connection:
+        return read_counts(connection, metric)
+
+
+def expenses(engine):
+    with engine.connect() as connection:
+        return read_expenses(connection)
+
+
+def test_lead_rollups_follow_insert_update_and_delete(engine, add_leads):
+    first, second, _ = add_leads({'leadStatus': 'new'}, {'leadStatus': 'new'},
+                                 {'leadStatus': 'won', 'assignedSalesRep': 'Raj'})
+    assert rollups(engine, 'leads.status') == {'new': 2, 'won': 1}
+    assert rollups(engine, 'leads.rep') == {'Jane': 2, 'Raj': 1}
+
+    with engine.begin() as connection:
+        connection.execute(update(leads).where(leads.c.id == first['id'])
+                           .values(leadStatus='won', assignedSalesRep='Raj'))
+    assert rollups(engine, 'leads.status') == {'new': 1, 'won': 2}
+    assert rollups(engine, 'leads.rep') == {'Jane': 1, 'Raj': 2}
+
+    with engine.begin() as connection:
+        connection.execute(delete(leads).where(leads.c.id == second['id']))
+    assert rollups(engine, 'leads.status') == {'won': 2}
+    assert rollups(engine, 'leads.source') == {'web': 2}
+
+
+def test_meeting_rollups_count_unspecified_values(engine, add_meetings):
+    first, second = add_meetings({'travelMode': 'Car'}, {'travelMode': None})
+    assert rollups(engine, 'meetings.date') == {'2026-03-01': 2}
+    assert rollups(engine, 'meetings.travelMode') == {'Car': 1, 'unspecified': 1}
+
+    with engine.begin() as connection:
+        connection.execute(update(meetings).where(meetings.c.id == second['id'])
+                           .values(meetingDate=date(2026, 3, 2), travelMode='Train'))
+        connection.execute(delete(meetings).where(meetings.c.id == first['id']))
+    assert rollups(engine, 'meetings.date') == {'2026-03-02': 1}
+    assert rollups(engine, 'meetings.travelMode') == {'Train': 1}
+
+
+def test_expense_totals_follow_insert_update_and_delete(engine, add_meetings):
+    first, second, third, _ = add_meetings(
+        {'travelMode': 'Car', 'expenses': '120'}, {'travelMode': 'Car', 'expenses': ' 30.55 '},
+        {'travelMode': None, 'expenses': '12.5'}, {'travelMode': 'Car', 'expenses': 'Meals'})
+    assert expenses(engine) == {'Car': {'meetings': 2, 'total': 150.55},
+                                'unspecified': {'meetings': 1, 'total': 12.5}}
+
+    with engine.begin() as connection:
+        connection.execute(update(meetings).where(meetings.c.id == first['id']).values(travelMode='Train'))
+        connection.execute(update(meetings).where(meetings.c.id == second['id']).values(expenses='40'))
+        connection.execute(update(meetings).where(meetings.c.id == third['id']).values(expenses='Other'))
+    assert expenses(engine) == {'Car': {'meetings': 1, 'total': 40.0},
+                                'Train': {'meetings': 1, 'total': 120.0}}
+
+    with engine.begin() as connection:
+        connection.execute(delete(meetings).where(meetings.c.id == first['id']))
+        connection.execute(update(meetings).where(meetings.c.id == third['id']).values(expenses='7'))
+    assert expenses(engine) == {'Car': {'meetings': 1, 'total': 40.0},
+                                'unspecified': {'meetings': 1, 'total': 7.0}}
+
+
+@pytest.mark.parametrize('value', ['12abc', '1e3', '-5', '1.2.3', '.', '', '1234567890123456', 'Meals'])
+def test_non_numeric_expenses_are_left_out_without_failing_the_write(engine, add_meetings, value):
+    add_meetings({'expenses': value})
+    assert expense_cents(value) is None
+    assert expenses(engine) == {}
+    assert rollups(engine, 'meetings.travelMode') == {'Car': 1}
+
+
+@pytest.mark.parametrize('value, cents', [('0', 0), ('7', 700), ('.5', 50), ('5.', 500), (' 19.99 ', 1999)])
+def test_expense_cents_matches_the_triggers(engine, add_meetings, value, cents):
+    add_meetings({'expenses': value})
+    assert expense_cents(value) == cents
+    assert expenses(engine) == {'Car': {'meetings': 1, 'total': cents / 100}}
+
+
+def test_archived_meetings_keep_their_expenses(engine, add_meetings):
+    old, _ = add_meetings({'meetingDate': date(2020, 1, 1), 'expenses': '25'}, {'expenses': '5'})
+    assert archive_meetings(engine, date(2021, 1, 1)) == 1
+    assert expenses(engine) == {'Car': {'meetings': 2, 'total': 30.0}}
+
+    with engine.begin() as connection:
+        assert delete_archived(connection, [old['id']]) == {old['id']}
+    assert expenses(engine) == {'Car': {'meetings': 1, 'total': 5.0}}
+
+
+def test_expense_totals_are_backfilled_from_meetings_and_the_archive(database_url, monkeypatch):
+    engine = create_database_engine(database_url)
+    every_migration = list(migrations.MIGRATIONS)
+    monkeypatch.setattr(migrations, 'MIGRATIONS', [m for m in every_migration if m.version < 14])
+    migrations.run_migrations(engine)
+    archived = meeting_values(expenses='25')
+    with engine.begin() as connection:
+        connection.execute(insert(meetings), [archived, meeting_values(expenses='5'),
+                                              meeting_values(travelMode='Train', expenses='Meals')])
+        # Archived as archive_meetings did before the expenses totals existed
+        write_archive(connection, connection.execute(
+            select(meetings).where(meetings.c.id == archived['id'])).all())
+        connection.execute(delete(meetings).where(meetings.c.id == archived['id']))
+
+    monkeypatch.setattr(migrations, 'MIGRATIONS', every_migration)
+    migrations.run_migrations(engine)
+    assert expenses(engine) == {'Car': {'meetings': 2, 'total': 30.0}}
+    engine.dispose()
+
+
+def test_stats_endpoint_reports_expenses_by_travel_mode(client, add_meetings):
+    add_meetings({'expenses': '10'}, {'travelMode': 'Flight', 'expenses': '250.5'})
+    body = client.get('/api/stats').get_json()
+    assert body['meetings']['byTravelMode'] == {'Car': 1, 'Flight': 1}
+    assert body['meetings']['expensesByTravelMode'] == {'Car': {'meetings': 1, 'total': 10.0},
+                                                        'Flight': {'meetings': 1, 'total': 250.5}}
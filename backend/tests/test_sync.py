@@ -0,0 +1,109 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import delete, update
+
+from archive import archive_meetings
+from events import SERIALIZERS, TABLES
+from models import leads
+from sync import SYNC_PAGE_SIZE, SyncError, decode_token, encode_token, fetch_changes
+
+
+def change_log(engine, token=None):
+    """The changes after token (the start of the log by default), and the next token"""
+    state = decode_token(token) if token else {"after": 0, "from": None, "next": None}
+    changes, token, _ = fetch_changes(engine, TABLES, SERIALIZERS, state, SYNC_PAGE_SIZE)
+    return [(change['type'], change['id'], change['op']) for change in changes], token
+
+
+def test_change_log_follows_insert_update_and_delete(engine, add_leads):
+    first, second = add_leads({}, {})
+    changes, token = change_log(engine)
+    assert changes == [('leads', first['id'], 'upsert'), ('leads', second['id'], 'upsert')]
+    assert change_log(engine, token)[0] == []
+
+    with engine.begin() as connection:
+        connection.execute(update(leads).where(leads.c.id == first['id']).values(leadName='Grace'))
+    changes, token = change_log(engine, token)
+    assert changes == [('leads', first['id'], 'upsert')]
+
+    with engine.begin() as connection:
+        connection.execute(delete(leads).where(leads.c.id == second['id']))
+    changes, _ = change_log(engine, token)
+    assert changes == [('leads', second['id'], 'delete')]
+
+    # The log keeps only the latest operation per record
+    changes, _ = change_log(engine)
+    assert changes == [('leads', first['id'], 'upsert'), ('leads', second['id'], 'delete')]
+
+
+@pytest.mark.parametrize('op', ['insert', 'update', 'delete'])
+def test_change_log_records_carry_the_current_row(engine, add_leads, op):
+    lead, = add_leads({'leadName': 'Ada'})
+    with engine.begin() as connection:
+        if op == 'update':
+            connection.execute(update(leads).where(leads.c.id == lead['id']).values(leadName='Grace'))
+        elif op == 'delete':
+            connection.execute(delete(leads).where(leads.c.id == lead['id']))
+    state = {"after": 0, "from": None, "next": None}
+    change, = fetch_changes(engine, TABLES, SERIALIZERS, state, SYNC_PAGE_SIZE)[0]
+    if op == 'delete':
+        assert change['op'] == 'delete' and 'record' not in change
+    else:
+        assert change['record']['leadName'] == ('Grace' if op == 'update' else 'Ada')
+
+
+def sync(client, **query):
+    response = client.get('/api/sync', query_string=query)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_sync_pages_are_chained_by_their_tokens(client, add_leads, add_meetings):
+    written = [lead['id'] for lead in add_leads({}, {}, {})] + [m['id'] for m in add_meetings({}, {})]
+    seen, token, pages = [], None, 0
+    while True:
+        body = sync(client, limit=2, **({'since': token} if token else {}))
+        seen += [change['id'] for change in body['changes']]
+        token, pages = body['token'], pages + 1
+        if not body['more']:
+            break
+    assert seen == written
+    assert pages == 3
+    assert sync(client, since=token) == {"changes": [], "token": token, "more": False}
+
+
+def test_sync_token_returns_only_later_writes(client, add_leads):
+    lead, = add_leads({})
+    token = sync(client)['token']
+    data = {name: lead[name] for name in ('leadName', 'leadSource', 'contactPhone', 'contactEmail',
+                                          'companyName', 'leadStatus', 'assignedSalesRep')}
+    client.put(f"/api/leads/{lead['id']}", json={**data, 'leadStatus': 'won'})
+    created = client.post('/api/leads', json=data).get_json()
+
+    changes = sync(client, since=token)['changes']
+    assert [(change['id'], change['op']) for change in changes] == [
+        (lead['id'], 'upsert'), (created['id'], 'upsert')]
+    assert changes[0]['record']['leadStatus'] == 'won'
+
+
+def test_archived_meetings_sync_as_deletes(client, engine, add_meetings):
+    old, _ = add_meetings({'meetingDate': date(2020, 1, 1)}, {})
+    token = sync(client)['token']
+    archive_meetings(engine, date(2021, 1, 1))
+    changes = sync(client, since=token)['changes']
+    assert [(change['id'], change['op']) for change in changes] == [(old['id'], 'delete')]
+
+
+@pytest.mark.parametrize('query', [{'since': 'not-a-token'}, {'since': encode_token({'next': 1})},
+                                   {'since': encode_token({'after': 1, 'from': 'DROP TABLE'})},
+                                   {'limit': 0}, {'limit': 'all'}])
+def test_invalid_sync_arguments_are_rejected(client, query):
+    assert client.get('/api/sync', query_string=query).status_code == 400
+
+
+def test_tokens_round_trip():
+    state = {"after": 7, "from": '10:12:10,11', "next": None}
+    assert decode_token(encode_token(state)) == state
+    with pytest.raises(SyncError):
+        decode_token(encode_token({"after": 'seven'}))
@@ -0,0 +1,23 @@
+"""Required-field validation for lead and meeting payloads"""
+
+def validate_lead(lead):
+    """Validate lead data"""
+    required_fields = ['leadName', 'leadSource', 'contactPhone', 'contactEmail', 
+                      'companyName', 'leadStatus', 'assignedSalesRep']
+    
+    for field in required_fields:
+        if field not in lead or not lead[field]:
+            return False, f"Field '{field}' is required"
+    
+    return True, ""
+
+def validate_meeting(meeting):
+    """Validate meeting data"""
+    required_fields = ['meetingTitle', 'meetingDate', 'meetingTime', 
+                      'participants', 'location']
+    
+    for field in required_fields:
+        if field not in meeting or not meeting[field]:
+            return False, f"Field '{field}' is required"
+    
+    return True, ""
@@ -0,0 +1,21 @@
+// Milliseconds between refetches when the server will not stream changes
+const POLL_INTERVAL_MS = 30000
+
+// Subscribe to GET /api/events. A server that cannot stream (gunicorn sync
+// workers, or a full feed) answers 503 and the browser closes the
+// EventSource for good; refresh is then called every POLL_INTERVAL_MS instead.
+export const subscribeToChanges = (onChange, refresh) => {
+  let poll = null
+  const events = new EventSource('http://localhost:5000/api/events')
+  events.addEventListener('change', (event) => onChange(JSON.parse(event.data)))
+  events.addEventListener('error', () => {
+    if (events.readyState === EventSource.CLOSED && !poll) {
+      refresh()
+      poll = setInterval(refresh, POLL_INTERVAL_MS)
+    }
+  })
+  return () => {
+    events.close()
+    clearInterval(poll)
+  }
+}
@@ -414,7 +414,8 @@ const CreateMeeting = () => {
     }
   }
 
-  // Use OpenStreetMap's Nominatim for geocoding (doesn't require API key)
+  // Reverse geocode through the backend, which caches results for all users
+  // and calls OpenStreetMap's Nominatim only on a miss
   const fetchAddressFromNominatim = async (location) => {
     try {
       setStatusMessage({
@@ -422,26 +423,15 @@ const CreateMeeting = () => {
         error: false
       })
       
-      const response = await fetch(
-        `https://nominatim.openstreetmap.org/reverse?format=json&lat=${location.lat}&lon=${location.lng}&zoom=18&addressdetails=1`,
-        {
-          headers: {
-            'Accept': 'application/json',
-            'User-Agent': 'FieldSense Meeting App' // Required by Nominatim's terms
-          }
-        }
-      );
-      
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
-      
-      const data = await response.json();
+      const response = await axios.get(`${import.meta.env.VITE_API_URL}/api/geocode`, {
+        params: { lat: location.lat, lng: location.lng }
+      });
+      const data = response.data;
       
-      if (data && data.display_name) {
+      if (data && data.address) {
         setFormData(prev => ({
           ...prev,
-          location: data.display_name
+          location: data.address
         }));
         setStatusMessage({
           text: "Address found using OpenStreetMap!",
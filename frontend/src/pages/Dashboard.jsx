@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react'
 import { Link } from 'react-router-dom'
 import styled from 'styled-components'
 import axios from 'axios'
+import { subscribeToChanges } from '../events'
 
 const DashboardContainer = styled.div`
   padding: 20px;
@@ -76,17 +77,21 @@ const Dashboard = () => {
   const [stats, setStats] = useState({
     leads: 0,
     meetings: 0,
+    activeLeads: 0,
+    upcomingMeetings: 0,
   })
 
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const leadsResponse = await axios.get('http://localhost:5000/api/leads')
-        const meetingsResponse = await axios.get('http://localhost:5000/api/meetings')
+        const response = await axios.get('http://localhost:5000/api/stats')
+        const { leads, meetings } = response.data
         
         setStats({
-          leads: leadsResponse.data.length,
-          meetings: meetingsResponse.data.length,
+          leads: leads.total,
+          meetings: meetings.total,
+          activeLeads: leads.byStatus.active || 0,
+          upcomingMeetings: meetings.upcoming,
         })
       } catch (error) {
         console.error('Error fetching dashboard data:', error)
@@ -94,6 +99,16 @@ const Dashboard = () => {
     }
     
     fetchData()
+
+    // The rollups are cheap to read; refresh them at most once a second while changes arrive
+    let pending = null
+    const unsubscribe = subscribeToChanges(() => {
+      if (!pending) pending = setTimeout(() => { pending = null; fetchData() }, 1000)
+    }, fetchData)
+    return () => {
+      unsubscribe()
+      clearTimeout(pending)
+    }
   }, [])
 
   return (
@@ -118,11 +133,11 @@ const Dashboard = () => {
         </StatCard>
         <StatCard>
           <StatTitle>Active Leads</StatTitle>
-          <StatValue>0</StatValue>
+          <StatValue>{stats.activeLeads}</StatValue>
         </StatCard>
         <StatCard>
           <StatTitle>Upcoming Meetings</StatTitle>
-          <StatValue>0</StatValue>
+          <StatValue>{stats.upcomingMeetings}</StatValue>
         </StatCard>
       </StatsGrid>
     </DashboardContainer>
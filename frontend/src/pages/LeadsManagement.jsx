@@ -1,7 +1,8 @@
 import { useState, useEffect } from 'react'
 import { Link } from 'react-router-dom'
 import styled from 'styled-components'
-import axios from 'axios'
+import { subscribeToChanges } from '../events'
+import { useCursorPages } from '../pagination'
 
 const PageContainer = styled.div`
   padding: 20px;
@@ -134,30 +135,41 @@ const ViewIcon = styled.div`
   background-color: #f0f0f0;
 `
 
+const Filters = styled.div`
+  display: flex;
+  gap: 10px;
+  margin-right: auto;
+`
+
+const FilterInput = styled.input`
+  padding: 8px;
+  border: 1px solid #ddd;
+  border-radius: 4px;
+`
+
+const FilterSelect = styled.select`
+  padding: 8px;
+  border: 1px solid #ddd;
+  border-radius: 4px;
+`
+
 const LeadsManagement = () => {
-  const [leads, setLeads] = useState([])
   const [activeTab, setActiveTab] = useState('leads')
-  const [currentPage, setCurrentPage] = useState(1)
-  const [rowsPerPage] = useState(10)
-
-  useEffect(() => {
-    const fetchLeads = async () => {
-      try {
-        const response = await axios.get('http://localhost:5000/api/leads')
-        setLeads(response.data)
-      } catch (error) {
-        console.error('Error fetching leads:', error)
-      }
-    }
-    
-    fetchLeads()
-  }, [])
-
-  // Calculate pagination
-  const indexOfLastLead = currentPage * rowsPerPage
-  const indexOfFirstLead = indexOfLastLead - rowsPerPage
-  const currentLeads = leads.slice(indexOfFirstLead, indexOfLastLead)
-  const totalPages = Math.ceil(leads.length / rowsPerPage)
+  const [rowsPerPage, setRowsPerPage] = useState(10)
+  const [filters, setFilters] = useState({ leadStatus: '', assignedSalesRep: '' })
+  const pages = useCursorPages('http://localhost:5000/api/leads', filters, rowsPerPage)
+  const { reload } = pages
+
+  // A changed lead may enter or leave the page on screen under the current
+  // filters and sort, so any change refetches that one page
+  useEffect(() => subscribeToChanges((change) => {
+    if (change.type === 'leads') reload()
+  }, reload), [])
+
+  const handleFilterChange = (e) => {
+    const { name, value } = e.target
+    setFilters((current) => ({ ...current, [name]: value }))
+  }
 
   return (
     <PageContainer>
@@ -167,6 +179,21 @@ const LeadsManagement = () => {
       </TabsContainer>
       
       <Header>
+        <Filters>
+          <FilterSelect name="leadStatus" value={filters.leadStatus} onChange={handleFilterChange}>
+            <option value="">All statuses</option>
+            <option value="active">Active</option>
+            <option value="onHold">On Hold</option>
+            <option value="lost">Lost</option>
+            <option value="converted">Converted</option>
+          </FilterSelect>
+          <FilterInput
+            name="assignedSalesRep"
+            placeholder="Sales rep"
+            value={filters.assignedSalesRep}
+            onChange={handleFilterChange}
+          />
+        </Filters>
         <CreateButton to="/leads/create">
           <span style={{ marginRight: '8px' }}>+</span> Create
         </CreateButton>
@@ -188,7 +215,7 @@ const LeadsManagement = () => {
           </tr>
         </TableHead>
         <tbody>
-          {currentLeads.map((lead) => (
+          {pages.rows.map((lead) => (
             <Tr key={lead.id}>
               <Td>
                 <ViewIcon>
@@ -209,7 +236,7 @@ const LeadsManagement = () => {
               <Td>{lead.nextFollowUpDate}</Td>
             </Tr>
           ))}
-          {currentLeads.length === 0 && (
+          {pages.rows.length === 0 && (
             <Tr>
               <Td colSpan="10" style={{ textAlign: 'center' }}>No leads found</Td>
             </Tr>
@@ -220,7 +247,11 @@ const LeadsManagement = () => {
       <Pagination>
         <PageInfo>
           Rows per page: 
-          <select style={{ marginLeft: '8px', padding: '5px' }}>
+          <select
+            style={{ marginLeft: '8px', padding: '5px' }}
+            value={rowsPerPage}
+            onChange={(e) => setRowsPerPage(Number(e.target.value))}
+          >
             <option>10</option>
             <option>25</option>
             <option>50</option>
@@ -228,22 +259,19 @@ const LeadsManagement = () => {
         </PageInfo>
         
         <PageInfo>
-          {indexOfFirstLead + 1}-{Math.min(indexOfLastLead, leads.length)} of {leads.length}
+          {pages.rows.length > 0 ? `${pages.offset + 1}-${pages.offset + pages.rows.length}` : '0'}
         </PageInfo>
         
         <PageButtons>
-          <PageButton onClick={() => setCurrentPage(1)} disabled={currentPage === 1}>
+          <PageButton onClick={pages.first} disabled={!pages.hasPrevious}>
             &lt;&lt;
           </PageButton>
-          <PageButton onClick={() => setCurrentPage(prev => Math.max(prev - 1, 1))} disabled={currentPage === 1}>
+          <PageButton onClick={pages.previous} disabled={!pages.hasPrevious}>
             &lt;
           </PageButton>
-          <PageButton onClick={() => setCurrentPage(prev => Math.min(prev + 1, totalPages))} disabled={currentPage === totalPages}>
+          <PageButton onClick={pages.next} disabled={!pages.hasNext}>
             &gt;
           </PageButton>
-          <PageButton onClick={() => setCurrentPage(totalPages)} disabled={currentPage === totalPages}>
-            &gt;&gt;
-          </PageButton>
         </PageButtons>
       </Pagination>
     </PageContainer>
@@ -1,8 +1,8 @@
-import { useState, useEffect, useContext } from 'react'
+import { useState, useContext } from 'react'
 import { Link, useNavigate } from 'react-router-dom'
 import styled from 'styled-components'
-import axios from 'axios'
 import { ThemeContext } from '../components/Sidebar'
+import { useCursorPages } from '../pagination'
 
 const PageContainer = styled.div`
   padding: 20px;
@@ -176,32 +176,53 @@ const ViewIcon = styled.div`
   }
 `
 
+const Filters = styled.div`
+  display: flex;
+  gap: 10px;
+  margin-right: auto;
+`
+
+const FilterInput = styled.input`
+  padding: 6px 8px;
+  border: 1px solid ${props => props.isDarkMode ? '#444' : '#ddd'};
+  background-color: ${props => props.isDarkMode ? '#2d2d2d' : 'white'};
+  color: ${props => props.isDarkMode ? '#f5f5f5' : 'inherit'};
+  border-radius: 4px;
+  font-size: 13px;
+`
+
+const FilterSelect = styled.select`
+  padding: 6px 8px;
+  border: 1px solid ${props => props.isDarkMode ? '#444' : '#ddd'};
+  background-color: ${props => props.isDarkMode ? '#2d2d2d' : 'white'};
+  color: ${props => props.isDarkMode ? '#f5f5f5' : 'inherit'};
+  border-radius: 4px;
+  font-size: 13px;
+`
+
+// Columns the API can sort by (SORTABLE_COLUMNS in backend/pagination.py)
+const SORTABLE = {
+  leads: ['leadName', 'companyName', 'nextFollowUpDate'],
+  meetings: ['meetingTitle', 'meetingDate'],
+}
+
+const NO_FILTERS = {
+  leads: { leadStatus: '', assignedSalesRep: '' },
+  meetings: { meetingDateFrom: '', meetingDateTo: '', participants: '', travelMode: '' },
+}
+
 const Management = () => {
   const { isDarkMode } = useContext(ThemeContext);
   const navigate = useNavigate();
   const [activeTab, setActiveTab] = useState('meetings')
-  const [leads, setLeads] = useState([])
-  const [meetings, setMeetings] = useState([])
-  const [currentPage, setCurrentPage] = useState(1)
-  const [rowsPerPage] = useState(10)
+  const [rowsPerPage, setRowsPerPage] = useState(10)
   const [sortField, setSortField] = useState('')
   const [sortDirection, setSortDirection] = useState('asc')
+  const [filters, setFilters] = useState(NO_FILTERS.meetings)
 
-  useEffect(() => {
-    const fetchData = async () => {
-      try {
-        const leadsResponse = await axios.get(`${import.meta.env.VITE_API_URL}/api/leads`)
-        const meetingsResponse = await axios.get(`${import.meta.env.VITE_API_URL}/api/meetings`)
-        
-        setLeads(leadsResponse.data)
-        setMeetings(meetingsResponse.data)
-      } catch (error) {
-        console.error('Error fetching data:', error)
-      }
-    }
-    
-    fetchData()
-  }, [])
+  // The API filters and sorts; without a sort field it uses its default order
+  const sort = sortField ? `${sortDirection === 'desc' ? '-' : ''}${sortField}` : ''
+  const pages = useCursorPages(`${import.meta.env.VITE_API_URL}/api/${activeTab}`, { ...filters, sort }, rowsPerPage)
 
   const handleSort = (field) => {
     // If clicking the same field, toggle direction
@@ -214,65 +235,14 @@ const Management = () => {
     }
   }
 
-  const sortData = (data) => {
-    if (!sortField) return data;
-
-    return [...data].sort((a, b) => {
-      let aValue = a[sortField];
-      let bValue = b[sortField];
-
-      // Handle string comparisons (case-insensitive)
-      if (typeof aValue === 'string' && typeof bValue === 'string') {
-        aValue = aValue.toLowerCase();
-        bValue = bValue.toLowerCase();
-      }
-
-      // Handle date comparisons
-      if (sortField.includes('Date') || sortField.includes('Time')) {
-        // Convert to timestamps for comparison if they are valid dates
-        const aDate = new Date(aValue);
-        const bDate = new Date(bValue);
-        
-        if (!isNaN(aDate) && !isNaN(bDate)) {
-          aValue = aDate.getTime();
-          bValue = bDate.getTime();
-        }
-      }
-
-      // Null/undefined values should go last regardless of sort direction
-      if (aValue === null || aValue === undefined) return 1;
-      if (bValue === null || bValue === undefined) return -1;
-
-      // Perform the comparison
-      if (aValue < bValue) {
-        return sortDirection === 'asc' ? -1 : 1;
-      }
-      if (aValue > bValue) {
-        return sortDirection === 'asc' ? 1 : -1;
-      }
-      return 0;
-    });
+  const handleFilterChange = (e) => {
+    const { name, value } = e.target
+    setFilters((current) => ({ ...current, [name]: value }))
   }
 
-  // Calculate pagination for leads
-  const sortedLeads = sortData(leads);
-  const indexOfLastLead = currentPage * rowsPerPage
-  const indexOfFirstLead = indexOfLastLead - rowsPerPage
-  const currentLeads = sortedLeads.slice(indexOfFirstLead, indexOfLastLead)
-  const leadsPages = Math.ceil(leads.length / rowsPerPage)
-
-  // Calculate pagination for meetings
-  const sortedMeetings = sortData(meetings);
-  const indexOfLastMeeting = currentPage * rowsPerPage
-  const indexOfFirstMeeting = indexOfLastMeeting - rowsPerPage
-  const currentMeetings = sortedMeetings.slice(indexOfFirstMeeting, indexOfLastMeeting)
-  const meetingsPages = Math.ceil(meetings.length / rowsPerPage)
-
-  const totalPages = activeTab === 'leads' ? leadsPages : meetingsPages
-
   const handleTabChange = (tab) => {
     setActiveTab(tab)
-    setCurrentPage(1) // Reset to first page when changing tabs
+    setFilters(NO_FILTERS[tab])
     setSortField('') // Reset sorting when changing tabs
     setSortDirection('asc')
   }
@@ -301,14 +271,17 @@ const Management = () => {
     );
   };
 
-  const renderSortableHeader = (field, label) => (
-    <Th 
-      sortable={true} 
-      onClick={() => handleSort(field)}
-    >
-      {label} {renderSortIcon(field)}
-    </Th>
-  );
+  const renderSortableHeader = (field, label) => {
+    if (!SORTABLE[activeTab].includes(field)) return <Th>{label}</Th>
+    return (
+      <Th 
+        sortable={true} 
+        onClick={() => handleSort(field)}
+      >
+        {label} {renderSortIcon(field)}
+      </Th>
+    )
+  }
 
   const renderLeadsTable = () => (
     <Table isDarkMode={isDarkMode}>
@@ -327,7 +300,7 @@ const Management = () => {
         </tr>
       </TableHead>
       <tbody>
-        {currentLeads.map((lead) => (
+        {pages.rows.map((lead) => (
           <Tr key={lead.id} isDarkMode={isDarkMode}>
             <Td isDarkMode={isDarkMode}>
               <ViewIcon isDarkMode={isDarkMode} onClick={() => handleViewLead(lead.id)}>
@@ -348,7 +321,7 @@ const Management = () => {
             <Td isDarkMode={isDarkMode}>{lead.nextFollowUpDate}</Td>
           </Tr>
         ))}
-        {currentLeads.length === 0 && (
+        {pages.rows.length === 0 && (
           <Tr isDarkMode={isDarkMode}>
             <Td colSpan="10" style={{ textAlign: 'center' }} isDarkMode={isDarkMode}>No leads found</Td>
           </Tr>
@@ -372,7 +345,7 @@ const Management = () => {
         </tr>
       </TableHead>
       <tbody>
-        {currentMeetings.map((meeting) => (
+        {pages.rows.map((meeting) => (
           <Tr key={meeting.id} isDarkMode={isDarkMode}>
             <Td isDarkMode={isDarkMode}>
               <ViewIcon isDarkMode={isDarkMode} onClick={() => handleViewMeeting(meeting.id)}>
@@ -391,7 +364,7 @@ const Management = () => {
             <Td isDarkMode={isDarkMode}>{meeting.expenses}</Td>
           </Tr>
         ))}
-        {currentMeetings.length === 0 && (
+        {pages.rows.length === 0 && (
           <Tr isDarkMode={isDarkMode}>
             <Td colSpan="8" style={{ textAlign: 'center' }} isDarkMode={isDarkMode}>No meetings found</Td>
           </Tr>
@@ -400,43 +373,68 @@ const Management = () => {
     </Table>
   )
 
-  const renderPagination = () => {
-    const dataLength = activeTab === 'leads' ? leads.length : meetings.length
-    const firstIndex = activeTab === 'leads' ? indexOfFirstLead : indexOfFirstMeeting
-    const lastIndex = activeTab === 'leads' ? indexOfLastLead : indexOfLastMeeting
+  const renderFilters = () => (
+    <Filters>
+      {activeTab === 'leads' ? (
+        <>
+          <FilterSelect isDarkMode={isDarkMode} name="leadStatus" value={filters.leadStatus} onChange={handleFilterChange}>
+            <option value="">All statuses</option>
+            <option value="active">Active</option>
+            <option value="onHold">On Hold</option>
+            <option value="lost">Lost</option>
+            <option value="converted">Converted</option>
+          </FilterSelect>
+          <FilterInput isDarkMode={isDarkMode} name="assignedSalesRep" placeholder="Sales rep" value={filters.assignedSalesRep} onChange={handleFilterChange} />
+        </>
+      ) : (
+        <>
+          <FilterInput isDarkMode={isDarkMode} type="date" name="meetingDateFrom" title="From" value={filters.meetingDateFrom} onChange={handleFilterChange} />
+          <FilterInput isDarkMode={isDarkMode} type="date" name="meetingDateTo" title="To" value={filters.meetingDateTo} onChange={handleFilterChange} />
+          <FilterInput isDarkMode={isDarkMode} name="participants" placeholder="Participant" value={filters.participants} onChange={handleFilterChange} />
+          <FilterSelect isDarkMode={isDarkMode} name="travelMode" value={filters.travelMode} onChange={handleFilterChange}>
+            <option value="">All travel modes</option>
+            <option value="Car">Car</option>
+            <option value="Public Transit">Public Transit</option>
+            <option value="Flight">Flight</option>
+            <option value="Train">Train</option>
+          </FilterSelect>
+        </>
+      )}
+    </Filters>
+  )
 
-    return (
-      <Pagination>
-        <PageInfo isDarkMode={isDarkMode}>
-          Rows per page: 
-          <select style={{ marginLeft: '8px', padding: '4px', backgroundColor: isDarkMode ? '#2d2d2d' : 'white', color: isDarkMode ? '#f5f5f5' : 'inherit', border: `1px solid ${isDarkMode ? '#444' : '#ddd'}`, fontSize: '13px' }}>
-            <option>10</option>
-            <option>25</option>
-            <option>50</option>
-          </select>
-        </PageInfo>
-        
-        <PageInfo isDarkMode={isDarkMode}>
-          {dataLength > 0 ? `${firstIndex + 1}-${Math.min(lastIndex, dataLength)} of ${dataLength}` : '0 of 0'}
-        </PageInfo>
-        
-        <PageButtons>
-          <PageButton isDarkMode={isDarkMode} onClick={() => setCurrentPage(1)} disabled={currentPage === 1}>
-            &lt;&lt;
-          </PageButton>
-          <PageButton isDarkMode={isDarkMode} onClick={() => setCurrentPage(prev => Math.max(prev - 1, 1))} disabled={currentPage === 1}>
-            &lt;
-          </PageButton>
-          <PageButton isDarkMode={isDarkMode} onClick={() => setCurrentPage(prev => Math.min(prev + 1, totalPages))} disabled={currentPage === totalPages || totalPages === 0}>
-            &gt;
-          </PageButton>
-          <PageButton isDarkMode={isDarkMode} onClick={() => setCurrentPage(totalPages)} disabled={currentPage === totalPages || totalPages === 0}>
-            &gt;&gt;
-          </PageButton>
-        </PageButtons>
-      </Pagination>
-    )
-  }
+  const renderPagination = () => (
+    <Pagination>
+      <PageInfo isDarkMode={isDarkMode}>
+        Rows per page: 
+        <select
+          style={{ marginLeft: '8px', padding: '4px', backgroundColor: isDarkMode ? '#2d2d2d' : 'white', color: isDarkMode ? '#f5f5f5' : 'inherit', border: `1px solid ${isDarkMode ? '#444' : '#ddd'}`, fontSize: '13px' }}
+          value={rowsPerPage}
+          onChange={(e) => setRowsPerPage(Number(e.target.value))}
+        >
+          <option>10</option>
+          <option>25</option>
+          <option>50</option>
+        </select>
+      </PageInfo>
+      
+      <PageInfo isDarkMode={isDarkMode}>
+        {pages.rows.length > 0 ? `${pages.offset + 1}-${pages.offset + pages.rows.length}` : '0'}
+      </PageInfo>
+      
+      <PageButtons>
+        <PageButton isDarkMode={isDarkMode} onClick={pages.first} disabled={!pages.hasPrevious}>
+          &lt;&lt;
+        </PageButton>
+        <PageButton isDarkMode={isDarkMode} onClick={pages.previous} disabled={!pages.hasPrevious}>
+          &lt;
+        </PageButton>
+        <PageButton isDarkMode={isDarkMode} onClick={pages.next} disabled={!pages.hasNext}>
+          &gt;
+        </PageButton>
+      </PageButtons>
+    </Pagination>
+  )
 
   return (
     <PageContainer isDarkMode={isDarkMode}>
@@ -450,6 +448,7 @@ const Management = () => {
       </TabsContainer>
       
       <Header>
+        {renderFilters()}
         <CreateButton to={activeTab === 'leads' ? "/leads/create" : "/meetings/create"}>
           <span style={{ marginRight: '8px' }}>+</span> Create {activeTab === 'leads' ? 'Lead' : 'Meeting'}
         </CreateButton>
@@ -1,7 +1,8 @@
 import { useState, useEffect } from 'react'
 import { Link } from 'react-router-dom'
 import styled from 'styled-components'
-import axios from 'axios'
+import { subscribeToChanges } from '../events'
+import { useCursorPages } from '../pagination'
 
 const PageContainer = styled.div`
   padding: 20px;
@@ -134,30 +135,46 @@ const ViewIcon = styled.div`
   background-color: #f0f0f0;
 `
 
+const Filters = styled.div`
+  display: flex;
+  gap: 10px;
+  margin-right: auto;
+`
+
+const FilterInput = styled.input`
+  padding: 8px;
+  border: 1px solid #ddd;
+  border-radius: 4px;
+`
+
+const FilterSelect = styled.select`
+  padding: 8px;
+  border: 1px solid #ddd;
+  border-radius: 4px;
+`
+
 const MeetingsManagement = () => {
-  const [meetings, setMeetings] = useState([])
   const [activeTab, setActiveTab] = useState('meetings')
-  const [currentPage, setCurrentPage] = useState(1)
-  const [rowsPerPage] = useState(10)
-
-  useEffect(() => {
-    const fetchMeetings = async () => {
-      try {
-        const response = await axios.get('http://localhost:5000/api/meetings')
-        setMeetings(response.data)
-      } catch (error) {
-        console.error('Error fetching meetings:', error)
-      }
-    }
-    
-    fetchMeetings()
-  }, [])
-
-  // Calculate pagination
-  const indexOfLastMeeting = currentPage * rowsPerPage
-  const indexOfFirstMeeting = indexOfLastMeeting - rowsPerPage
-  const currentMeetings = meetings.slice(indexOfFirstMeeting, indexOfLastMeeting)
-  const totalPages = Math.ceil(meetings.length / rowsPerPage)
+  const [rowsPerPage, setRowsPerPage] = useState(10)
+  const [filters, setFilters] = useState({
+    meetingDateFrom: '',
+    meetingDateTo: '',
+    participants: '',
+    travelMode: '',
+  })
+  const pages = useCursorPages('http://localhost:5000/api/meetings', filters, rowsPerPage)
+  const { reload } = pages
+
+  // A changed meeting may enter or leave the page on screen under the
+  // current filters and sort, so any change refetches that one page
+  useEffect(() => subscribeToChanges((change) => {
+    if (change.type === 'meetings') reload()
+  }, reload), [])
+
+  const handleFilterChange = (e) => {
+    const { name, value } = e.target
+    setFilters((current) => ({ ...current, [name]: value }))
+  }
 
   return (
     <PageContainer>
@@ -167,6 +184,35 @@ const MeetingsManagement = () => {
       </TabsContainer>
       
       <Header>
+        <Filters>
+          <FilterInput
+            type="date"
+            name="meetingDateFrom"
+            title="From"
+            value={filters.meetingDateFrom}
+            onChange={handleFilterChange}
+          />
+          <FilterInput
+            type="date"
+            name="meetingDateTo"
+            title="To"
+            value={filters.meetingDateTo}
+            onChange={handleFilterChange}
+          />
+          <FilterInput
+            name="participants"
+            placeholder="Participant"
+            value={filters.participants}
+            onChange={handleFilterChange}
+          />
+          <FilterSelect name="travelMode" value={filters.travelMode} onChange={handleFilterChange}>
+            <option value="">All travel modes</option>
+            <option value="Car">Car</option>
+            <option value="Public Transit">Public Transit</option>
+            <option value="Flight">Flight</option>
+            <option value="Train">Train</option>
+          </FilterSelect>
+        </Filters>
         <CreateButton to="/meetings/create">
           <span style={{ marginRight: '8px' }}>+</span> Create
         </CreateButton>
@@ -186,7 +232,7 @@ const MeetingsManagement = () => {
           </tr>
         </TableHead>
         <tbody>
-          {currentMeetings.map((meeting) => (
+          {pages.rows.map((meeting) => (
             <Tr key={meeting.id}>
               <Td>
                 <ViewIcon>
@@ -205,7 +251,7 @@ const MeetingsManagement = () => {
               <Td>{meeting.expenses}</Td>
             </Tr>
           ))}
-          {currentMeetings.length === 0 && (
+          {pages.rows.length === 0 && (
             <Tr>
               <Td colSpan="8" style={{ textAlign: 'center' }}>No meetings found</Td>
             </Tr>
@@ -216,7 +262,11 @@ const MeetingsManagement = () => {
       <Pagination>
         <PageInfo>
           Rows per page: 
-          <select style={{ marginLeft: '8px', padding: '5px' }}>
+          <select
+            style={{ marginLeft: '8px', padding: '5px' }}
+            value={rowsPerPage}
+            onChange={(e) => setRowsPerPage(Number(e.target.value))}
+          >
             <option>10</option>
             <option>25</option>
             <option>50</option>
@@ -224,22 +274,19 @@ const MeetingsManagement = () => {
         </PageInfo>
         
         <PageInfo>
-          {indexOfFirstMeeting + 1}-{Math.min(indexOfLastMeeting, meetings.length)} of {meetings.length}
+          {pages.rows.length > 0 ? `${pages.offset + 1}-${pages.offset + pages.rows.length}` : '0'}
         </PageInfo>
         
         <PageButtons>
-          <PageButton onClick={() => setCurrentPage(1)} disabled={currentPage === 1}>
+          <PageButton onClick={pages.first} disabled={!pages.hasPrevious}>
             &lt;&lt;
           </PageButton>
-          <PageButton onClick={() => setCurrentPage(prev => Math.max(prev - 1, 1))} disabled={currentPage === 1}>
+          <PageButton onClick={pages.previous} disabled={!pages.hasPrevious}>
             &lt;
           </PageButton>
-          <PageButton onClick={() => setCurrentPage(prev => Math.min(prev + 1, totalPages))} disabled={currentPage === totalPages}>
+          <PageButton onClick={pages.next} disabled={!pages.hasNext}>
             &gt;
           </PageButton>
-          <PageButton onClick={() => setCurrentPage(totalPages)} disabled={currentPage === totalPages}>
-            &gt;&gt;
-          </PageButton>
         </PageButtons>
       </Pagination>
     </PageContainer>
@@ -0,0 +1,48 @@
+import { useEffect, useState } from 'react'
+import axios from 'axios'
+
+// GET one page of a list endpoint at a time. The API filters and sorts
+// (params carries `sort` and the filter arguments) and hands back the cursor
+// of the next page in X-Next-Cursor; that page is only requested when the
+// user asks for it. The cursors of the pages walked so far are kept so the
+// user can step back.
+export const useCursorPages = (url, params, limit) => {
+  // Blank filters are left out of the query
+  const query = Object.fromEntries(Object.entries(params).filter(([, value]) => value))
+  const key = JSON.stringify([url, query, limit])
+  const [walk, setWalk] = useState({ key, cursors: [null] })
+  const [page, setPage] = useState({ rows: [], next: null, key: null, after: null })
+  const [version, setVersion] = useState(0)
+
+  // A new sort, filter or page size starts again from the first page
+  const cursors = walk.key === key ? walk.cursors : [null]
+  const after = cursors[cursors.length - 1]
+  // The rows on screen stay while another page of the same list loads, but
+  // only the requested page's cursor may be followed
+  const loaded = page.key === key && page.after === after
+
+  useEffect(() => {
+    let current = true
+    const [listUrl, listParams, listLimit] = JSON.parse(key)
+    axios.get(listUrl, { params: { ...listParams, limit: listLimit, ...(after ? { after } : {}) } })
+      .then((response) => {
+        const next = response.headers['x-next-cursor'] || null
+        if (current) setPage({ rows: response.data, next, key, after })
+      })
+      .catch((error) => console.error(`Error fetching ${listUrl}:`, error))
+    return () => {
+      current = false
+    }
+  }, [key, after, version])
+
+  return {
+    rows: page.key === key ? page.rows : [],
+    reload: () => setVersion((current) => current + 1),
+    offset: (cursors.length - 1) * limit,
+    hasPrevious: cursors.length > 1,
+    hasNext: loaded && Boolean(page.next),
+    first: () => setWalk({ key, cursors: [null] }),
+    previous: () => setWalk({ key, cursors: cursors.slice(0, -1) }),
+    next: () => loaded && page.next && setWalk({ key, cursors: [...cursors, page.next] }),
+  }
+}
@@ -0,0 +1,23 @@
+import axios from 'axios'
+
+// Read-after token of this tab's latest write (see backend/replicas.py)
+let readAfter = null
+
+// Send the token of the last write back on every request until it expires,
+// so reads after a write are served by the primary or a caught-up replica
+export const trackReadAfter = () => {
+  axios.interceptors.response.use((response) => {
+    const token = response.headers['x-read-after']
+    if (token) readAfter = token
+    return response
+  })
+  axios.interceptors.request.use((config) => {
+    // The token starts with its expiry in epoch seconds
+    if (readAfter && parseFloat(readAfter) * 1000 > Date.now()) {
+      config.headers['X-Read-After'] = readAfter
+    } else {
+      readAfter = null
+    }
+    return config
+  })
+}